@@ -0,0 +1,243 @@
+"""
+Offline load test for the FastAPI app.
+
+Runs main.app under uvicorn against local stand-ins for Serper, Groq (both the LangChain models and the
+litellm calls made by crawl4ai), the crawled websites and the embedding model, then drives the selected
+endpoints at a fixed concurrency and reports throughput and latency percentiles.
+
+    python -m benchmarks.api_benchmark --endpoints search,chat,csv_ask_question --concurrency 16 --requests 400
+
+Nothing leaves the machine, and history, knowledge base, uploads and ChromaDB data go to a temporary
+directory. crawl4ai still drives a local headless Chromium (`playwright install`), and importing main
+loads the sentence-transformers model, which must already be in the local Hugging Face cache.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.stubs import FakeChatModel, HashEmbeddingFunction, StubServer, write_climate_csv
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_CSV_NAME = "bench_climate.csv"
+
+ALL_ENDPOINTS = [
+    "search", "summarize", "ingest", "chat",
+    "csv_upload", "csv_summarize", "csv_analyze_trend", "csv_ask_question", "csv_chat",
+]
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    latencies_s: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_s: float = 0.0
+    llm_calls: int = 0
+    llm_tokens: int = 0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies_s:
+            return 0.0
+        ordered = sorted(self.latencies_s)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index]
+
+    def as_dict(self) -> Dict[str, Any]:
+        completed = len(self.latencies_s)
+        return {
+            "endpoint": self.name,
+            "requests": completed + self.errors,
+            "errors": self.errors,
+            "throughput_rps": round(completed / self.wall_s, 2) if self.wall_s else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+            "llm_calls": self.llm_calls,
+            "llm_tokens": self.llm_tokens,
+        }
+
+
+def prepare_app(stub: StubServer, workdir: Path, llm_latency_s: float):
+    """Points main/datahelper at the stubs before and after import and returns the FastAPI app."""
+    os.environ.update({
+        "SERPER_API_KEY": "bench",
+        "SERPER_API_URL": f"{stub.base_url}/serper/search",
+        "GROQ_API_KEY": "bench",
+        "SUMMARIZE_LLM_PROVIDER": "openai/bench-llm",
+        "SUMMARIZE_LLM_BASE_URL": f"{stub.base_url}/llm/v1",
+        "LLM_USAGE_LOG_INTERVAL": "3600",
+        "HF_HUB_OFFLINE": "1",
+    })
+    sys.path.insert(0, str(REPO_ROOT))
+
+    import chromadb
+    import datahelper
+    import main
+
+    fake_llm = FakeChatModel(latency_s=llm_latency_s, callbacks=[main.usage_callback])
+    main.HISTORY_FILE = workdir / "history.json"
+    main.KNOWLEDGE_BASE_FILE = workdir / "knowledge_base.json"
+    main.UPLOADS_DIR = workdir / "uploads"
+    main.UPLOADS_DIR.mkdir(exist_ok=True)
+    main.chroma_client = chromadb.PersistentClient(path=str(workdir / "chroma_db"))
+    main.embedding_func = HashEmbeddingFunction()
+    main.rag_llm = fake_llm
+    main.rag_chain = main.rag_prompt | fake_llm | main.StrOutputParser()
+    datahelper.selected_llm = fake_llm
+    return main
+
+
+class UvicornThread:
+    def __init__(self, app, port: int):
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-uvicorn", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def build_requests(stub: StubServer, run_id: str, session_id: str, csv_bytes: bytes) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    """Maps endpoint names to factories producing httpx request kwargs for the i-th request."""
+    return {
+        "search": lambda i: {"method": "POST", "url": "/search", "json": {"query": f"climate ngo kenya {i}"}},
+        "summarize": lambda i: {"method": "POST", "url": "/summarize", "json": {"url": f"{stub.base_url}/site/summary/{run_id}/{i}"}},
+        "ingest": lambda i: {"method": "POST", "url": "/ingest", "json": {"url": f"{stub.base_url}/site/ingest/{run_id}/{i}"}},
+        "chat": lambda i: {"method": "POST", "url": "/chat", "json": {"question": "What projects does the fund finance?", "session_id": session_id}},
+        "csv_upload": lambda i: {"method": "POST", "url": "/csv/upload", "files": {"file": (BENCH_CSV_NAME, csv_bytes, "text/csv")}},
+        "csv_summarize": lambda i: {"method": "POST", "url": "/csv/summarize", "json": {"filename": BENCH_CSV_NAME}},
+        "csv_analyze_trend": lambda i: {"method": "POST", "url": "/csv/analyze-trend", "json": {"filename": BENCH_CSV_NAME, "variable": "temperature_anomaly"}},
+        "csv_ask_question": lambda i: {"method": "POST", "url": "/csv/ask-question", "json": {"filename": BENCH_CSV_NAME, "question": "What is the average renewable_share?"}},
+        "csv_chat": lambda i: {"method": "POST", "url": "/csv/chat", "json": {"filename": BENCH_CSV_NAME, "message": "How has co2_emissions_mt changed?"}},
+    }
+
+
+async def drive(client: httpx.AsyncClient, name: str, factory: Callable[[int], Dict[str, Any]],
+                total: int, concurrency: int) -> EndpointResult:
+    result = EndpointResult(name)
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**factory(i))
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                result.latencies_s.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_s = time.perf_counter() - started
+    return result
+
+
+async def warm_up(client: httpx.AsyncClient, stub: StubServer, csv_bytes: bytes, run_id: str,
+                  endpoints: List[str]) -> str:
+    """Uploads the benchmark CSV and ingests one page so /csv/* and /chat have something to work on."""
+    if any(name.startswith("csv_") for name in endpoints):
+        response = await client.post("/csv/upload", files={"file": (BENCH_CSV_NAME, csv_bytes, "text/csv")})
+        response.raise_for_status()
+    if "chat" not in endpoints:
+        return ""
+    response = await client.post("/ingest", json={"url": f"{stub.base_url}/site/chat/{run_id}"})
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+    for _ in range(120):
+        status = (await client.get(f"/ingest-status/{session_id}")).json()
+        if status.get("status") == "ready":
+            break
+        await asyncio.sleep(0.5)
+    return session_id
+
+
+def print_table(results: List[EndpointResult]):
+    header = (f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'p99 ms':>10}{'LLM calls':>11}")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        row = result.as_dict()
+        print(f"{row['endpoint']:<20}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['llm_calls']:>11}")
+
+
+async def run(args) -> Dict[str, Any]:
+    stub = StubServer(llm_latency_s=args.llm_latency, search_latency_s=args.search_latency).start()
+    workdir = Path(tempfile.mkdtemp(prefix="opencurrent-bench-"))
+    try:
+        main = prepare_app(stub, workdir, args.llm_latency)
+        csv_path = workdir / BENCH_CSV_NAME
+        write_climate_csv(str(csv_path), rows=args.csv_rows)
+        csv_bytes = csv_path.read_bytes()
+        run_id = str(int(time.time()))
+
+        with UvicornThread(main.app, args.port):
+            limits = httpx.Limits(max_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout,
+                                         limits=limits) as client:
+                session_id = await warm_up(client, stub, csv_bytes, run_id, args.endpoints)
+                factories = build_requests(stub, run_id, session_id, csv_bytes)
+                results = []
+                for name in args.endpoints:
+                    main.usage_tracker.reset()
+                    result = await drive(client, name, factories[name], args.requests, args.concurrency)
+                    totals = main.usage_tracker.snapshot()["totals"]
+                    result.llm_calls, result.llm_tokens = totals["calls"], totals["total_tokens"]
+                    results.append(result)
+        print_table(results)
+        return {
+            "config": {k: v for k, v in vars(args).items() if k != "json"},
+            "results": [r.as_dict() for r in results],
+        }
+    finally:
+        stub.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test for the OpenCurrent API.")
+    parser.add_argument("--endpoints", default=",".join(ALL_ENDPOINTS),
+                        help=f"Comma-separated subset of: {', '.join(ALL_ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds each fake LLM call takes.")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds each fake Serper call takes.")
+    parser.add_argument("--csv-rows", type=int, default=4000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="Write results to this JSON file for comparing runs.")
+    args = parser.parse_args(argv)
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(args.endpoints) - set(ALL_ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = asyncio.run(run(arguments))
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump(report, f, indent=2)
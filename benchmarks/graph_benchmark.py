@@ -0,0 +1,157 @@
+"""
+Benchmark for the report graph's end-to-end latency with the LLM replaced by a local stand-in.
+
+Writes a synthetic sales CSV, answers every node's prompt with a canned response after a fixed delay
+(FakeChatModel from benchmarks/stubs.py) and times complete report runs through the sequential graph
+and the graph with parallel branches. Charts, the report files and the PDF are produced for real, in a
+temporary working directory.
+
+    python -m benchmarks.graph_benchmark --rows 200000 --runs 3 --llm-latency 1.0
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules"))
+
+from benchmarks.stubs import FakeChatModel
+
+CHART_SUGGESTIONS = [
+    {"type": "line", "columns": ["day", "sales"], "title": "Daily sales", "description": "Sales over time.",
+     "suggested_section": "Sales Analysis"},
+    {"type": "bar", "columns": ["region", "sales"], "title": "Sales by region",
+     "description": "Average sale per region.", "suggested_section": "Regional Analysis"},
+    {"type": "scatter", "columns": ["price", "units"], "title": "Price vs units",
+     "description": "How units sold vary with price.", "suggested_section": "Pricing"},
+    {"type": "histogram", "columns": ["sales"], "title": "Sale sizes", "description": "Distribution of sales.",
+     "suggested_section": "Sales Analysis"},
+]
+
+
+def make_sales_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    price = np.round(rng.uniform(5, 200, rows), 2)
+    units = rng.poisson(20, rows) + 1
+    day = rng.integers(0, 730, rows)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(day, unit="D"),
+        "day": day,
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "product": rng.choice([f"product-{i}" for i in range(50)], rows),
+        "price": price,
+        "units": units,
+        "sales": np.round(price * units, 2),
+    })
+
+
+def graph_responder(prompt: str) -> str:
+    """Picks the canned answer for the graph node whose prompt is calling the model."""
+    if "specialized in quickly analyzing data profiles" in prompt:
+        return json.dumps({"num_rows": 0, "num_columns": 0, "column_details": {},
+                           "key_observations": "Sales are complete; prices are uniformly spread."})
+    if "specialized in recommending data visualizations" in prompt:
+        return json.dumps({"suggestions": CHART_SUGGESTIONS})
+    if "expert data analyst AI" in prompt:
+        return json.dumps({"insights": [
+            {"insight_id": f"insight_{i + 1}", "title": f"Finding {i + 1}",
+             "narrative": "Sales grow steadily and the west region leads on average sale size.",
+             "supporting_visual_ids": []} for i in range(3)]})
+    if "expert report writer" in prompt:
+        visual_ids = list(dict.fromkeys(re.findall(r"Visual ID: (\S+)", prompt)))
+        return json.dumps({
+            "introduction_text": "This report reviews two years of sales.",
+            "analysis_narratives": [f"Finding {i + 1}:- Sales are steady, see [FIGURE {i + 1}]."
+                                    for i in range(len(visual_ids))],
+            "key_takeaways_bullet_points": ["Sales are steady.", "The west region leads."],
+            "conclusion_text": "Sales are healthy.",
+            "dataset_title": "Synthetic sales",
+            "figure_id_map": {f"[FIGURE {i + 1}]": visual_id for i, visual_id in enumerate(visual_ids)},
+        })
+    if "expert report reviewer" in prompt:
+        return json.dumps({"is_safe": True, "is_accurate": True, "reasoning": "Consistent with the profile."})
+    raise ValueError("Prompt not recognised by the graph benchmark responder")
+
+
+def run(args) -> Dict[str, Any]:
+    from graph.builder import create_graph_workflow
+    from graph.run_context import report_run
+    from llm.clients import set_chat_model_factory
+    from llm.usage import usage_callback
+
+    def fake_model(model: str, temperature: float):
+        latency = args.pro_latency if "pro" in model else args.llm_latency
+        return FakeChatModel(model=model, latency_s=latency, responder=graph_responder, callbacks=[usage_callback])
+
+    set_chat_model_factory(fake_model)
+    csv_path = os.path.abspath("sales.csv")
+    make_sales_frame(args.rows, seed=args.seed).to_csv(csv_path, index=False)
+
+    results: List[Dict[str, Any]] = []
+    print(f"{'graph':>10} {'runs':>5} {'median s':>9} {'min s':>8} {'status':>18}")
+    for name, parallel in (("sequential", False), ("parallel", True)):
+        app = create_graph_workflow(parallel=parallel)
+        timings, statuses = [], set()
+        for _ in range(args.runs):
+            request_id = str(uuid.uuid4())
+            initial_state = {
+                "request_id": request_id, "file_path": csv_path, "instructions": "Summarise sales performance.",
+                "dataframe_profile": None, "analysis_insights": None, "generated_visuals": None,
+                "report_sections_draft": None, "final_report": None, "status": "initial",
+                "error_message": None, "safety_check_retries": 0,
+            }
+            start = time.perf_counter()
+            with report_run(request_id, csv_path):
+                final_state = app.invoke(initial_state)
+            timings.append(time.perf_counter() - start)
+            statuses.add(final_state.get("status"))
+        status = ",".join(sorted(statuses))
+        results.append({"graph": name, "runs": args.runs, "median_s": round(statistics.median(timings), 3),
+                        "min_s": round(min(timings), 3), "status": status})
+        print(f"{name:>10} {args.runs:>5} {statistics.median(timings):>9.2f} {min(timings):>8.2f} {status:>18}")
+    saved = results[0]["median_s"] - results[1]["median_s"]
+    print(f"parallel branches save {saved:.2f}s per report ({saved / results[0]['median_s']:.0%})")
+    return {"config": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Sequential vs parallel report graph with a fake LLM.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=3, help="Report runs per graph; the median is reported.")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds each gemini-2.5-flash call takes.")
+    parser.add_argument("--pro-latency", type=float, default=2.0, help="Seconds each gemini-2.5-pro call takes.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the graph's INFO logging.")
+    parser.add_argument("--json", help="Write results to this JSON file for comparing runs.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    json_path = os.path.abspath(arguments.json) if arguments.json else None
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    # Time the PDF as part of each run rather than letting it render in the background
+    os.environ.setdefault("REPORT_PDF_MODE", "sync")
+    # The nodes write charts and reports relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="graph_benchmark_")
+    os.chdir(workdir)
+    try:
+        logging.disable(logging.NOTSET if arguments.verbose else logging.INFO)
+        report = run(arguments)
+    finally:
+        os.chdir(os.path.dirname(workdir))
+        shutil.rmtree(workdir, ignore_errors=True)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
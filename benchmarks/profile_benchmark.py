@@ -0,0 +1,87 @@
+"""
+Benchmark for the data analysis node's dataset profile on wide tables.
+
+Builds a synthetic DataFrame with a mix of int, float (with missing values), low-cardinality text and
+id-like text columns, then times the per-column reference profile against the vectorized one and checks
+that both produce the same JSON.
+
+    python -m benchmarks.profile_benchmark --rows 20000 --columns 500,1000 --repeat 3
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from modules.profiling.frame import profile_dataframe, profile_dataframe_per_column
+
+
+def make_wide_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    categories = np.array(["north", "south", "east", "west", "central", None], dtype=object)
+    ids = np.array([f"id-{i}" for i in range(rows)], dtype=object)
+    data: Dict[str, Any] = {}
+    for j in range(columns):
+        kind = j % 5
+        if kind == 0:
+            data[f"count_{j}"] = rng.integers(0, 1000, rows)
+        elif kind == 1:
+            values = rng.normal(50, 15, rows)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"measure_{j}"] = values
+        elif kind == 2:
+            data[f"ratio_{j}"] = np.round(rng.random(rows), 2)
+        elif kind == 3:
+            data[f"region_{j}"] = rng.choice(categories, rows)
+        else:
+            data[f"ref_{j}"] = rng.choice(ids, rows)
+    return pd.DataFrame(data)
+
+
+def time_call(func, df: pd.DataFrame, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(args) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    print(f"{'columns':>8} {'rows':>8} {'per-column s':>13} {'vectorized s':>13} {'speedup':>8} {'identical':>10}")
+    for columns in args.columns:
+        df = make_wide_frame(args.rows, columns, seed=args.seed)
+        reference_s, reference = time_call(profile_dataframe_per_column, df, args.repeat)
+        vectorized_s, vectorized = time_call(profile_dataframe, df, args.repeat)
+        identical = json.dumps(reference) == json.dumps(vectorized)
+        results.append({
+            "columns": columns, "rows": args.rows, "per_column_s": round(reference_s, 4),
+            "vectorized_s": round(vectorized_s, 4), "speedup": round(reference_s / vectorized_s, 2),
+            "identical": identical,
+        })
+        print(f"{columns:>8} {args.rows:>8} {reference_s:>13.3f} {vectorized_s:>13.3f} "
+              f"{reference_s / vectorized_s:>7.1f}x {str(identical):>10}")
+    return {"config": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Per-column vs vectorized dataset profiling on wide tables.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--columns", default="500,1000", help="Comma-separated column counts to test.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this JSON file for comparing runs.")
+    args = parser.parse_args(argv)
+    args.columns = [int(c) for c in args.columns.split(",") if c.strip()]
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = run(arguments)
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,241 @@
+"""
+Local stand-ins for the external services the app talks to, so the API can be load-tested offline:
+
+- a fake Serper search API, a fake OpenAI-compatible LLM endpoint (used by crawl4ai through litellm)
+  and a static climate website, all served by one threaded HTTP server;
+- FakeChatModel, a LangChain chat model returning canned answers after a configurable delay;
+- HashEmbeddingFunction, a dependency-free embedding function for ChromaDB.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+CANNED_PAGE_SUMMARY = {
+    "subject_name": "Green Horizons Climate Fund",
+    "summary": "Green Horizons Climate Fund finances community solar and mangrove restoration projects "
+               "across East Africa. The fund partners with local NGOs and publishes annual impact reports.",
+    "publication_date": "March 3, 2025",
+    "location": "Nairobi, Kenya",
+    "contacts": {"emails": ["info@greenhorizons.example"], "organizations": ["Green Horizons Climate Fund"]},
+    "funds_money_investments": ["USD 12 million blended finance facility"],
+    "projects_activities": ["Community solar mini-grids", "Mangrove restoration"],
+    "locations": ["Kenya", "Tanzania", "Mombasa"],
+}
+
+CANNED_RAG_ANSWER = "The organisation focuses on community solar mini-grids and mangrove restoration in East Africa."
+CANNED_AGENT_ANSWER = (
+    "Thought: I now know the final answer\n"
+    "Final Answer: The average temperature anomaly rises steadily over the period, by roughly 0.02 degrees per year."
+)
+
+_SITE_PARAGRAPH = (
+    "Green Horizons Climate Fund works with coastal communities to restore mangrove forests, which store "
+    "large amounts of carbon and protect shorelines from storm surges. The fund also finances solar mini-grids "
+    "for rural clinics and schools, replacing diesel generators and cutting household energy costs. Projects are "
+    "selected together with local partners, monitored with satellite imagery and reported every year to donors "
+    "and to the public. "
+)
+
+
+def default_responder(prompt: str) -> str:
+    """Picks a canned answer based on which prompt in the app is calling the model."""
+    if "Final Answer" in prompt:
+        return CANNED_AGENT_ANSWER
+    if "based ONLY on the following context" in prompt:
+        return CANNED_RAG_ANSWER
+    return json.dumps(CANNED_PAGE_SUMMARY)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that sleeps for `latency_s` and answers via `responder`, reporting approximate token usage.
+    """
+    model: str = "fake-chat"
+    latency_s: float = 0.0
+    responder: Callable[[str], str] = default_responder
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self.responder(prompt)
+        usage = {
+            "input_tokens": _approx_tokens(prompt),
+            "output_tokens": _approx_tokens(text),
+            "total_tokens": _approx_tokens(prompt) + _approx_tokens(text),
+        }
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_s)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_s)
+        return self._result(messages)
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Hashed bag-of-words embeddings; deterministic, instant and needs no model download."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = []
+        for document in input:
+            vector = [0.0] * self.dim
+            for token in document.lower().split():
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            embeddings.append([v / norm for v in vector])
+        return embeddings
+
+
+def site_page(path: str) -> str:
+    title = f"Green Horizons Climate Fund - {path.strip('/') or 'home'}"
+    sections = "".join(
+        f"<h2>Programme {i + 1}</h2><p>{_SITE_PARAGRAPH * 2}</p>" for i in range(4)
+    )
+    return (
+        f"<html><head><title>{title}</title>"
+        f'<meta property="article:published_time" content="2025-03-03T09:00:00Z"></head>'
+        f"<body><main><h1>{title}</h1><p>Contact: info@greenhorizons.example</p>{sections}</main></body></html>"
+    )
+
+
+def serper_response(payload: dict) -> dict:
+    query = payload.get("q", "")
+    num = int(payload.get("num", 10))
+    items = [
+        {
+            "title": f"{query} - result {i + 1}",
+            "link": f"https://example.org/{i + 1}",
+            "snippet": _SITE_PARAGRAPH[:160],
+            "address": f"{i + 1} Climate Avenue, Nairobi",
+        }
+        for i in range(num)
+    ]
+    if payload.get("type") == "places":
+        return {"places": items}
+    if payload.get("tbs") == "qdr:d":
+        return {"news": items}
+    return {"organic": items}
+
+
+def chat_completion_response(payload: dict) -> dict:
+    prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+    content = f"<blocks>{json.dumps([CANNED_PAGE_SUMMARY])}</blocks>"
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "bench-llm"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": _approx_tokens(prompt),
+            "completion_tokens": _approx_tokens(content),
+            "total_tokens": _approx_tokens(prompt) + _approx_tokens(content),
+        },
+    }
+
+
+class StubServer:
+    """
+    Serves /serper/search, /llm/v1/chat/completions and /site/<anything> on a local port.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, llm_latency_s: float = 0.0,
+                 search_latency_s: float = 0.0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json_body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path.startswith("/site"):
+                    self._send(200, site_page(self.path[len("/site"):]).encode("utf-8"), "text/html; charset=utf-8")
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                if self.path.startswith("/serper/search"):
+                    time.sleep(stub.search_latency_s)
+                    body = serper_response(self._json_body())
+                elif self.path.startswith("/llm/v1/chat/completions"):
+                    time.sleep(stub.llm_latency_s * random.uniform(0.8, 1.2))
+                    body = chat_completion_response(self._json_body())
+                else:
+                    self._send(404, b"not found", "text/plain")
+                    return
+                self._send(200, json.dumps(body).encode("utf-8"), "application/json")
+
+        self.llm_latency_s = llm_latency_s
+        self.search_latency_s = search_latency_s
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-stub-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def write_climate_csv(path: str, rows: int = 4000, seed: int = 7):
+    """Writes a synthetic country/year climate dataset shaped like the CSVs users upload."""
+    rng = random.Random(seed)
+    countries = ["Kenya", "Tanzania", "Uganda", "Ethiopia", "Nigeria", "Ghana", "Brazil", "India", "Indonesia", "Peru"]
+    regions = {"Brazil": "South America", "Peru": "South America", "India": "Asia", "Indonesia": "Asia"}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("year,country,region,temperature_anomaly,co2_emissions_mt,renewable_share,forest_cover_pct\n")
+        for i in range(rows):
+            country = countries[i % len(countries)]
+            year = 1950 + (i // len(countries)) % 75
+            anomaly = round(0.02 * (year - 1950) + rng.gauss(0, 0.15), 3)
+            co2 = "" if rng.random() < 0.02 else round(rng.uniform(5, 900), 2)
+            renewable = round(min(100.0, max(0.0, rng.gauss(30 + (year - 1950) * 0.3, 8))), 2)
+            forest = round(rng.uniform(5, 65), 2)
+            f.write(f"{year},{country},{regions.get(country, 'Africa')},{anomaly},{co2},{renewable},{forest}\n")
@@ -0,0 +1,347 @@
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from modules.profiling.streaming import profile_csv, should_stream
+
+# Upper bound for the parsed frames kept in memory, across all files
+CSV_CACHE_MAX_BYTES = int(float(os.getenv("CSV_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# Columnar copies and stats sidecars live next to the uploads, e.g. uploads/.columnar/data.csv.arrow
+COLUMNAR_DIR_NAME = ".columnar"
+
+FrameKey = Tuple[str, int, int, Optional[Tuple[str, ...]]]
+
+# Leading bytes of formats that are commonly uploaded by mistake (xlsx/zip, pdf, gzip, png, jpeg, xls)
+BINARY_SIGNATURES = (b"PK\x03\x04", b"%PDF", b"\x1f\x8b", b"\x89PNG", b"\xff\xd8\xff", b"\xd0\xcf\x11\xe0")
+# Bytes inspected before accepting an upload as text, and kept for parsing the header row
+SNIFF_BYTES = 64 * 1024
+_QUOTE_OR_NEWLINE = re.compile(rb'["\n]')
+
+
+def columnar_path(csv_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, COLUMNAR_DIR_NAME, f"{name}.arrow")
+
+
+def stats_path(csv_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, COLUMNAR_DIR_NAME, f"{name}.stats.json")
+
+
+def profile_path(csv_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, COLUMNAR_DIR_NAME, f"{name}.profile.json")
+
+
+def _source_signature(csv_path: str) -> Dict[str, int]:
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_sidecar(path: str, csv_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            sidecar = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if sidecar.get("source") != _source_signature(csv_path):
+        return None
+    return sidecar
+
+
+def _write_sidecar(path: str, sidecar: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(sidecar, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def read_stats(csv_path: str) -> Optional[Dict[str, Any]]:
+    """Returns the stats sidecar for `csv_path` if it describes the current version of the file."""
+    return _read_sidecar(stats_path(csv_path), csv_path)
+
+
+def write_stats(csv_path: str, stats: Dict[str, Any]):
+    _write_sidecar(stats_path(csv_path), stats)
+
+
+def find_by_checksum(directory: str, sha256: str) -> Optional[str]:
+    """Returns the path of a CSV in `directory` whose up-to-date sidecar records `sha256`, if any."""
+    sidecar_dir = os.path.join(directory, COLUMNAR_DIR_NAME)
+    if not os.path.isdir(sidecar_dir):
+        return None
+    for entry in os.listdir(sidecar_dir):
+        if not entry.endswith(".stats.json"):
+            continue
+        csv_path = os.path.join(directory, entry[:-len(".stats.json")])
+        if not os.path.isfile(csv_path):
+            continue
+        stats = read_stats(csv_path)
+        if stats and stats.get("sha256") == sha256:
+            return csv_path
+    return None
+
+
+class CSVStreamInspector:
+    """
+    Inspects an upload chunk by chunk while it is written to disk: rejects binary content from the
+    first chunk, and keeps a SHA-256, the byte size and the row/column counts without holding the file.
+    Rows are counted as newlines outside double quotes, so blank lines are counted as rows as well.
+    """
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._head = b""
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._in_quotes = False
+        self._newlines = 0
+        self._last_byte = b""
+
+    def update(self, chunk: bytes):
+        if not chunk:
+            return
+        if len(self._head) < SNIFF_BYTES:
+            self._check_text(chunk[:SNIFF_BYTES - len(self._head)])
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self._last_byte = chunk[-1:]
+        if not self._in_quotes and b'"' not in chunk:
+            self._newlines += chunk.count(b"\n")
+            return
+        for match in _QUOTE_OR_NEWLINE.finditer(chunk):
+            if match.group() == b'"':
+                self._in_quotes = not self._in_quotes
+            elif not self._in_quotes:
+                self._newlines += 1
+
+    def _check_text(self, data: bytes):
+        if not self._head and data.startswith(BINARY_SIGNATURES):
+            raise ValueError("File looks like a binary document, not a CSV")
+        if b"\x00" in data:
+            raise ValueError("File contains NUL bytes, not a text CSV")
+        try:
+            self._decoder.decode(data)
+        except UnicodeDecodeError:
+            raise ValueError("File is not UTF-8 encoded text")
+
+    @property
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+    def header(self) -> List[str]:
+        text = self._head.decode("utf-8-sig", errors="ignore")
+        return next(csv.reader(io.StringIO(text)), [])
+
+    def summary(self) -> Dict[str, Any]:
+        """Shape and checksum of everything streamed so far, in the layout of the stats sidecar."""
+        records = self._newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        return {
+            "rows": max(records - 1, 0),
+            "columns": self.header(),
+            "sha256": self.hexdigest,
+            "size_bytes": self.size,
+        }
+
+
+def stats_from_profile(csv_path: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Stats sidecar contents derived from a streaming profile, for files too large to load."""
+    details = profile["column_details"]
+    return {
+        "source": _source_signature(csv_path),
+        "rows": profile["num_rows"],
+        "columns": list(details),
+        "dtypes": {col: detail["type"] for col, detail in details.items()},
+        "missing_values": {col: detail["missing_values_count"] for col, detail in details.items()},
+        "total_missing": profile["total_missing"],
+        "duplicate_rows": profile["duplicate_rows"],
+        "memory_bytes": None,
+        "columnar": False,
+    }
+
+
+def compute_stats(csv_path: str, df: pd.DataFrame) -> Dict[str, Any]:
+    missing = df.isnull().sum()
+    return {
+        "source": _source_signature(csv_path),
+        "rows": int(df.shape[0]),
+        "columns": df.columns.tolist(),
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "missing_values": {col: int(count) for col, count in missing.items()},
+        "total_missing": int(missing.sum()),
+        "duplicate_rows": int(df.duplicated().sum()),
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "columnar": False,
+    }
+
+
+class DataFrameStore:
+    """
+    Process-wide LRU cache of parsed CSV files.
+
+    Entries are keyed by absolute path plus mtime and size, so a re-uploaded file is parsed again while
+    repeated requests on an unchanged file reuse the same DataFrame. When an up-to-date columnar copy
+    exists it is memory-mapped instead of re-parsing the CSV, and column subsets are read on their own.
+    Frames are shared between callers and must be treated as read-only; copy before mutating.
+    """
+
+    def __init__(self, max_bytes: int = CSV_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[FrameKey, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[FrameKey, threading.Lock] = {}
+
+    @staticmethod
+    def frame_key(path: str, columns: Optional[Sequence[str]] = None) -> FrameKey:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, tuple(columns) if columns else None
+
+    def _lookup(self, key: FrameKey) -> Optional[pd.DataFrame]:
+        cached = self._frames.get(key)
+        if cached is None:
+            return None
+        self._frames.move_to_end(key)
+        return cached[0]
+
+    def get(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        key = self.frame_key(path, columns)
+        full_key = key[:3] + (None,)
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is None and columns:
+                full = self._lookup(full_key)
+                cached = full[list(columns)] if full is not None else None
+            if cached is not None:
+                return cached
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given file version; the others wait and then hit the cache
+        with load_lock:
+            with self._lock:
+                cached = self._lookup(key)
+            if cached is None:
+                cached = self._load(path, columns)
+                self._put(key, cached)
+        with self._lock:
+            self._load_locks.pop(key, None)
+        return cached
+
+    def _load(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        arrow_path = columnar_path(path)
+        stats = read_stats(path)
+        if stats and stats.get("columnar") and os.path.exists(arrow_path):
+            table = feather.read_table(arrow_path, columns=list(columns) if columns else None, memory_map=True)
+            return table.to_pandas()
+        if columns:
+            return pd.read_csv(path, low_memory=False, usecols=list(columns))[list(columns)]
+        return pd.read_csv(path, low_memory=False)
+
+    def _put(self, key: FrameKey, df: pd.DataFrame):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            # Older versions of the same file can never be requested again
+            for stale in [k for k in self._frames if k[0] == key[0] and k[1:3] != key[1:3]]:
+                self._evict(stale)
+            if nbytes > self.max_bytes:
+                return
+            self._frames[key] = (df, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes:
+                self._evict(next(iter(self._frames)))
+
+    def _evict(self, key: FrameKey):
+        _, nbytes = self._frames.pop(key)
+        self._total_bytes -= nbytes
+
+    def invalidate(self, path: str):
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._frames if k[0] == abs_path]:
+                self._evict(key)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._total_bytes = 0
+
+    def record_upload(self, path: str, upload_summary: Dict[str, Any]):
+        """Drops cached frames of a replaced file and seeds its sidecar with what was counted during the upload."""
+        self.invalidate(path)
+        write_stats(path, {"source": _source_signature(path), **upload_summary, "columnar": False})
+
+    def stats(self, path: str) -> Dict[str, Any]:
+        """
+        Returns the stats sidecar, computing and persisting it from the cached frame if it is stale
+        or only holds what was counted while the file was uploaded.
+        """
+        stats = read_stats(path)
+        if stats is None or "total_missing" not in stats:
+            if should_stream(path):
+                computed = stats_from_profile(path, self.profile(path))
+            else:
+                computed = compute_stats(path, self.get(path))
+            stats = {**(stats or {}), **computed}
+            write_stats(path, stats)
+        return stats
+
+    def profile(self, path: str) -> Dict[str, Any]:
+        """
+        Chunked, bounded-memory profile of the file (see profiling.streaming.profile_csv), computed
+        once per file version and kept in a sidecar. Does not load the file into the cache.
+        """
+        sidecar = _read_sidecar(profile_path(path), path)
+        if sidecar is not None:
+            return sidecar["profile"]
+        profile = profile_csv(path)
+        _write_sidecar(profile_path(path), {"source": _source_signature(path), "profile": profile})
+        return profile
+
+    def checksum(self, path: str) -> str:
+        """SHA-256 of the file's bytes, recorded at upload time or computed once and kept in the sidecar."""
+        stats = read_stats(path)
+        if stats and stats.get("sha256"):
+            return stats["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        write_stats(path, {**(stats or {"source": _source_signature(path)}), "sha256": digest.hexdigest()})
+        return digest.hexdigest()
+
+    def convert_to_columnar(self, path: str) -> Dict[str, Any]:
+        """
+        Parses `path` once and writes an uncompressed Feather (Arrow IPC) copy, which can be
+        memory-mapped without decoding, plus the stats sidecar. Warms the cache as a side effect.
+        Files above the streaming threshold are only profiled, since parsing them whole may not fit in memory.
+        """
+        if should_stream(path):
+            return self.stats(path)
+        df = self.get(path)
+        arrow_path = columnar_path(path)
+        os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+        tmp_path = f"{arrow_path}.tmp"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, arrow_path)
+        stats = {**(read_stats(path) or {}), **compute_stats(path, df)}
+        stats["columnar"] = True
+        write_stats(path, stats)
+        return stats
+
+
+dataframe_store = DataFrameStore()
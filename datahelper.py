@@ -1,15 +1,161 @@
+import contextvars
+import json
 import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from langchain.memory import ConversationBufferWindowMemory
 from langchain_experimental.agents.agent_toolkits.pandas.base import (
     create_pandas_dataframe_agent,
 )
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+from modules.llm.usage import usage_callback
+from dataframe_store import dataframe_store, COLUMNAR_DIR_NAME
+from modules.profiling.streaming import should_stream
+from sandbox_pool import CSV_AGENT_SANDBOX, SandboxedPythonTool, sandbox_pool
 
 load_dotenv()
 
 # Initialize LLM using Groq (same as main app)
-selected_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1, api_key=os.getenv("GROQ_API_KEY"))
+selected_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1, api_key=os.getenv("GROQ_API_KEY"), callbacks=[usage_callback])
+
+# Chat sessions unused for this many seconds are dropped with their agent and memory
+CSV_AGENT_IDLE_TIMEOUT_S = float(os.getenv("CSV_AGENT_IDLE_TIMEOUT", "1800"))
+# Number of previous question/answer pairs kept in a chat session's prompt
+CSV_CHAT_MEMORY_TURNS = 5
+
+# Default pandas agent suffix with the conversation so far added before the new question
+CHAT_AGENT_SUFFIX = """
+This is the result of `print(df.head())`:
+{df_head}
+
+Conversation so far:
+{chat_history}
+
+Begin!
+Question: {input}
+{agent_scratchpad}"""
+
+
+def _build_pandas_agent(df: pd.DataFrame, memory=None, filename: str = None, session_key: str = None):
+    """
+    Pandas agent over `df`; with `memory` the prompt also carries the chat history. With CSV_AGENT_SANDBOX,
+    the generated code runs in the sandbox worker pool (which loads `filename` itself) instead of this process.
+    """
+    agent_kwargs = {"suffix": CHAT_AGENT_SUFFIX, "include_df_in_prompt": None} if memory is not None else {}
+    sandboxed = CSV_AGENT_SANDBOX and filename is not None
+    pandas_agent = create_pandas_dataframe_agent(
+        llm=selected_llm,
+        # In-process, agent code may mutate it; keep the cached frame intact. Sandboxed, only the prompt reads it.
+        df=df if sandboxed else df.copy(),
+        verbose=False,  # Clean output
+        allow_dangerous_code=True,
+        agent_executor_kwargs={"handle_parsing_errors": "True", "memory": memory},
+        **agent_kwargs,
+    )
+    if sandboxed:
+        # Same tool name and description, so the prompt built above still matches
+        pandas_agent.tools = [SandboxedPythonTool(file_path=filename, session_key=session_key or filename)]
+    return pandas_agent
+
+
+class PandasAgentSessions:
+    """
+    Per-file pandas agents, built once per file version and reused across requests.
+
+    Each file gets a stateless agent for one-off prompts (summary, trends), each run of which starts
+    from a fresh copy of the data, and a chat agent with a windowed conversation memory shared by
+    /csv/chat and /csv/ask-question. Chat turns on the same file run one at a time so the memory
+    stays in order. Re-uploading a file rebuilds both, and sessions idle for longer than
+    `idle_timeout_s` are evicted on the next lookup.
+    """
+
+    def __init__(self, idle_timeout_s: float = CSV_AGENT_IDLE_TIMEOUT_S):
+        self.idle_timeout_s = idle_timeout_s
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, filename: str):
+        key = dataframe_store.frame_key(filename)
+        now = time.monotonic()
+        with self._lock:
+            for path in [p for p, s in self._sessions.items() if now - s["last_used"] > self.idle_timeout_s]:
+                del self._sessions[path]
+            session = self._sessions.get(key[0])
+            if session is None or session["frame_key"] != key:
+                session = {
+                    "frame_key": key,
+                    "stateless": None,
+                    "chat": None,
+                    "memory": None,
+                    "chat_lock": threading.Lock(),
+                    "build_lock": threading.Lock(),
+                }
+                self._sessions[key[0]] = session
+            session["last_used"] = now
+        return session
+
+    def _stateless_agent(self, session, filename: str):
+        with session["build_lock"]:
+            if session["stateless"] is None:
+                session["stateless"] = _build_pandas_agent(get_dataframe(filename), filename=filename)
+            return session["stateless"]
+
+    def run_stateless(self, filename: str, prompt: str):
+        """
+        Runs a one-off prompt on the file's stateless agent. The agent and its prompt are shared, but each
+        run executes its code against its own copy of the data (or its own sandbox session, discarded
+        afterwards), so nothing a run changes or defines leaks into other runs, concurrent or later.
+        """
+        session = self._session(filename)
+        pandas_agent = self._stateless_agent(session, filename)
+        session_key = f"{session['frame_key'][0]}:stateless:{uuid.uuid4().hex}"
+        if CSV_AGENT_SANDBOX:
+            tool = SandboxedPythonTool(file_path=filename, session_key=session_key)
+        else:
+            tool = PythonAstREPLTool(locals={"df": get_dataframe(filename).copy()})
+        try:
+            return pandas_agent.model_copy(update={"tools": [tool]}).invoke(prompt)
+        finally:
+            if CSV_AGENT_SANDBOX:
+                sandbox_pool.drop_session(session_key)
+
+    def chat(self, filename: str, message: str):
+        session = self._session(filename)
+        with session["build_lock"]:
+            if session["chat"] is None:
+                session["memory"] = ConversationBufferWindowMemory(
+                    k=CSV_CHAT_MEMORY_TURNS, memory_key="chat_history", input_key="input", output_key="output")
+                session["chat"] = _build_pandas_agent(get_dataframe(filename), memory=session["memory"],
+                                                      filename=filename, session_key=f"{session['frame_key'][0]}:chat")
+        with session["chat_lock"]:
+            return session["chat"].invoke({"input": message})
+
+    def remember(self, filename: str, message: str, answer: str):
+        """Adds a turn answered outside the agent to the file's chat memory, if a chat is in progress."""
+        session = self._session(filename)
+        if session["memory"] is not None:
+            with session["chat_lock"]:
+                session["memory"].save_context({"input": message}, {"output": answer})
+
+    def reset(self, filename: str = None):
+        with self._lock:
+            if filename is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(os.path.abspath(filename), None)
+
+    def active_sessions(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+agent_sessions = PandasAgentSessions()
 
 def clean_agent_output(raw_output) -> str:
     """Clean the agent output to remove verbose logging and extract final answer."""
@@ -60,13 +206,19 @@ def summerize_csv(filename: str):
     """
     Load CSV and return a summary including:
     - sample rows
-    - column descriptions
+    - column descriptions (once ready; see column_descriptions)
     - missing values
     - duplicate values
     - basic statistics
     """
     try:
-        df = pd.read_csv(filename, low_memory=False)
+        if should_stream(filename):
+            # Too large to load whole: sample and describe() come from the chunked profile
+            profile = dataframe_store.profile(filename)
+            sample_rows, essential_metrics = profile["sample_rows"], profile["describe"]
+        else:
+            df = get_dataframe(filename)
+            sample_rows, essential_metrics = df.head().to_dict('records'), df.describe().to_dict()
     except Exception as e:
         return {
             "initial_data_sample": [],
@@ -76,45 +228,90 @@ def summerize_csv(filename: str):
             "essential_metrics": {}
         }
 
+    # Missing and duplicate counts come from the stats sidecar written at upload time
+    stats = dataframe_store.stats(filename)
+
     # Get missing values count (direct calculation, more reliable)
-    missing_count = df.isnull().sum().sum()
+    missing_count = stats["total_missing"]
     missing_values = f"There are {missing_count} missing values in this dataset"
 
     # Get duplicate rows count
-    duplicates_count = df.duplicated().sum()
+    duplicates_count = stats["duplicate_rows"]
     duplicate_values = f"There are {duplicates_count} duplicate rows in this dataset"
 
-    try:
-        pandas_agent = create_pandas_dataframe_agent(
-            llm=selected_llm,
-            df=df,
-            verbose=False,  # Set to False to reduce verbose logging
-            allow_dangerous_code=True,
-            agent_executor_kwargs={"handle_parsing_errors": "True"},
-        )
-
-        # Get column descriptions with cleaned output
-        raw_column_desc = pandas_agent.invoke(
-            "Create a table for dataset columns. Write a column name and column descriptions as a table format"
-        )
-        column_descriptions = clean_agent_output(raw_column_desc)
-    except Exception as e:
-        column_descriptions = clean_agent_output(e)  # Handle API errors
+    # The LLM column table is slow; it is produced in the background and fetched separately once ready
+    descriptions = column_descriptions(filename)
 
     data_summary = {
-        "initial_data_sample": df.head().to_dict('records'),
-        "column_descriptions": column_descriptions,
+        "initial_data_sample": sample_rows,
+        "column_descriptions": descriptions["column_descriptions"],
+        "column_descriptions_status": descriptions["status"],
         "missing_values": missing_values,
         "duplicate_values": duplicate_values,
-        "essential_metrics": df.describe().to_dict(),
+        "essential_metrics": essential_metrics,
     }
 
     return data_summary
 
 
+COLUMN_DESCRIPTION_PROMPT = "Create a table for dataset columns. Write a column name and column descriptions as a table format"
+
+# One background LLM job per file content; finished tables are kept on disk next to the stats sidecars
+_description_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="csv-column-descriptions")
+_description_jobs = {}  # sha256 -> Future
+_description_lock = threading.Lock()
+
+
+def _descriptions_path(filename: str, checksum: str) -> str:
+    directory = os.path.dirname(os.path.abspath(filename))
+    return os.path.join(directory, COLUMNAR_DIR_NAME, f"{checksum}.descriptions.json")
+
+
+def _describe_columns(filename: str, checksum: str) -> str:
+    raw_column_desc = agent_sessions.run_stateless(filename, COLUMN_DESCRIPTION_PROMPT)
+    if isinstance(raw_column_desc, dict) and "error" in raw_column_desc:
+        raise RuntimeError(clean_agent_output(raw_column_desc))
+    column_descriptions = clean_agent_output(raw_column_desc)
+    path = _descriptions_path(filename, checksum)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"sha256": checksum, "column_descriptions": column_descriptions}, f)
+    os.replace(f"{path}.tmp", path)
+    return column_descriptions
+
+
+def column_descriptions(filename: str, start: bool = True) -> dict:
+    """
+    LLM-written column description table for a CSV, keyed by the file's content hash so identical
+    files are only ever described once. Returns {"status": "ready" | "pending" | "error" | "not_started",
+    "column_descriptions": str}; with `start`, a missing or failed description is (re)queued in the background.
+    """
+    checksum = dataframe_store.checksum(filename)
+    try:
+        with open(_descriptions_path(filename, checksum), "r") as f:
+            return {"status": "ready", "column_descriptions": json.load(f)["column_descriptions"]}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    with _description_lock:
+        job = _description_jobs.get(checksum)
+        if start and (job is None or (job.done() and job.exception() is not None)):
+            # Keep the caller's usage scope so the tokens are attributed to the endpoint that asked
+            context = contextvars.copy_context()
+            job = _description_executor.submit(context.run, _describe_columns, filename, checksum)
+            _description_jobs[checksum] = job
+    if job is None:
+        return {"status": "not_started", "column_descriptions": ""}
+    if not job.done():
+        return {"status": "pending", "column_descriptions": ""}
+    if job.exception() is not None:
+        return {"status": "error", "column_descriptions": clean_agent_output(job.exception())}
+    return {"status": "ready", "column_descriptions": job.result()}
+
+
 def get_dataframe(filename: str):
-    """Return dataframe from CSV file."""
-    return pd.read_csv(filename, low_memory=False)
+    """Return dataframe from CSV file, shared through the process-wide cache. Do not mutate it."""
+    return dataframe_store.get(filename)
 
 
 def analyze_trend(filename: str, variable: str):
@@ -122,20 +319,8 @@ def analyze_trend(filename: str, variable: str):
     Ask LLM to interpret the trend of a given variable.
     """
     try:
-        df = pd.read_csv(filename, low_memory=False)
-    except Exception as e:
-        return f"❌ Error loading CSV file: {str(e)}"
-
-    try:
-        pandas_agent = create_pandas_dataframe_agent(
-            llm=selected_llm,
-            df=df,
-            verbose=False,  # Clean output
-            allow_dangerous_code=True,
-            agent_executor_kwargs={"handle_parsing_errors": "True"},
-        )
-
-        raw_response = pandas_agent.invoke(
+        raw_response = agent_sessions.run_stateless(
+            filename,
             f"Interpret the trend of this shortly: {variable}. "
             f"The rows of the dataset are historical."
         )
@@ -147,23 +332,125 @@ def analyze_trend(filename: str, variable: str):
 
 def ask_question(filename: str, question: str):
     """
-    Ask freeform question about dataset using LLM.
+    Ask freeform question about dataset using LLM, as the next turn of the file's chat session.
     """
     try:
-        df = pd.read_csv(filename, low_memory=False)
+        get_dataframe(filename)
     except Exception as e:
         return f"❌ Error loading CSV file: {str(e)}"
 
     try:
-        pandas_agent = create_pandas_dataframe_agent(
-            llm=selected_llm,
-            df=df,
-            verbose=False,  # Clean output
-            allow_dangerous_code=True,
-            agent_executor_kwargs={"handle_parsing_errors": "True"},
-        )
-
-        raw_response = pandas_agent.invoke(question)
+        raw_response = agent_sessions.chat(filename, question)
         return clean_agent_output(raw_response)
     except Exception as e:
         return clean_agent_output(e)  # Handle API errors gracefully
+
+
+# --- Deterministic fast path for common questions ---
+# Questions are normalized (lowercase, no punctuation, no leading "what is"/"show me") and must match one of
+# these patterns in full, so anything with extra conditions ("in 2020", "per country") goes to the agent.
+_LEADING_FILLER = re.compile(
+    r"^(please |can you |could you )?(tell me |show me |give me |list |what is |what's |what are |whats )?(the )?")
+_TRAILING_FILLER = re.compile(r"( in| of| for)? (the |this )?(dataset|data|file|table|csv)$")
+_AGGREGATIONS = {
+    "average": "mean", "mean": "mean", "avg": "mean",
+    "sum": "sum", "total": "sum",
+    "minimum": "min", "min": "min", "lowest": "min", "smallest": "min",
+    "maximum": "max", "max": "max", "highest": "max", "largest": "max",
+    "median": "median",
+    "standard deviation": "std", "std": "std",
+}
+_AGG_WORDS = "|".join(sorted(_AGGREGATIONS, key=len, reverse=True))
+FAST_PATH_PATTERNS = [
+    ("row_count", re.compile(r"^(how many|number of|count of|total number of) (rows|records|entries|observations)( are there| does it have)?$")),
+    ("row_count", re.compile(r"^(row count|shape|size)$")),
+    ("column_count", re.compile(r"^(how many|number of|count of|total number of) (columns|variables|fields)( are there| does it have)?$")),
+    ("column_names", re.compile(r"^(columns|column names|variables)$")),
+    ("missing", re.compile(r"^(how many )?(missing|null|nan|empty) values( are there)?( per column| by column| in each column| for each column)?$")),
+    ("head", re.compile(r"^(first|top) (?P<n>\d+) (rows|records)$")),
+    ("unique", re.compile(r"^(how many )?(number of )?(unique|distinct) (values )?(of |in |for )?(?P<col>.+?)( values)?( are there)?$")),
+    ("top_n", re.compile(rf"^(top|{_AGG_WORDS}) (?P<n>\d+) (rows |records )?(by |of )?(?P<col>.+?)( values)?$")),
+    ("aggregate", re.compile(rf"^(?P<agg>{_AGG_WORDS}) (value )?(of |for |in )?(?P<col>.+?)( column| value| values)?$")),
+]
+
+
+def _normalize_question(question: str) -> str:
+    text = re.sub(r"[?!.]+", " ", question.lower())
+    text = " ".join(text.split())
+    text = _LEADING_FILLER.sub("", text, count=1)
+    return _TRAILING_FILLER.sub("", text).strip()
+
+
+def _resolve_column(df: pd.DataFrame, name: str):
+    """Maps a column mention such as "co2 emissions mt" back to the real column name, or None."""
+    wanted = " ".join(name.replace("_", " ").split())
+    matches = [col for col in df.columns if " ".join(str(col).lower().replace("_", " ").split()) == wanted]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _format_number(value) -> str:
+    if pd.isna(value):
+        return "not available (no values)"
+    if float(value).is_integer():
+        return str(int(value))
+    text = f"{value:,.4f}".rstrip("0").rstrip(".")
+    # Values that round away entirely (e.g. -0.00001) would otherwise show as "-0"
+    return "0" if text == "-0" else text
+
+
+def _fast_path_answer(df: pd.DataFrame, stats: dict, question: str):
+    """Answers `question` with pandas if it matches a known intent, otherwise returns None."""
+    text = _normalize_question(question)
+    for intent, pattern in FAST_PATH_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        column = _resolve_column(df, groups["col"]) if "col" in groups else None
+        if "col" in groups and column is None:
+            continue
+
+        if intent == "row_count":
+            return f"The dataset has {stats['rows']:,} rows and {len(stats['columns'])} columns."
+        if intent == "column_count":
+            return f"The dataset has {len(stats['columns'])} columns: {', '.join(map(str, stats['columns']))}."
+        if intent == "column_names":
+            return "The columns are: " + ", ".join(map(str, stats["columns"])) + "."
+        if intent == "missing":
+            missing = pd.Series(stats["missing_values"], dtype="int64")
+            table = missing.rename("missing_values").to_frame().rename_axis("column").to_markdown()
+            return f"There are {stats['total_missing']:,} missing values in total.\n\n{table}"
+        if intent == "head":
+            return df.head(int(groups["n"])).to_markdown(index=False)
+        if intent == "unique":
+            return f"{column} has {df[column].nunique():,} unique values."
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            return None
+        if intent == "top_n":
+            n = int(groups["n"])
+            ascending = _AGGREGATIONS.get(match.group(1)) == "min"
+            rows = df.nsmallest(n, column) if ascending else df.nlargest(n, column)
+            return rows.to_markdown(index=False)
+        if intent == "aggregate":
+            agg = _AGGREGATIONS[groups["agg"]]
+            label = {"mean": "average", "min": "minimum", "max": "maximum", "std": "standard deviation"}.get(agg, agg)
+            return f"The {label} of {column} is {_format_number(getattr(df[column], agg)())}."
+    return None
+
+
+def answer_question(filename: str, question: str) -> dict:
+    """
+    Routes a question about a CSV: common aggregate questions are answered exactly with pandas,
+    everything else goes to the file's chat agent. Returns the answer and the path used
+    ("fast_path" or "agent").
+    """
+    try:
+        df = get_dataframe(filename)
+        answer = _fast_path_answer(df, dataframe_store.stats(filename), question)
+    except Exception as e:
+        print(f"Fast path failed for '{question}', falling back to the agent: {e}")
+        answer = None
+    if answer is not None:
+        agent_sessions.remember(filename, question, answer)
+        return {"answer": answer, "path": "fast_path"}
+    return {"answer": ask_question(filename, question), "path": "agent"}
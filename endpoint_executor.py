@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, Request
+
+# Running calls per endpoint, and how many more may wait for a slot before new requests get 429
+CSV_ENDPOINT_CONCURRENCY = int(os.getenv("CSV_ENDPOINT_CONCURRENCY", "4"))
+CSV_ENDPOINT_QUEUE = int(os.getenv("CSV_ENDPOINT_QUEUE", "16"))
+# How often a waiting request checks whether its client has gone away
+DISCONNECT_POLL_S = 0.25
+
+
+class ClientDisconnected(HTTPException):
+    def __init__(self):
+        # 499 is nginx's "client closed request"; nobody reads it, but it keeps the access log honest
+        super().__init__(status_code=499, detail="Client closed request")
+
+
+class BoundedEndpointExecutor:
+    """
+    Runs blocking endpoint work on a dedicated thread pool so the event loop stays free.
+
+    Each endpoint has its own limit of running calls and a bounded queue of waiting ones; once both are
+    full, new requests are rejected with 429 and a Retry-After header. A request whose client disconnects
+    while queued is dropped before it starts. Work already running in a thread cannot be interrupted, so
+    it runs to completion but its result is discarded, and it keeps its slot until then.
+    """
+
+    def __init__(self, limits: Dict[str, int], max_queued: int = CSV_ENDPOINT_QUEUE, retry_after_s: int = 5):
+        self.limits = dict(limits)
+        self.max_queued = max_queued
+        self.retry_after_s = retry_after_s
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()),
+                                            thread_name_prefix="endpoint-worker")
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._admitted: Dict[str, int] = {name: 0 for name in self.limits}
+
+    def _semaphore(self, name: str) -> asyncio.Semaphore:
+        # Created lazily so they belong to the running event loop
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(self.limits[name])
+        return self._semaphores[name]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"limit": limit, "admitted": self._admitted[name], "max_queued": self.max_queued}
+            for name, limit in self.limits.items()
+        }
+
+    async def run(self, name: str, request: Request, func: Callable[..., Any], *args: Any) -> Any:
+        if self._admitted[name] >= self.limits[name] + self.max_queued:
+            raise HTTPException(status_code=429, detail=f"Too many concurrent {name} requests, please retry shortly",
+                                headers={"Retry-After": str(self.retry_after_s)})
+        self._admitted[name] += 1
+        try:
+            semaphore = self._semaphore(name)
+            await _until_disconnected(request, asyncio.ensure_future(semaphore.acquire()))
+
+            loop = asyncio.get_running_loop()
+            # Copy the context so the usage scope set by the middleware follows the call into the thread
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, func, *args)
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(semaphore.release))
+            return await _until_disconnected(request, asyncio.wrap_future(future), on_disconnect=future.cancel)
+        finally:
+            self._admitted[name] -= 1
+
+
+async def _until_disconnected(request: Request, task: "asyncio.Future", on_disconnect: Callable[[], Any] = None):
+    """Awaits `task`, cancelling it and raising ClientDisconnected if the client goes away first."""
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            if on_disconnect is not None:
+                on_disconnect()
+            # A task that completed in the meantime keeps its result (and any semaphore it acquired)
+            if task.cancel():
+                raise ClientDisconnected()
+            return task.result()
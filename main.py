@@ -14,6 +14,7 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, UploadFile, File
 import tempfile
 from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -33,12 +34,20 @@ from chromadb.utils import embedding_functions
 
 # CSV processing
 import datahelper
+from dataframe_store import dataframe_store, CSVStreamInspector, find_by_checksum
+from endpoint_executor import BoundedEndpointExecutor, CSV_ENDPOINT_CONCURRENCY
+from sandbox_pool import sandbox_pool, CSV_AGENT_SANDBOX
+from modules.llm.usage import usage_scope, usage_tracker, usage_callback, start_periodic_summary
 
 # --- Load Environment Variables ---
 load_dotenv()
 JINA_API_KEY = os.getenv("JINA_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
+SERPER_API_URL = os.getenv("SERPER_API_URL", "https://google.serper.dev/search")
+# LLM used by crawl4ai for /summarize extraction; the base URL can point at any OpenAI-compatible server
+SUMMARIZE_LLM_PROVIDER = os.getenv("SUMMARIZE_LLM_PROVIDER", "groq/llama-3.3-70b-versatile")
+SUMMARIZE_LLM_BASE_URL = os.getenv("SUMMARIZE_LLM_BASE_URL")
 
 # --- FastAPI App Setup ---
 app = FastAPI(title="OpenCurrent", version="3.3.0")
@@ -46,6 +55,47 @@ app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], all
 BASE_DIR = Path(__file__).parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+UPLOADS_DIR = BASE_DIR / "uploads"
+CSV_UPLOAD_MAX_BYTES = int(float(os.getenv("CSV_UPLOAD_MAX_MB", "500")) * 1024 * 1024)
+CSV_UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Blocking CSV parsing and pandas-agent calls run here, off the event loop, with per-endpoint limits
+csv_executor = BoundedEndpointExecutor({
+    "summarize": CSV_ENDPOINT_CONCURRENCY,
+    "analyze_trend": CSV_ENDPOINT_CONCURRENCY,
+    "ask_question": CSV_ENDPOINT_CONCURRENCY,
+    "chat": CSV_ENDPOINT_CONCURRENCY,
+})
+
+class LLMUsageScopeMiddleware:
+    """
+    Attributes every LLM call made while serving a request to its endpoint. Plain ASGI rather than
+    @app.middleware("http"), which would hide client disconnects from the endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with usage_scope(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+app.add_middleware(LLMUsageScopeMiddleware)
+
+@app.on_event("startup")
+async def start_llm_usage_summary():
+    start_periodic_summary()
+
+@app.on_event("startup")
+async def start_sandbox_pool():
+    # Pre-start the workers that run pandas-agent code, so the first question does not wait for them
+    if CSV_AGENT_SANDBOX:
+        await run_in_threadpool(sandbox_pool.start)
+
+@app.on_event("shutdown")
+async def stop_sandbox_pool():
+    sandbox_pool.shutdown()
 
 # --- History & Knowledge Base Management ---
 HISTORY_FILE = Path("history.json")
@@ -114,7 +164,7 @@ chroma_client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
 embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
 
 # --- LangChain Models & Chains ---
-rag_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1, api_key=GROQ_API_KEY)
+rag_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1, api_key=GROQ_API_KEY, callbacks=[usage_callback])
 rag_prompt_template = """
 You are an expert assistant. Answer the user's question based ONLY on the following context.
 If the information is not in the context, say "I cannot answer that based on the provided website content."
@@ -142,7 +192,7 @@ class PageSummary(LangChainBaseModel):
     projects_activities: Optional[List[str]] = LangChainField(default=[], description="List of mentioned projects, activities, initiatives, or programs.")
     locations: Optional[List[str]] = LangChainField(default=[], description="List of mentioned locations, cities, countries, or geographic areas.")
 
-summarization_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0, api_key=GROQ_API_KEY)
+summarization_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0, api_key=GROQ_API_KEY, callbacks=[usage_callback])
 summarization_parser = PydanticOutputParser(pydantic_object=PageSummary)
 summarization_prompt_template = """
 You are a meticulous information extraction expert. Analyze the following web page content and extract the requested information.
@@ -279,6 +329,14 @@ async def landing_page(request: Request):
 async def get_history():
     return load_history()
 
+@app.get("/metrics/llm-usage", response_class=JSONResponse)
+async def get_llm_usage():
+    return usage_tracker.snapshot()
+
+@app.get("/metrics/csv-executor", response_class=JSONResponse)
+async def get_csv_executor_stats():
+    return {"endpoints": csv_executor.stats(), "sandbox_workers": sandbox_pool.stats()}
+
 @app.get("/knowledge-base", response_class=JSONResponse)
 async def get_knowledge_base_entries():
     entries = load_knowledge_base()
@@ -310,7 +368,7 @@ async def delete_knowledge_base_entry(entry_id: str):
 async def search_endpoint(data: SearchRequest):
     if not SERPER_API_KEY:
         raise HTTPException(status_code=500, detail="Serper API key is not configured.")
-    search_url = "https://google.serper.dev/search"
+    search_url = SERPER_API_URL
     payload = {"q": data.query, "num": 10}
     if data.type == "news": payload["tbs"] = "qdr:d"
     elif data.type == "places": payload["type"] = "places"
@@ -347,7 +405,7 @@ async def search_endpoint(data: SearchRequest):
 async def summarize_endpoint(data: SummarizeRequest):
     url = str(data.url)
     try:
-        llm_config = LLMConfig(provider="groq/llama-3.3-70b-versatile", api_token=GROQ_API_KEY)
+        llm_config = LLMConfig(provider=SUMMARIZE_LLM_PROVIDER, api_token=GROQ_API_KEY, base_url=SUMMARIZE_LLM_BASE_URL)
         # The instruction is now simpler, letting the schema guide the LLM
         extraction_strategy = LLMExtractionStrategy(
             llm_config=llm_config,
@@ -364,6 +422,10 @@ async def summarize_endpoint(data: SummarizeRequest):
         async with AsyncWebCrawler() as crawler:
             result = await crawler.arun(url=url, config=crawler_config)
 
+        # crawl4ai calls the LLM through litellm, so LangChain callbacks never see it
+        for usage in extraction_strategy.usages:
+            usage_tracker.record(llm_config.provider, usage.prompt_tokens, usage.completion_tokens)
+
         if not result.success or not result.extracted_content:
             raise HTTPException(status_code=400, detail=f"Failed to crawl or extract summary: {result.error_message}")
         
@@ -445,91 +507,136 @@ async def chat_endpoint(request: ChatRequest):
         raise HTTPException(status_code=500, detail="An error occurred during chat.")
 
 @app.post("/csv/upload")
-async def upload_csv(file: UploadFile = File(...)):
+async def upload_csv(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     if not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
     
     # Ensure uploads directory exists
-    uploads_dir = BASE_DIR / "uploads"
-    uploads_dir.mkdir(exist_ok=True)
+    UPLOADS_DIR.mkdir(exist_ok=True)
     
-    # Save file
-    file_path = uploads_dir / file.filename
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Stream to a temporary file in chunks, checking size and content as they arrive
+    file_path = UPLOADS_DIR / file.filename
+    inspector = CSVStreamInspector()
+    fd, tmp_name = tempfile.mkstemp(dir=UPLOADS_DIR, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await file.read(CSV_UPLOAD_CHUNK_BYTES):
+                if inspector.size + len(chunk) > CSV_UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"CSV files are limited to {CSV_UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+                try:
+                    inspector.update(chunk)
+                except ValueError as e:
+                    raise HTTPException(status_code=415, detail=str(e))
+                f.write(chunk)
+        if inspector.size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+        # Identical content already uploaded (under this or another name): keep the existing copy
+        existing = find_by_checksum(str(UPLOADS_DIR), inspector.hexdigest)
+        if existing:
+            os.remove(tmp_name)
+            return {"message": "File already uploaded", "filename": os.path.basename(existing), "duplicate": True}
+
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+    dataframe_store.record_upload(str(file_path), inspector.summary())
+
+    # Typed columnar copy + stats sidecar, so later requests skip the CSV parse
+    try:
+        await run_in_threadpool(dataframe_store.convert_to_columnar, str(file_path))
+    except Exception as e:
+        print(f"Could not create columnar copy of {file.filename}, falling back to CSV: {e}")
+
+    # Load the frame into the sandbox workers after responding, so the agent's first question does not wait for it
+    if CSV_AGENT_SANDBOX:
+        background_tasks.add_task(sandbox_pool.preload, str(file_path))
     
     return {"message": "File uploaded successfully", "filename": file.filename}
 
 @app.post("/csv/summarize")
-async def summarize_csv_endpoint(data: CSVUploadRequest):
-    file_path = BASE_DIR / "uploads" / data.filename
+async def summarize_csv_endpoint(data: CSVUploadRequest, request: Request):
+    file_path = UPLOADS_DIR / data.filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="CSV file not found")
 
     try:
-        summary = datahelper.summerize_csv(str(file_path))
+        summary = await csv_executor.run("summarize", request, datahelper.summerize_csv, str(file_path))
 
         # Transform datahelper output to frontend expected format
-        df = datahelper.get_dataframe(str(file_path))
+        stats = await run_in_threadpool(dataframe_store.stats, str(file_path))
 
         # Extract missing values count
-        missing_count = df.isnull().sum().sum()
+        missing_count = stats["total_missing"]
         missing_text = summary.get("missing_values", f"There are {missing_count} missing values")
 
         # Extract duplicates count
-        duplicates_count = df.duplicated().sum()
+        duplicates_count = stats["duplicate_rows"]
         duplicates_text = summary.get("duplicate_values", f"There are {duplicates_count} duplicate values")
 
         # Build response
         response = {
-            "shape": [df.shape[0], df.shape[1]],
-            "columns": df.columns.tolist(),
-            "sample_rows": df.head().to_dict('records'),
+            "shape": [stats["rows"], len(stats["columns"])],
+            "columns": stats["columns"],
+            "sample_rows": summary.get("initial_data_sample", []),
             "missing_values": missing_text,
             "duplicates": duplicates_text,
             "column_descriptions": summary.get("column_descriptions", ""),
+            "column_descriptions_status": summary.get("column_descriptions_status", "ready"),
             "essential_metrics": summary.get("essential_metrics", {})
         }
 
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error summarizing CSV: {e}")
         raise HTTPException(status_code=500, detail=f"Error summarizing CSV: {str(e)}")
 
+@app.get("/csv/column-descriptions/{filename}")
+async def csv_column_descriptions(filename: str):
+    file_path = UPLOADS_DIR / filename
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="CSV file not found")
+    return await run_in_threadpool(datahelper.column_descriptions, str(file_path), False)
+
 @app.post("/csv/analyze-trend")
-async def analyze_trend_endpoint(data: CSVAnalyzeTrendRequest):
-    file_path = BASE_DIR / "uploads" / data.filename
+async def analyze_trend_endpoint(data: CSVAnalyzeTrendRequest, request: Request):
+    file_path = UPLOADS_DIR / data.filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="CSV file not found")
     
     try:
-        result = datahelper.analyze_trend(str(file_path), data.variable)
+        result = await csv_executor.run("analyze_trend", request, datahelper.analyze_trend, str(file_path), data.variable)
         return {"analysis": result}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error analyzing trend: {e}")
         raise HTTPException(status_code=500, detail=f"Error analyzing trend: {str(e)}")
 
 @app.post("/csv/ask-question")
-async def ask_question_endpoint(data: CSVQuestionRequest):
-    file_path = BASE_DIR / "uploads" / data.filename
+async def ask_question_endpoint(data: CSVQuestionRequest, request: Request):
+    file_path = UPLOADS_DIR / data.filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="CSV file not found")
     
     try:
-        result = datahelper.ask_question(str(file_path), data.question)
-        return {"answer": result}
+        return await csv_executor.run("ask_question", request, datahelper.answer_question, str(file_path), data.question)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error answering question: {e}")
         raise HTTPException(status_code=500, detail=f"Error answering question: {str(e)}")
 
 @app.get("/csv/list")
 async def list_csv_files():
-    uploads_dir = BASE_DIR / "uploads"
-    if not uploads_dir.exists():
+    if not UPLOADS_DIR.exists():
         return {"files": []}
 
-    files = [f.name for f in uploads_dir.glob("*.csv") if f.is_file()]
+    files = [f.name for f in UPLOADS_DIR.glob("*.csv") if f.is_file()]
     return {"files": files}
 
 # CSV Chat functionality
@@ -537,18 +644,18 @@ class CSVChatRequest(BaseModel):
     filename: str
     message: str
 
-csv_chat_sessions = {}  # filename -> list of messages (but simplified for now)
-
 @app.post("/csv/chat")
-async def csv_chat_endpoint(data: CSVChatRequest):
-    file_path = BASE_DIR / "uploads" / data.filename
+async def csv_chat_endpoint(data: CSVChatRequest, request: Request):
+    file_path = UPLOADS_DIR / data.filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="CSV file not found")
 
     try:
-        # For now, just use the ask_question function. Could be enhanced to maintain chat history
-        result = datahelper.ask_question(str(file_path), data.message)
-        return {"response": result}
+        # Same per-file agent session as /csv/ask-question, which keeps the conversation history
+        result = await csv_executor.run("chat", request, datahelper.answer_question, str(file_path), data.message)
+        return {"response": result["answer"], "path": result["path"]}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in CSV chat: {e}")
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
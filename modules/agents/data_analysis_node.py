@@ -2,16 +2,22 @@ import logging
 import pandas as pd
 import json
 import os
-import time
 import requests
 from typing import Dict, Any, Optional
 import numpy as np
 from dotenv import load_dotenv
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
+from graph.effects import Blocking, LLMCall, NodeSteps, Sleep, arun_node, run_node
+from graph.run_context import get_run_context
 from graph.state import GraphState
+from llm.cache import prompt_cache_scope
+from llm.clients import get_chat_model
+from llm.usage import usage_scope, usage_tracker
+from profiling.frame import profile_dataframe
+from profiling.render import render_profile
+from profiling.streaming import profile_csv, should_stream
 from schemas.messages import DataProfile
 load_dotenv()
 
@@ -27,10 +33,37 @@ class DataFrameProfileOutput(BaseModel):
         description="Key observations about the dataset's structure, quality, and potential issues (e.g., missing values, outliers, data types that need conversion).")
 
 
+def _build_profile(state: GraphState, file_path: str) -> Dict[str, Any]:
+    request_id = state.get('request_id', 'unknown_request')
+    if should_stream(file_path):
+        # Too large to load at once: profile in chunks with sketches instead of in memory
+        streamed = profile_csv(file_path)
+        if streamed["num_rows"] == 0:
+            raise ValueError("Uploaded CSV is empty.")
+        logger.info(f"Profiled {streamed['num_rows']} rows in chunks for request {request_id} "
+                    f"(approximate: {streamed['approximate']})")
+        return {key: streamed[key] for key in ("num_rows", "num_columns", "column_details", "key_observations")}
+    df = get_run_context(state).dataframe()
+    if df.empty:
+        raise ValueError("Uploaded CSV is empty.")
+    return profile_dataframe(df)
+
+
+@usage_scope("graph:data_analysis")
 def data_analysis_node(state: GraphState) -> GraphState:
     """
     Performs initial data profiling and analysis based on the uploaded CSV.
     """
+    return run_node(_data_analysis_steps(state))
+
+
+async def adata_analysis_node(state: GraphState) -> GraphState:
+    """Async variant of data_analysis_node for the async graph."""
+    with usage_scope("graph:data_analysis"):
+        return await arun_node(_data_analysis_steps(state))
+
+
+def _data_analysis_steps(state: GraphState) -> NodeSteps:
     # request_id = state['request_id']
     # file_path = state['file_path']
     # instructions = state['instructions']
@@ -56,7 +89,7 @@ def data_analysis_node(state: GraphState) -> GraphState:
     # llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
     # Initialize the LLM once, outside the retry loop
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
+        llm = get_chat_model("gemini-2.5-flash", temperature=0.7)
     except Exception as e:
         logger.error(f"Failed to initialize LLM for data analysis: {e}", exc_info=True)
         state['status'] = "error"
@@ -64,66 +97,18 @@ def data_analysis_node(state: GraphState) -> GraphState:
         return state
 
     try:
-        df = pd.read_csv(file_path)
-        if df.empty:
-            raise ValueError("Uploaded CSV is empty.")
+        profile_data = yield Blocking(_build_profile, (state, file_path))
     except Exception as e:
         logger.error(f"Error loading data for request {request_id}: {e}", exc_info=True)
         state['status'] = "error"
         state['error_message'] = f"Failed to load or process CSV file: {e}"
         return state
 
-    profile_data = {
-        "num_rows": len(df),
-        "num_columns": len(df.columns),
-        "column_details": {},
-        "key_observations": ""
-    }
-
-    for col in df.columns:
-        col_type = str(df[col].dtype)
-
-        # Convert to standard Python int
-        unique_values = int(df[col].nunique())
-        missing_values_count = int(df[col].isnull().sum())
-
-        detail: Dict[str, Any] = {
-            "type": col_type,
-            "unique_values_count": unique_values,
-            "missing_values_count": missing_values_count,
-            "missing_values_percentage": f"{(missing_values_count / len(df) * 100):.2f}%"
-        }
-
-        if pd.api.types.is_numeric_dtype(df[col]):
-            # Convert to standard Python float/int, handling NaN values
-            mean_val = df[col].mean()
-            detail["mean"] = float(mean_val) if pd.notna(mean_val) else None
-
-            std_val = df[col].std()
-            detail["std"] = float(std_val) if pd.notna(std_val) else None
-
-            min_val = df[col].min()
-            if pd.notna(min_val):
-                detail["min"] = float(min_val) if isinstance(min_val, (np.floating, float)) else int(min_val)
-            else:
-                detail["min"] = None
-
-            max_val = df[col].max()
-            if pd.notna(max_val):
-                detail["max"] = float(max_val) if isinstance(max_val, (np.floating, float)) else int(max_val)
-            else:
-                detail["max"] = None
-
-            # Convert quantiles to standard Python floats
-            quantiles_dict = df[col].quantile([0.25, 0.5, 0.75]).to_dict()
-            detail["quantiles"] = {k: float(v) if pd.notna(v) else None for k, v in quantiles_dict.items()}
-
-        elif pd.api.types.is_string_dtype(df[col]) or pd.api.types.is_object_dtype(df[col]):
-            # Convert values in top_5_values to native int
-            top_5_values_dict = df[col].value_counts().nlargest(5).to_dict()
-            detail["top_5_values"] = {k: int(v) for k, v in top_5_values_dict.items()}
-
-        profile_data["column_details"][col] = detail
+    rendered_profile = render_profile(profile_data, relevant_to=instructions or "")
+    usage_tracker.record_tokens_saved(rendered_profile.tokens_saved)
+    logger.info(f"Profile for request {request_id} rendered in ~{rendered_profile.tokens} tokens "
+                f"({rendered_profile.columns_shown}/{rendered_profile.columns_total} columns, "
+                f"{rendered_profile.tokens_saved} fewer than JSON)")
 
     # --- LLM Interaction with Retry Logic ---
     max_retries = 3
@@ -164,14 +149,10 @@ def data_analysis_node(state: GraphState) -> GraphState:
                 partial_variables={"format_instructions": parser.get_format_instructions()},
             )
 
-            # try:
-                # profile_data_str is now guaranteed to be JSON serializable
-            profile_data_str = json.dumps(profile_data, indent=2)
-
-            llm_response = llm.invoke(prompt.invoke({
-                "profile_data": profile_data_str,
+            llm_response = yield LLMCall(llm, prompt.invoke({
+                "profile_data": rendered_profile.text,
                 "instructions": instructions
-            }),config={"request_options": {"timeout": 60}})
+            }), config={"request_options": {"timeout": 60}}, cache=prompt_cache_scope(state))
             llm_raw_output_str = llm_response.content
             stripped_str = llm_raw_output_str.strip()
             if "I am a report generator AI and do not have information on that topic" in stripped_str:
@@ -208,9 +189,10 @@ def data_analysis_node(state: GraphState) -> GraphState:
         except (requests.exceptions.RequestException, TimeoutError) as e:
             logger.warning(f"LLM call failed on attempt {attempt + 1}/{max_retries} due to network/timeout: {e}")
             if attempt < max_retries - 1:
+                usage_tracker.record_retry()
                 delay = base_delay * (2 ** attempt)
                 logger.info(f"Retrying LLM call for request {request_id} in {delay} seconds...")
-                time.sleep(delay)
+                yield Sleep(delay)
             else:
                 logger.error(f"Max retries reached. LLM call failed for request {request_id}.")
                 state['status'] = "error"
@@ -1,14 +1,18 @@
 import logging
 import json
 import os
-import time
 import requests
 from typing import List
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field, ValidationError
+from agents.visualization_node import planned_visuals
+from graph.effects import LLMCall, NodeSteps, Sleep, arun_node, run_node
 from graph.state import GraphState
+from llm.cache import prompt_cache_scope
+from profiling.render import render_profile
+from llm.clients import get_chat_model
+from llm.usage import usage_scope, usage_tracker
 from schemas.messages import AnalysisInsight
 logger = logging.getLogger(__name__)
 class GeneratedInsightsOutput(BaseModel):
@@ -16,10 +20,21 @@ class GeneratedInsightsOutput(BaseModel):
         description="A list of key insights derived from the data profile and visualizations.")
 
 
+@usage_scope("graph:insight_generation")
 def insight_generation_node(state: GraphState) -> GraphState:
     """
     Generates high-level analytical insights based on the data profile and generated visuals.
     """
+    return run_node(_insight_generation_steps(state))
+
+
+async def ainsight_generation_node(state: GraphState) -> GraphState:
+    """Async variant of insight_generation_node for the async graph."""
+    with usage_scope("graph:insight_generation"):
+        return await arun_node(_insight_generation_steps(state))
+
+
+def _insight_generation_steps(state: GraphState) -> NodeSteps:
     request_id = state['request_id']
     # instructions = state['instructions']
     # dataframe_profile = state['dataframe_profile']
@@ -27,7 +42,8 @@ def insight_generation_node(state: GraphState) -> GraphState:
 
     instructions = state.get('instructions', "")
     dataframe_profile = state.get('dataframe_profile', None)
-    generated_visuals = state.get('generated_visuals', None)
+    # In the parallel graph the charts are still rendering; insights are drawn from the planned charts
+    generated_visuals = state.get('generated_visuals') or planned_visuals(state)
 
     if not dataframe_profile or not generated_visuals:
         logger.error(f"Missing data profile or visuals for request {request_id}.")
@@ -47,7 +63,7 @@ def insight_generation_node(state: GraphState) -> GraphState:
 
     # llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
+        llm = get_chat_model("gemini-2.5-flash", temperature=0.7)
     except Exception as e:
         logger.error(f"Failed to initialize LLM for insight generation: {e}", exc_info=True)
         state['status'] = "error"
@@ -56,12 +72,9 @@ def insight_generation_node(state: GraphState) -> GraphState:
 
     profile_summary = ""
     if dataframe_profile:
-        profile_summary = f"Dataset Profile Summary:\nRows: {dataframe_profile.num_rows}\nColumns: {dataframe_profile.num_columns}\nKey Observations: {dataframe_profile.key_observations}\n\nColumn Details (Type, Missing Values, Stats):\n"
-        for col_name, details in dataframe_profile.column_details.items():
-            profile_summary += f"- {col_name} (Type: {details.get('type', 'N/A')}): Unique: {details.get('unique_values_count', 'N/A')}, Missing: {details.get('missing_values_percentage', 'N/A')}%"
-            if 'mean' in details:
-                profile_summary += f", Mean: {details['mean']:.2f}, Std: {details['std']:.2f}"
-            profile_summary += "\n"
+        rendered_profile = render_profile(dataframe_profile, relevant_to=instructions or "")
+        usage_tracker.record_tokens_saved(rendered_profile.tokens_saved)
+        profile_summary = rendered_profile.text
 
     visuals_context = ""
     if generated_visuals:
@@ -124,11 +137,11 @@ def insight_generation_node(state: GraphState) -> GraphState:
                 partial_variables={"format_instructions": parser.get_format_instructions()},
             )
 
-            llm_response = llm.invoke(prompt.invoke({
+            llm_response = yield LLMCall(llm, prompt.invoke({
                 "profile_summary": profile_summary,
                 "visuals_context": visuals_context,
                 "instructions": instructions
-            }), config={"request_options": {"timeout": 60}})
+            }), config={"request_options": {"timeout": 60}}, cache=prompt_cache_scope(state))
             llm_raw_output_str = llm_response.content
 
             stripped_str = llm_raw_output_str.strip()
@@ -145,9 +158,10 @@ def insight_generation_node(state: GraphState) -> GraphState:
         except (requests.exceptions.RequestException, TimeoutError) as e:
             logger.warning(f"LLM call failed on attempt {attempt + 1}/{max_retries} due to network/timeout: {e}")
             if attempt < max_retries - 1:
+                usage_tracker.record_retry()
                 delay = base_delay * (2 ** attempt)
                 logger.info(f"Retrying LLM call for request {request_id} in {delay} seconds...")
-                time.sleep(delay)
+                yield Sleep(delay)
             else:
                 logger.error(f"Max retries reached. LLM call failed for request {request_id}.")
                 state['status'] = "error"
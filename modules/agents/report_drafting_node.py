@@ -1,25 +1,49 @@
 import logging
 import json
 import os
-import time
 import requests
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Dict, List
 from pydantic import BaseModel, Field, ValidationError
+from agents.report_sections import SectionText, draft_sections, failing_sections, format_sections, replace_sections
+from graph.effects import LLMCall, NodeSteps, Sleep, arun_node, run_node
 from graph.state import GraphState
-from schemas.messages import ReportSectionsDraft
+from llm.clients import get_chat_model
+from profiling.render import render_profile
+from llm.usage import usage_scope, usage_tracker
+from schemas.messages import ReportSectionsDraft, SectionVerdict
 
 logger = logging.getLogger(__name__)
 
 
 # The Pydantic model for the LLM's output is already defined in messages.py as ReportSectionsDraft
 
+
+class RedraftedSections(BaseModel):
+    """
+    A Pydantic model to validate the LLM's rewrite of the sections that failed the safety check.
+    """
+    sections: Dict[str, SectionText] = Field(
+        description="The rewritten sections by section id; 'key_takeaways' is a list of bullet points.")
+
+@usage_scope("graph:report_drafting")
 def report_drafting_node(state: GraphState) -> GraphState:
     """
     Generates the initial draft of the report sections (introduction, narratives, takeaways, conclusion)
-    based on the data profile, generated insights, and visuals.
+    based on the data profile, generated insights, and visuals. After a failed safety check with
+    per-section verdicts, only the failing sections are rewritten and the rest of the draft is kept.
     """
+    return run_node(_report_drafting_steps(state))
+
+
+async def areport_drafting_node(state: GraphState) -> GraphState:
+    """Async variant of report_drafting_node for the async graph."""
+    with usage_scope("graph:report_drafting"):
+        return await arun_node(_report_drafting_steps(state))
+
+
+def _report_drafting_steps(state: GraphState) -> NodeSteps:
     request_id = state['request_id']
     # instructions = state['instructions']
     # dataframe_profile = state['dataframe_profile']
@@ -51,7 +75,7 @@ def report_drafting_node(state: GraphState) -> GraphState:
         return state
 
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
+        llm = get_chat_model("gemini-2.5-flash", temperature=0.7)
     except Exception as e:
         logger.error(f"Failed to initialize LLM for report drafting: {e}", exc_info=True)
         state['status'] = "error"
@@ -61,12 +85,11 @@ def report_drafting_node(state: GraphState) -> GraphState:
     # Prepare context for the LLM
     profile_summary = ""
     if dataframe_profile:
-        profile_summary = f"Dataset Profile Summary:\nRows: {dataframe_profile.num_rows}\nColumns: {dataframe_profile.num_columns}\nKey Observations: {dataframe_profile.key_observations}\n\nColumn Details:\n"
-        for col_name, details in dataframe_profile.column_details.items():
-            profile_summary += f"- {col_name} (Type: {details.get('type', 'N/A')}): Unique: {details.get('unique_values_count', 'N/A')}, Missing: {details.get('missing_values_percentage', 'N/A')}%"
-            if 'mean' in details:
-                profile_summary += f", Mean: {details['mean']:.2f}, Std: {details['std']:.2f}"
-            profile_summary += "\n"
+        # Columns the insights talk about are the ones the narratives will quote
+        rendered_profile = render_profile(dataframe_profile, relevant_to=" ".join(
+            [instructions or ""] + [f"{insight.title} {insight.narrative}" for insight in analysis_insights]))
+        usage_tracker.record_tokens_saved(rendered_profile.tokens_saved)
+        profile_summary = rendered_profile.text
 
     insights_context = ""
     if analysis_insights:
@@ -91,6 +114,13 @@ def report_drafting_node(state: GraphState) -> GraphState:
                 "visual_id": visual.visual_id,
                 "description": visual.description
             })
+
+    previous_draft = state.get('report_sections_draft')
+    failed_sections = failing_sections(previous_draft, state.get('section_verdicts')) if previous_draft else []
+    if failed_sections:
+        return (yield from _redraft_sections_steps(state, llm, previous_draft, failed_sections, profile_summary,
+                                                   visual_reference_for_llm))
+
     max_retries = 3
     base_delay = 2  # seconds
     llm_raw_output_str = ""
@@ -153,7 +183,7 @@ def report_drafting_node(state: GraphState) -> GraphState:
             )
 
 
-            llm_response = llm.invoke(prompt.invoke({
+            llm_response = yield LLMCall(llm, prompt.invoke({
                 "profile_summary": profile_summary,
                 "insights_context": insights_context,
                 "visuals_context": visuals_context,
@@ -180,9 +210,10 @@ def report_drafting_node(state: GraphState) -> GraphState:
         except (requests.exceptions.RequestException, TimeoutError) as e:
             logger.warning(f"LLM call failed on attempt {attempt + 1}/{max_retries} due to network/timeout: {e}")
             if attempt < max_retries - 1:
+                usage_tracker.record_retry()
                 delay = base_delay * (2 ** attempt)
                 logger.info(f"Retrying LLM call for request {request_id} in {delay} seconds...")
-                time.sleep(delay)
+                yield Sleep(delay)
             else:
                 logger.error(f"Max retries reached. LLM call failed for request {request_id}.")
                 state['status'] = "error"
@@ -218,3 +249,115 @@ def report_drafting_node(state: GraphState) -> GraphState:
 
 
 
+
+
+def _redraft_sections_steps(state: GraphState, llm, report_draft: ReportSectionsDraft,
+                            failed_sections: List[SectionVerdict], profile_summary: str,
+                            visual_reference_for_llm: list) -> NodeSteps:
+    """Rewrites only the sections the safety check rejected, keeping the rest of `report_draft`."""
+    request_id = state['request_id']
+    sections = draft_sections(report_draft)
+    section_ids = [verdict.section for verdict in failed_sections]
+    logger.info(f"Redrafting sections {', '.join(section_ids)} for request {request_id}")
+
+    reviewer_feedback = "\n".join(f"- {verdict.section}: {verdict.reasoning}" for verdict in failed_sections)
+    max_retries = 3
+    base_delay = 2  # seconds
+    llm_raw_output_str = ""
+
+    for attempt in range(max_retries):
+        try:
+            logger.info(f"Attempt {attempt + 1}/{max_retries} to invoke LLM for section redrafting...")
+            parser = JsonOutputParser(pydantic_object=RedraftedSections)
+            prompt = PromptTemplate(
+                template="""
+                You are an expert report writer and data storyteller.
+                A reviewer rejected some sections of a data analysis report draft as unsafe or inaccurate.
+                Rewrite ONLY these sections so that they address the reviewer's feedback and are consistent
+                with the dataset profile and the user's instructions.
+
+                Keep every figure placeholder (e.g. '[FIGURE 1]') that a section uses, keep an analysis
+                narrative's title followed by ':-', and return 'key_takeaways' as a list of bullet points.
+
+                ---
+                Sections to rewrite:
+                {sections}
+
+                ---
+                Reviewer feedback:
+                {reviewer_feedback}
+
+                ---
+                Dataset Profile:
+                {profile_summary}
+
+                ---
+                Available Visual IDs and Descriptions: {visual_reference_for_llm}
+
+                ---
+                User Request/Instructions for the Report:
+                {instructions}
+
+                {format_instructions}
+
+                Ensure your response is valid JSON.
+                """,
+                input_variables=["sections", "reviewer_feedback", "profile_summary", "visual_reference_for_llm",
+                                 "instructions"],
+                partial_variables={"format_instructions": parser.get_format_instructions()},
+            )
+
+            llm_response = yield LLMCall(llm, prompt.invoke({
+                "sections": format_sections({section_id: sections[section_id] for section_id in section_ids}),
+                "reviewer_feedback": reviewer_feedback,
+                "profile_summary": profile_summary,
+                "visual_reference_for_llm": visual_reference_for_llm,
+                "instructions": state.get('instructions', ""),
+            }), config={"request_options": {"timeout": 60}})
+            llm_raw_output_str = llm_response.content
+
+            stripped_str = llm_raw_output_str.strip()
+            if stripped_str.startswith("```json") and stripped_str.endswith("```"):
+                json_str = stripped_str[len("```json"):-len("```")].strip()
+            else:
+                json_str = stripped_str
+
+            redrafted = RedraftedSections.model_validate(json.loads(json_str))
+            updates = {section_id: text for section_id, text in redrafted.sections.items() if section_id in section_ids}
+            missing = [section_id for section_id in section_ids if section_id not in updates]
+            if missing:
+                logger.warning(f"Redraft for request {request_id} left sections unchanged: {', '.join(missing)}")
+
+            state['report_sections_draft'] = replace_sections(report_draft, updates)
+            state['status'] = "report_drafted"
+            logger.info(f"ReportDraftingNode completed for request: {request_id}. Redrafted {len(updates)} section(s).")
+            return state
+
+        except (requests.exceptions.RequestException, TimeoutError) as e:
+            logger.warning(f"LLM call failed on attempt {attempt + 1}/{max_retries} due to network/timeout: {e}")
+            if attempt < max_retries - 1:
+                usage_tracker.record_retry()
+                delay = base_delay * (2 ** attempt)
+                logger.info(f"Retrying LLM call for request {request_id} in {delay} seconds...")
+                yield Sleep(delay)
+            else:
+                logger.error(f"Max retries reached. LLM call failed for request {request_id}.")
+                state['status'] = "error"
+                state['error_message'] = f"Failed to get a response from the LLM after {max_retries} attempts: {e}"
+                return state
+
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.error(f"Error parsing LLM JSON for section redraft for request {request_id}: {e}", exc_info=True)
+            state['status'] = "error"
+            state['error_message'] = f"LLM output for section redraft was invalid JSON or schema: {e}. Raw LLM Output: {llm_raw_output_str[:1000]}..."
+            return state
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during section redrafting for request {request_id}: {e}",
+                         exc_info=True)
+            state['status'] = "error"
+            state['error_message'] = f"An unexpected error occurred during section redrafting LLM call: {e}"
+            return state
+
+    state['status'] = "error"
+    state['error_message'] = "An unexpected failure occurred after all LLM retries or no sections were redrafted."
+    return state
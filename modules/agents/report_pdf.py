@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# "background": finalization returns with the Markdown report and the PDF is written in a worker thread;
+# "sync": finalization waits for the PDF; "off": no PDF
+REPORT_PDF_MODE = os.getenv("REPORT_PDF_MODE", "background")
+
+PDF_READY = "ready"
+PDF_PENDING = "pending"
+PDF_FAILED = "failed"
+PDF_SKIPPED = "skipped"
+
+REPORT_CSS = """
+body { font-family: Arial, sans-serif; line-height: 1.6; margin: 20mm; color: #333; }
+h1 { color: #1a237e; border-bottom: 2px solid #1a237e; padding-bottom: 10px; }
+h2 { color: #283593; border-bottom: 1px solid #c5cae9; padding-bottom: 5px; margin-top: 25px; }
+h3 { color: #3949ab; margin-top: 20px; }
+img { max-width: 90%; height: auto; display: block; margin: 15px auto; border: 1px solid #ddd; box-shadow: 2px 2px 5px rgba(0,0,0,0.1); }
+pre { background-color: #f4f4f4; padding: 10px; border-radius: 5px; overflow-x: auto; font-family: 'Courier New', Courier, monospace; font-size: 0.9em; }
+p, ul, ol { margin-bottom: 1em; }
+strong { font-weight: bold; }
+em { font-style: italic; }
+code { font-family: 'Courier New', Courier, monospace; background-color: #eee; padding: 2px 4px; border-radius: 3px; }
+hr { border: 0; height: 1px; background: #eee; margin: 2em 0; }
+"""
+
+_stylesheet = None
+_font_config = None
+# WeasyPrint (Pango/fontconfig underneath) is not thread-safe, and the shared font configuration must
+# not be used by two renders at once
+_render_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def write_pdf(html_content: str, base_url: str, pdf_path: str):
+    """
+    Renders the report's HTML to a PDF. The stylesheet is parsed and the font configuration set up once
+    per process instead of for every report.
+    """
+    global _stylesheet, _font_config
+    from weasyprint import CSS, HTML
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+    except ImportError:  # WeasyPrint < 53
+        from weasyprint.fonts import FontConfiguration
+
+    with _render_lock:
+        if _stylesheet is None:
+            _font_config = FontConfiguration()
+            _stylesheet = CSS(string=REPORT_CSS, font_config=_font_config)
+        HTML(string=html_content, base_url=base_url).write_pdf(
+            pdf_path, stylesheets=[_stylesheet], font_config=_font_config)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One worker: renders are serialized by the lock anyway
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-pdf")
+        return _executor
+
+
+def _write_pdf_in_background(html_content: str, base_url: str, pdf_path: str):
+    try:
+        write_pdf(html_content, base_url, pdf_path)
+        logger.info(f"Final PDF report saved to: {pdf_path}")
+    except Exception as e:
+        logger.error(f"Error generating PDF report {pdf_path}: {e}", exc_info=True)
+        raise
+    finally:
+        with _pending_lock:
+            _pending.pop(pdf_path, None)
+
+
+def submit_pdf(html_content: str, base_url: str, pdf_path: str) -> Future:
+    """Starts writing a PDF in the background; wait_for_pdf(pdf_path) blocks until it is done."""
+    executor = _get_executor()
+    # Registered before the job can finish, since the job removes itself when it does
+    with _pending_lock:
+        future = executor.submit(_write_pdf_in_background, html_content, base_url, pdf_path)
+        _pending[pdf_path] = future
+    return future
+
+
+def wait_for_pdf(pdf_path: str, timeout: Optional[float] = None) -> bool:
+    """
+    Waits for a PDF submitted with submit_pdf and returns whether the file exists. A path that is not
+    being written (already done, or written by another process) is just checked on disk.
+    """
+    with _pending_lock:
+        future = _pending.get(pdf_path)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            return False
+    return os.path.exists(pdf_path)
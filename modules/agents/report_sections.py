@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional, Union
+
+from schemas.messages import ReportSectionsDraft, SectionVerdict
+
+SectionText = Union[str, List[str]]
+
+
+def draft_sections(draft: ReportSectionsDraft) -> Dict[str, SectionText]:
+    """
+    The draft's sections by id: 'introduction', 'analysis_1' ... 'analysis_N' (one per narrative),
+    'key_takeaways' (a list of bullet points) and 'conclusion'.
+    """
+    sections: Dict[str, SectionText] = {"introduction": draft.introduction_text}
+    for i, narrative in enumerate(draft.analysis_narratives):
+        sections[f"analysis_{i + 1}"] = narrative
+    sections["key_takeaways"] = list(draft.key_takeaways_bullet_points)
+    sections["conclusion"] = draft.conclusion_text
+    return sections
+
+
+def format_sections(sections: Dict[str, SectionText]) -> str:
+    """Sections as labelled plain text for a prompt."""
+    parts = []
+    for section_id, text in sections.items():
+        body = "\n".join(f"- {point}" for point in text) if isinstance(text, list) else text
+        parts.append(f"[{section_id}]\n{body}")
+    return "\n\n".join(parts)
+
+
+def failing_sections(draft: ReportSectionsDraft, verdicts: Optional[List[SectionVerdict]]) -> List[SectionVerdict]:
+    """
+    Verdicts of the draft's sections that failed the safety check. Empty when none failed, or when
+    every section failed and the draft is better rewritten as a whole.
+    """
+    sections = draft_sections(draft)
+    failing = {verdict.section: verdict for verdict in verdicts or []
+               if verdict.section in sections and not (verdict.is_safe and verdict.is_accurate)}
+    return [] if len(failing) == len(sections) else list(failing.values())
+
+
+def replace_sections(draft: ReportSectionsDraft, updates: Dict[str, SectionText]) -> ReportSectionsDraft:
+    """A copy of the draft with the given sections replaced; unknown section ids are ignored."""
+    narratives = list(draft.analysis_narratives)
+    changes = {}
+    for section_id, text in updates.items():
+        if section_id == "introduction" and isinstance(text, str):
+            changes["introduction_text"] = text
+        elif section_id == "conclusion" and isinstance(text, str):
+            changes["conclusion_text"] = text
+        elif section_id == "key_takeaways":
+            changes["key_takeaways_bullet_points"] = [text] if isinstance(text, str) else list(text)
+        elif section_id.startswith("analysis_") and isinstance(text, str):
+            index = section_id[len("analysis_"):]
+            if index.isdigit() and 1 <= int(index) <= len(narratives):
+                narratives[int(index) - 1] = text
+    changes["analysis_narratives"] = narratives
+    return draft.model_copy(update=changes)
@@ -1,15 +1,21 @@
 import logging
 import os
-import time
-from typing import Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
+import random
+from typing import List, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field, ValidationError
 import requests  # To handle connection-related exceptions
 
-from graph.state import GraphState
-from schemas.messages import ReportSectionsDraft
+from graph.effects import LLMCall, NodeSteps, Sleep, arun_node, run_node
+from graph.state import CLEAR_ERROR_MESSAGE, GraphState
+from llm.clients import get_chat_model
+from profiling.render import render_profile
+from llm.usage import usage_scope, usage_tracker
+from agents.report_sections import draft_sections, format_sections
+from agents.safety_prescreen import (PRESCREEN_FAILED, PRESCREEN_PASSED, SAFETY_REVIEW_SAMPLE_RATE,
+                                     prescreen_draft)
+from schemas.messages import ReportSectionsDraft, SectionVerdict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -25,13 +31,30 @@ class SafetyCheckResult(BaseModel):
     is_accurate: bool = Field(
         description="True if the report is logically consistent with the data profile and user instructions.")
     reasoning: str = Field(description="Explanation for the decision, especially if the check fails.")
+    section_verdicts: List[SectionVerdict] = Field(
+        default_factory=list, description="A verdict for every section of the draft, by section id.")
 
 
+@usage_scope("graph:safety_check")
 def safety_check_node(state: GraphState) -> GraphState:
     """
     Performs a comprehensive safety and accuracy check on the generated report draft.
-    This node now uses an LLM to act as a validator.
+    This node now uses an LLM to act as a validator. The verdict on each section is kept in
+    `section_verdicts`, so that a redraft can rewrite only the sections that failed.
+
+    Local checks run first (see safety_prescreen.py). A draft they reject is failed without calling the
+    model, and a draft they pass is reviewed by the model only for a SAFETY_REVIEW_SAMPLE_RATE sample.
     """
+    return run_node(_safety_check_steps(state))
+
+
+async def asafety_check_node(state: GraphState) -> GraphState:
+    """Async variant of safety_check_node for the async graph."""
+    with usage_scope("graph:safety_check"):
+        return await arun_node(_safety_check_steps(state))
+
+
+def _safety_check_steps(state: GraphState) -> NodeSteps:
     logger.info("---PERFORMING COMPREHENSIVE SAFETY AND ACCURACY CHECK---")
 
     report_draft = state.get("report_sections_draft")
@@ -42,6 +65,29 @@ def safety_check_node(state: GraphState) -> GraphState:
         logger.warning("Missing required state information for safety check. Skipping.")
         return state
 
+    generated_visuals = state.get("generated_visuals")
+    prescreen = prescreen_draft(report_draft, dataframe_profile,
+                                [visual.visual_id for visual in generated_visuals] if generated_visuals else None)
+    if prescreen.outcome == PRESCREEN_FAILED:
+        error_msg = f"Pre-screen check failed: {prescreen.reasoning}"
+        logger.error(error_msg)
+        state['section_verdicts'] = prescreen.section_verdicts
+        state['status'] = "error"
+        state['error_message'] = error_msg
+        return state
+    if prescreen.outcome == PRESCREEN_PASSED and random.random() >= SAFETY_REVIEW_SAMPLE_RATE:
+        logger.info(f"Pre-screen check passed ({prescreen.reasoning}). Skipping the model review.")
+        state['section_verdicts'] = []
+        state['status'] = "safety_checked"
+        state['error_message'] = CLEAR_ERROR_MESSAGE
+        return state
+    logger.info(f"Pre-screen check {prescreen.outcome} ({prescreen.reasoning}). Reviewing with the model.")
+
+    # Columns the draft quotes are the ones to check it against
+    rendered_profile = render_profile(dataframe_profile, relevant_to=" ".join(
+        [instructions, format_sections(draft_sections(report_draft))]))
+    usage_tracker.record_tokens_saved(rendered_profile.tokens_saved)
+
     # Implement retry logic with exponential backoff for resilience
     max_retries = 3
     base_delay = 2  # seconds
@@ -53,11 +99,7 @@ def safety_check_node(state: GraphState) -> GraphState:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
         # The 'request_options' parameter allows setting a timeout.
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-pro",
-            google_api_key=gemini_api_key,
-            temperature=0.2,
-        )
+        llm = get_chat_model("gemini-2.5-pro", temperature=0.2)
     except Exception as e:
         logger.error(f"Failed to initialize LLM for safety check: {e}")
         state['status'] = "error"
@@ -76,29 +118,35 @@ def safety_check_node(state: GraphState) -> GraphState:
 
             Please review the following:
 
-            1.  **Report Draft**:
+            1.  **Report Draft** ("{dataset_title}"), one labelled section per block:
                 {report_draft}
             2.  **Original Instructions**:
                 {instructions}
             3.  **Dataset Profile**:
                 {dataframe_profile}
 
+            Give a verdict for every section, using the section ids in square brackets.
+
             {format_instructions}
 
             Do not add any text outside of the JSON object.
             """
 
             prompt = PromptTemplate.from_template(prompt_template).format(
-                report_draft=report_draft.model_dump_json(indent=2),
+                dataset_title=report_draft.dataset_title,
+                report_draft=format_sections(draft_sections(report_draft)),
                 instructions=instructions,
-                dataframe_profile=dataframe_profile.model_dump_json(indent=2),
+                dataframe_profile=rendered_profile.text,
                 format_instructions=parser.get_format_instructions()
             )
 
-            llm_response = llm.invoke(prompt, config={"request_options": {"timeout": 60}})
+            llm_response = yield LLMCall(llm, prompt, config={"request_options": {"timeout": 60}})
 
             # Use the parser to get a validated dictionary from the LLM response
             validated_result = parser.invoke(llm_response)
+            verdicts = [SectionVerdict.model_validate(verdict)
+                        for verdict in validated_result.get('section_verdicts') or []]
+            state['section_verdicts'] = verdicts
 
             # Check for safety and accuracy
             if not validated_result['is_safe']:
@@ -115,17 +163,29 @@ def safety_check_node(state: GraphState) -> GraphState:
                 state['error_message'] = error_msg
                 return state
 
+            failed = [verdict for verdict in verdicts if not (verdict.is_safe and verdict.is_accurate)]
+            if failed:
+                error_msg = "Section check failed: " + "; ".join(
+                    f"{verdict.section}: {verdict.reasoning}" for verdict in failed)
+                logger.error(error_msg)
+                state['status'] = "error"
+                state['error_message'] = error_msg
+                return state
+
             logger.info("Comprehensive safety and accuracy check passed.")
             state['status'] = "safety_checked"
+            # Messages from earlier failed checks no longer apply
+            state['error_message'] = CLEAR_ERROR_MESSAGE
             return state
 
         # Handle specific exceptions for retries
         except (requests.exceptions.RequestException, TimeoutError) as e:
             logger.warning(f"Attempt {attempt + 1} failed due to a network or timeout error: {e}")
             if attempt < max_retries - 1:
+                usage_tracker.record_retry()
                 delay = base_delay * (2 ** attempt)
                 logger.info(f"Retrying in {delay} seconds...")
-                time.sleep(delay)
+                yield Sleep(delay)
             else:
                 logger.error("Max retries reached. LLM call failed.")
                 state['status'] = "error"
@@ -0,0 +1,202 @@
+import os
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from agents.report_sections import draft_sections
+from schemas.messages import DataProfile, ReportSectionsDraft, SectionVerdict
+
+# Share of drafts that pass the pre-screen but are still reviewed by the model
+SAFETY_REVIEW_SAMPLE_RATE = float(os.getenv("SAFETY_REVIEW_SAMPLE_RATE", "0.1"))
+
+# Relative difference within which a quoted number counts as the profile's value (rounding, "about")
+NUMERIC_TOLERANCE = 0.02
+
+PRESCREEN_FAILED = "failed"
+PRESCREEN_PASSED = "passed"
+PRESCREEN_INCONCLUSIVE = "inconclusive"
+
+_BLOCKED_TERMS = re.compile(
+    r"\b(fuck\w*|shit\w*|bitch\w*|bastards?|retard\w*|idiot\w*|stupid|dumbass|moron\w*|"
+    r"kill yourself|go to hell|subhuman|inferior races?)\b", re.IGNORECASE)
+
+_FIGURE_PLACEHOLDER = re.compile(r"\[FIGURE (\d+)\]")
+_NUMBER = re.compile(
+    r"(?<![\w.])\$?(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?\s?(%|k\b|K\b|thousand\b|m\b|M\b|million\b|bn\b|billion\b)?")
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "bn": 1e9, "billion": 1e9}
+_STATS = {
+    "mean": re.compile(r"\b(mean|average|avg)\b", re.IGNORECASE),
+    "min": re.compile(r"\b(minimum|min|lowest|smallest)\b", re.IGNORECASE),
+    "max": re.compile(r"\b(maximum|max|highest|largest)\b", re.IGNORECASE),
+}
+_ROW_COUNT = re.compile(r"^\s*(total\s+)?(rows|records|entries|observations|transactions)\b", re.IGNORECASE)
+_COLUMN_COUNT = re.compile(r"^\s*(total\s+)?(columns|fields|variables|features)\b", re.IGNORECASE)
+# Phrasing that makes a count a claim about the whole dataset: "the dataset has 1,000 rows", "a total of
+# 1,000 rows", "1,000 total rows", "1,000 rows in total"
+_TOTAL_BEFORE = re.compile(
+    r"(\b(dataset|data set|data|table|file)\s+(has|had|contains?|contained|includes?|comprises?|consists of|"
+    r"covers|spans)|\ba total of)\s+((about|approximately|around|roughly|nearly|exactly)\s+)?"
+    r"([\d,.]+\s+\w+\s*(,|and)\s+)?$", re.IGNORECASE)
+_TOTAL_AFTER = re.compile(r"^\s*(in total|in all|overall|altogether)\b", re.IGNORECASE)
+
+
+class PrescreenResult(NamedTuple):
+    """Outcome of the local checks on a report draft, with a verdict on every section it failed."""
+    outcome: str
+    section_verdicts: List[SectionVerdict]
+    reasoning: str
+
+
+class _Number(NamedTuple):
+    value: float
+    tolerance: float
+    start: int
+    end: int
+
+
+def _numbers(text: str) -> Iterator[_Number]:
+    """Numbers quoted in text, with the rounding their precision allows. Years and small counts are skipped."""
+    for match in _NUMBER.finditer(text):
+        whole, decimals, suffix = match.groups()
+        value = float(whole.replace(",", "") + (f".{decimals}" if decimals else ""))
+        multiplier = _MULTIPLIERS.get((suffix or "").lower(), 1)
+        if multiplier == 1 and suffix != "%" and not decimals and "," not in whole and (
+                value < 10 or 1900 <= value <= 2100):
+            continue
+        precision = 0.5 * 10 ** -len(decimals or "") * multiplier
+        yield _Number(value * multiplier, precision, match.start(), match.end())
+
+
+def _matches(number: _Number, actual: float) -> bool:
+    return abs(number.value - actual) <= max(abs(actual) * NUMERIC_TOLERANCE, number.tolerance)
+
+
+def _profile_values(value: Any) -> Iterator[float]:
+    """Every number in a profile's column details, including percentages stored as '12.50%'."""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _profile_values(item)
+    elif isinstance(value, bool) or value is None:
+        return
+    elif isinstance(value, (int, float)):
+        yield float(value)
+    elif isinstance(value, str):
+        try:
+            yield float(value.rstrip("%"))
+        except ValueError:
+            return
+
+
+def _column_patterns(profile: DataProfile) -> Dict[str, re.Pattern]:
+    patterns = {}
+    for column in profile.column_details:
+        words = [re.escape(word) for word in re.split(r"[\s_]+", column.strip()) if word]
+        if words:
+            patterns[column] = re.compile(r"\b" + r"[\s_]+".join(words) + r"\b", re.IGNORECASE)
+    return patterns
+
+
+def _sentences(text: str) -> List[str]:
+    return [sentence for sentence in re.split(r"(?<=[.!?;])\s+|\n+", text) if sentence.strip()]
+
+
+def _check_statistics(sentence: str, profile: DataProfile,
+                      columns: Dict[str, re.Pattern]) -> Tuple[List[str], List[str]]:
+    """
+    Problems with the statistics a sentence quotes, and claims it makes that only the model can judge.
+    Only unambiguous claims are judged: one column, one statistic, and the first number after it; row
+    and column counts only when phrased as the dataset's total ("120 rows have a missing price" is not).
+    """
+    problems, unsure = [], []
+    mentioned = [column for column, pattern in columns.items() if pattern.search(sentence)]
+    stats = [(stat, match) for stat, pattern in _STATS.items() for match in [pattern.search(sentence)] if match]
+    if len(mentioned) == 1 and len(stats) == 1:
+        column, (stat, match) = mentioned[0], stats[0]
+        actual = profile.column_details[column].get(stat)
+        claimed = next(_numbers(sentence[match.end():]), None)
+        if isinstance(actual, (int, float)) and claimed is not None and not _matches(claimed, actual):
+            problems.append(f"quotes {claimed.value:g} as the {stat} of '{column}', but the profile has {actual:g}")
+
+    for number in _numbers(sentence):
+        following = sentence[number.end:]
+        rows, cols = _ROW_COUNT.match(following), _COLUMN_COUNT.match(following)
+        count = rows or cols
+        if count is None:
+            continue
+        actual = profile.num_rows if rows else profile.num_columns
+        if _matches(number, actual) if rows else number.value == actual:
+            continue
+        unit = "rows" if rows else "columns"
+        total = (count.group(1) or _TOTAL_BEFORE.search(sentence[:number.start])
+                 or _TOTAL_AFTER.match(following[count.end():]))
+        if total:
+            problems.append(f"quotes {number.value:g} {unit}, but the dataset has {actual}")
+        else:
+            # A count of some subset of the data ("the top 20 rows"), which the profile cannot confirm
+            unsure.append(f"{number.value:g} {unit}")
+    return problems, unsure
+
+
+def _text(section: Any) -> str:
+    return "\n".join(section) if isinstance(section, list) else section
+
+
+def prescreen_draft(report_draft: ReportSectionsDraft, profile: DataProfile,
+                    visual_ids: Optional[List[str]] = None) -> PrescreenResult:
+    """
+    Checks a report draft locally before the model reviews it: statistics and row or column counts
+    quoted in the text against the data profile, [FIGURE n] placeholders against the draft's
+    figure_id_map and the rendered visuals, and a lexical filter for abusive language.
+
+    The draft fails when any check finds a problem, and passes when there are none and every number it
+    quotes appears in the profile. Anything else (numbers the profile cannot confirm) is inconclusive
+    and needs the model's review.
+    """
+    figure_map = report_draft.figure_id_map or {}
+    unknown_visuals = sorted(set(figure_map.values()) - set(visual_ids)) if visual_ids is not None else []
+    if unknown_visuals:
+        # The figure map belongs to the whole draft, so no single section can be redrafted to fix it
+        return PrescreenResult(PRESCREEN_FAILED, [],
+                               f"figure_id_map refers to unknown visuals: {', '.join(unknown_visuals)}")
+
+    columns = _column_patterns(profile)
+    known_values = [float(profile.num_rows), float(profile.num_columns),
+                    *_profile_values(profile.column_details)]
+    verdicts: List[SectionVerdict] = []
+    unconfirmed: List[Tuple[str, float]] = []
+    counts: List[str] = []
+
+    for section_id, section in draft_sections(report_draft).items():
+        text = _text(section)
+        safety_problems, accuracy_problems = [], []
+
+        blocked = sorted({match.group(0).lower() for match in _BLOCKED_TERMS.finditer(text)})
+        if blocked:
+            safety_problems.append(f"uses inappropriate language ({', '.join(blocked)})")
+
+        unmapped = sorted({f"[FIGURE {n}]" for n in _FIGURE_PLACEHOLDER.findall(text)} - set(figure_map))
+        if unmapped:
+            accuracy_problems.append(f"refers to {', '.join(unmapped)}, which is missing from figure_id_map")
+
+        text = _FIGURE_PLACEHOLDER.sub("", text)
+        for sentence in _sentences(text):
+            problems, unsure = _check_statistics(sentence, profile, columns)
+            accuracy_problems.extend(problems)
+            counts.extend(f"{claim} ({section_id})" for claim in unsure)
+        unconfirmed.extend((section_id, number.value) for number in _numbers(text)
+                           if not any(_matches(number, value) for value in known_values))
+
+        if safety_problems or accuracy_problems:
+            verdicts.append(SectionVerdict(section=section_id, is_safe=not safety_problems,
+                                           is_accurate=not accuracy_problems,
+                                           reasoning="; ".join(safety_problems + accuracy_problems)))
+
+    if verdicts:
+        reasoning = "; ".join(f"{verdict.section}: {verdict.reasoning}" for verdict in verdicts)
+        return PrescreenResult(PRESCREEN_FAILED, verdicts, reasoning)
+    if counts:
+        return PrescreenResult(PRESCREEN_INCONCLUSIVE, [],
+                               f"counts that are not the dataset's size: {', '.join(counts[:5])}")
+    if unconfirmed:
+        quoted = ", ".join(f"{value:g} ({section_id})" for section_id, value in unconfirmed[:5])
+        return PrescreenResult(PRESCREEN_INCONCLUSIVE, [], f"numbers not found in the profile: {quoted}")
+    return PrescreenResult(PRESCREEN_PASSED, [], "all quoted numbers match the profile")
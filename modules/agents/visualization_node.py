@@ -3,15 +3,24 @@ import pandas as pd
 import json
 import os
 import requests
-import time
 from typing import List, Dict, Any, Optional
 import matplotlib.pyplot as plt
 import seaborn as sns
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field, ValidationError
+from charts.cache import CachedChart, chart_key, evict_charts, get_chart, put_chart
+from charts.images import save_chart
+from charts.rendering import render_charts
+from charts.sampling import (aggregate_bar, aggregate_counts, binned_kde_bw_adjust, box_stats, histogram,
+                             needs_reduction, reduce_line, sampling_caption, stratified_sample)
+from graph.effects import Blocking, LLMCall, NodeSteps, Sleep, arun_node, run_node
+from graph.run_context import get_run_context
 from graph.state import GraphState
+from llm.cache import prompt_cache_scope
+from llm.clients import get_chat_model
+from llm.usage import usage_scope, usage_tracker
+from profiling.render import render_profile
 from schemas.messages import VisualGenerationInstruction, GeneratedVisual
 
 logger = logging.getLogger(__name__)
@@ -26,13 +35,18 @@ class SuggestedVisualizations(BaseModel):
         description="A list of suggested visualizations, including chart type, columns, title, and description.")
 
 
-def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, output_path: str) -> Optional[str]:
+def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, output_path: str,
+                   sampling: Optional[Dict[str, Any]] = None) -> Optional[str]:
     """
     Generates a chart based on the instruction and saves it to the output path.
     Returns the file_path if successful, None otherwise.
+
+    Large frames are reduced before plotting (see charts.sampling); the reduction used is printed
+    under the chart and, when a `sampling` dict is passed, written into it.
     """
     fig, ax = plt.subplots(figsize=(10, 6))
     chart_code_str = ""
+    reduction: Optional[Dict[str, Any]] = None
 
     try:
         if not instruction.columns or not all(col in df.columns for col in instruction.columns):
@@ -53,12 +67,26 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
         if instruction.type == "bar":
             if len(instruction.columns) == 2:
                 x_col, y_col = instruction.columns[0], instruction.columns[1]
-                sns.barplot(x=x_col, y=y_col, data=df, ax=ax)
-                chart_code_str = f"sns.barplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
+                if needs_reduction(df) and x_col != y_col and pd.api.types.is_numeric_dtype(df[y_col]):
+                    agg, reduction = aggregate_bar(df, x_col, y_col)
+                    sns.barplot(x=x_col, y=y_col, data=agg, order=list(agg[x_col]), errorbar=None, ax=ax)
+                    ax.errorbar(range(len(agg)), agg[y_col], yerr=agg["ci"], fmt="none", ecolor=".26")
+                    chart_code_str = (f"agg, _ = aggregate_bar(df, '{x_col}', '{y_col}')\n"
+                                      f"sns.barplot(x='{x_col}', y='{y_col}', data=agg, errorbar=None, ax=ax)")
+                else:
+                    sns.barplot(x=x_col, y=y_col, data=df, ax=ax)
+                    chart_code_str = f"sns.barplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
             elif len(instruction.columns) == 1:
                 # Count plot for a single categorical column
-                sns.countplot(x=instruction.columns[0], data=df, ax=ax)
-                chart_code_str = f"sns.countplot(x='{instruction.columns[0]}', data=df, ax=ax)"
+                x_col = instruction.columns[0]
+                if needs_reduction(df):
+                    counts, reduction = aggregate_counts(df, x_col)
+                    sns.barplot(x=x_col, y="count", data=counts, order=list(counts[x_col]), errorbar=None, ax=ax)
+                    chart_code_str = (f"counts, _ = aggregate_counts(df, '{x_col}')\n"
+                                      f"sns.barplot(x='{x_col}', y='count', data=counts, errorbar=None, ax=ax)")
+                else:
+                    sns.countplot(x=x_col, data=df, ax=ax)
+                    chart_code_str = f"sns.countplot(x='{x_col}', data=df, ax=ax)"
             else:
                 logger.warning(
                     f"Bar chart with {len(instruction.columns)} columns not fully supported without more specific instruction: {instruction.model_dump_json()}")
@@ -81,8 +109,16 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
                     plt.close(fig)
                     return None
 
-                sns.lineplot(x=x_col, y=y_col, data=df_sorted, ax=ax)
-                chart_code_str = f"df_sorted = df.sort_values(by='{x_col}')\nsns.lineplot(x='{x_col}', y='{y_col}', data=df_sorted, ax=ax)"
+                if needs_reduction(df_sorted):
+                    # lineplot would bootstrap a confidence band over every row; plot the reduced means instead
+                    df_line, reduction = reduce_line(df_sorted, x_col, y_col)
+                    sns.lineplot(x=x_col, y=y_col, data=df_line, errorbar=None, ax=ax)
+                    chart_code_str = (f"df_sorted = df.sort_values(by='{x_col}')\n"
+                                      f"df_line, _ = reduce_line(df_sorted, '{x_col}', '{y_col}')\n"
+                                      f"sns.lineplot(x='{x_col}', y='{y_col}', data=df_line, errorbar=None, ax=ax)")
+                else:
+                    sns.lineplot(x=x_col, y=y_col, data=df_sorted, ax=ax)
+                    chart_code_str = f"df_sorted = df.sort_values(by='{x_col}')\nsns.lineplot(x='{x_col}', y='{y_col}', data=df_sorted, ax=ax)"
             else:
                 logger.warning(
                     f"Line chart with {len(instruction.columns)} columns not supported: {instruction.model_dump_json()}")
@@ -91,8 +127,14 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
         elif instruction.type == "scatter":
             if len(instruction.columns) == 2:
                 x_col, y_col = instruction.columns[0], instruction.columns[1]
-                sns.scatterplot(x=x_col, y=y_col, data=df, ax=ax)
-                chart_code_str = f"sns.scatterplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
+                if needs_reduction(df) and x_col != y_col:
+                    sample, reduction = stratified_sample(df, x_col, y_col)
+                    sns.scatterplot(x=x_col, y=y_col, data=sample, ax=ax)
+                    chart_code_str = (f"sample, _ = stratified_sample(df, '{x_col}', '{y_col}')\n"
+                                      f"sns.scatterplot(x='{x_col}', y='{y_col}', data=sample, ax=ax)")
+                else:
+                    sns.scatterplot(x=x_col, y=y_col, data=df, ax=ax)
+                    chart_code_str = f"sns.scatterplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
             else:
                 logger.warning(
                     f"Scatter chart requires 2 columns, got {len(instruction.columns)}: {instruction.model_dump_json()}")
@@ -100,8 +142,18 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
                 return None
         elif instruction.type == "histogram":
             if len(instruction.columns) == 1:
-                sns.histplot(df[instruction.columns[0]], kde=True, ax=ax)
-                chart_code_str = f"sns.histplot(df['{instruction.columns[0]}'], kde=True, ax=ax)"
+                col = instruction.columns[0]
+                if needs_reduction(df):
+                    # Binned with NumPy; the KDE is fitted to the weighted bin centers instead of every row
+                    binned, edges, reduction = histogram(df[col])
+                    sns.histplot(x=col, weights="count", data=binned, bins=list(edges), kde=True, ax=ax,
+                                 kde_kws={"bw_adjust": binned_kde_bw_adjust(binned["count"].to_numpy())})
+                    ax.set_ylabel("Count")
+                    chart_code_str = (f"binned, edges, _ = histogram(df['{col}'])\n"
+                                      f"sns.histplot(x='{col}', weights='count', data=binned, bins=edges, kde=True, ax=ax)")
+                else:
+                    sns.histplot(df[col], kde=True, ax=ax)
+                    chart_code_str = f"sns.histplot(df['{col}'], kde=True, ax=ax)"
             else:
                 logger.warning(
                     f"Histogram requires 1 column, got {len(instruction.columns)}: {instruction.model_dump_json()}")
@@ -109,12 +161,24 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
                 return None
         elif instruction.type == "boxplot":
             if len(instruction.columns) == 1:
-                sns.boxplot(y=df[instruction.columns[0]], ax=ax)
-                chart_code_str = f"sns.boxplot(y=df['{instruction.columns[0]}'], ax=ax)"
+                if needs_reduction(df):
+                    stats, reduction = box_stats(df, instruction.columns[0])
+                    _draw_box_stats(ax, stats, None, instruction.columns[0])
+                    chart_code_str = (f"stats, _ = box_stats(df, '{instruction.columns[0]}')\n"
+                                      f"ax.bxp(stats, patch_artist=True)")
+                else:
+                    sns.boxplot(y=df[instruction.columns[0]], ax=ax)
+                    chart_code_str = f"sns.boxplot(y=df['{instruction.columns[0]}'], ax=ax)"
             elif len(instruction.columns) == 2:
                 x_col, y_col = instruction.columns[0], instruction.columns[1]
-                sns.boxplot(x=x_col, y=y_col, data=df, ax=ax)
-                chart_code_str = f"sns.boxplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
+                if needs_reduction(df) and x_col != y_col:
+                    stats, reduction = box_stats(df, y_col, x_col)
+                    _draw_box_stats(ax, stats, x_col, y_col)
+                    chart_code_str = (f"stats, _ = box_stats(df, '{y_col}', '{x_col}')\n"
+                                      f"ax.bxp(stats, patch_artist=True)")
+                else:
+                    sns.boxplot(x=x_col, y=y_col, data=df, ax=ax)
+                    chart_code_str = f"sns.boxplot(x='{x_col}', y='{y_col}', data=df, ax=ax)"
             else:
                 logger.warning(
                     f"Boxplot with {len(instruction.columns)} columns not fully supported: {instruction.model_dump_json()}")
@@ -130,8 +194,14 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
         else:
             ax.set_title(instruction.description)
 
-        plt.tight_layout()
-        plt.savefig(output_path)
+        if reduction is not None:
+            fig.text(0.99, 0.01, sampling_caption(reduction), ha="right", va="bottom", fontsize=8, color="gray")
+            if sampling is not None:
+                sampling.update(reduction)
+
+        # Leave room at the bottom for the sampling caption
+        plt.tight_layout(rect=(0, 0.03, 1, 1) if reduction is not None else None)
+        save_chart(fig, output_path)
         plt.close(fig)
 
         logger.info(f"Chart saved to: {output_path}")
@@ -143,10 +213,36 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
         return None
 
 
+def _draw_box_stats(ax, stats: List[Dict[str, Any]], x_col: Optional[str], y_col: str):
+    """Draws pre-computed box statistics styled like seaborn's boxplot."""
+    color = sns.color_palette()[0]
+    ax.bxp(stats, positions=range(len(stats)), widths=0.8, patch_artist=True,
+           boxprops={"facecolor": color, "edgecolor": ".26"}, medianprops={"color": ".26"},
+           whiskerprops={"color": ".26"}, capprops={"color": ".26"},
+           flierprops={"marker": "d", "markerfacecolor": ".26", "markeredgecolor": ".26", "markersize": 4})
+    if x_col is None:
+        ax.set_xticks([])
+    else:
+        ax.set_xlabel(x_col)
+    ax.set_ylabel(y_col)
+
+
+@usage_scope("graph:visualization")
 def visualization_node(state: GraphState) -> GraphState:
     """
-    Suggests and generates data visualizations based on the data profile and user instructions.
+    Suggests data visualizations based on the data profile and user instructions. The charts are
+    rendered by chart_rendering_node.
     """
+    return run_node(_visualization_steps(state))
+
+
+async def avisualization_node(state: GraphState) -> GraphState:
+    """Async variant of visualization_node for the async graph."""
+    with usage_scope("graph:visualization"):
+        return await arun_node(_visualization_steps(state))
+
+
+def _visualization_steps(state: GraphState) -> NodeSteps:
     request_id = state['request_id']
     file_path = state['file_path']
     instructions = state['instructions']
@@ -166,9 +262,8 @@ def visualization_node(state: GraphState) -> GraphState:
         state['error_message'] = "API key for Gemini not found. Please set GEMINI_API_KEY in your .env file."
         return state
 
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=gemini_api_key, temperature=0.7)
+        llm = get_chat_model("gemini-2.5-flash", temperature=0.7)
 
     except Exception as e:
         logger.error(f"Failed to initialize LLM for visualization: {e}", exc_info=True)
@@ -176,16 +271,8 @@ def visualization_node(state: GraphState) -> GraphState:
         state['error_message'] = f"Failed to initialize LLM for visualization: {e}"
         return state
 
-    # Load data
-    try:
-        df = pd.read_csv(file_path)
-        if df.empty:
-            raise ValueError("Uploaded CSV is empty.")
-    except Exception as e:
-        logger.error(f"Error loading data for visualization for request {request_id}: {e}", exc_info=True)
-        state['status'] = "error"
-        state['error_message'] = f"Failed to load or process CSV for visualization: {e}"
-        return state
+    rendered_profile = render_profile(dataframe_profile, relevant_to=instructions or "")
+    usage_tracker.record_tokens_saved(rendered_profile.tokens_saved)
 
     max_retries = 3
     base_delay = 2  # seconds
@@ -216,31 +303,29 @@ def visualization_node(state: GraphState) -> GraphState:
                 - `suggested_section`: Where in a report this visual would best fit (e.g., 'Introduction', 'Sales Analysis', 'Customer Demographics', 'Conclusion').
     
                 Dataset Columns and Details:
-                {column_details_json}
+                {profile_table}
     
                 User Request/Instructions: {instructions}
     
                 Aim for 2-8 insightful visualizations. Prioritize clarity and relevance to user instructions.
                 Consider the data types and distribution when suggesting. For example, if a column looks like a date, suggest a time-series plot.
-                Ensure column names are exact as provided in `column_details_json`.
+                Ensure column names are exact as provided in the column table above.
     
                 {format_instructions}
     
                 Ensure your response is valid JSON.
                 """,
-                input_variables=["column_details_json", "instructions"],
+                input_variables=["profile_table", "instructions"],
                 partial_variables={"format_instructions": parser.get_format_instructions()},
             )
 
             suggested_visuals: List[VisualGenerationInstruction] = []
             logger.info(f"DEBUG: Calling LLM for visualization suggestions.")
 
-            column_details_json = json.dumps(dataframe_profile.model_dump(exclude_unset=True),
-                                             indent=2)  # Use model_dump
-            llm_response = llm.invoke(prompt.invoke({
-                "column_details_json": column_details_json,
+            llm_response = yield LLMCall(llm, prompt.invoke({
+                "profile_table": rendered_profile.text,
                 "instructions": instructions
-            }))
+            }), cache=prompt_cache_scope(state))
             llm_raw_output_str = llm_response.content
 
             stripped_str = llm_raw_output_str.strip()
@@ -257,9 +342,10 @@ def visualization_node(state: GraphState) -> GraphState:
         except (requests.exceptions.RequestException, TimeoutError) as e:
             logger.warning(f"LLM call failed on attempt {attempt + 1}/{max_retries} due to network/timeout: {e}")
             if attempt < max_retries - 1:
+                usage_tracker.record_retry()
                 delay = base_delay * (2 ** attempt)
                 logger.info(f"Retrying LLM call for request {request_id} in {delay} seconds...")
-                time.sleep(delay)
+                yield Sleep(delay)
             else:
                 logger.error(f"Max retries reached. LLM call failed for request {request_id}.")
                 state['status'] = "error"
@@ -285,36 +371,118 @@ def visualization_node(state: GraphState) -> GraphState:
         state['status'] = "error"
         state['error_message'] = "An unexpected failure occurred after all LLM retries."
         return state
-        # Step 2: Generate charts based on suggestions
-    generated_visuals_list: List[GeneratedVisual] = []
-    logger.info(f"DEBUG: Starting chart generation loop. Found {len(suggested_visuals)} suggestions.")
-    for i, instruction in enumerate(suggested_visuals):
+    state['suggested_visuals'] = suggested_visuals
+    state['status'] = "visuals_suggested"
+    logger.info(f"VisualizationNode completed for request: {request_id}. Suggested {len(suggested_visuals)} visuals.")
+    return state
+
+
+def planned_visuals(state: GraphState) -> List[GeneratedVisual]:
+    """
+    The suggested charts as the visuals they become once rendered (without their chart code). The
+    file path is where a fresh render is written; rendering moves it to the chart's content address,
+    or uses a chart already cached there.
+    """
+    request_id = state['request_id']
+    planned = []
+    for i, instruction in enumerate(state.get('suggested_visuals') or []):
         visual_id = f"chart_{request_id}_{i + 1}"
-        output_filename = f"{visual_id}.png"
-        output_file_path = os.path.join(CHART_OUTPUT_DIR, output_filename)
+        planned.append(GeneratedVisual(
+            visual_id=visual_id,
+            type=instruction.type,
+            description=instruction.description,
+            file_path=os.path.join(CHART_OUTPUT_DIR, f"{visual_id}.png"),
+            suggested_section=instruction.suggested_section if instruction.suggested_section else "Analysis"
+        ))
+    return planned
+
+
+def _cached_charts(df: pd.DataFrame, instructions: List[VisualGenerationInstruction], run_paths: List[str]):
+    """
+    Each chart's cache key and its cached rendering, linked to the run's own chart file (None when it
+    has to be drawn).
+    """
+    keys = [chart_key(df, instruction) for instruction in instructions]
+    return keys, [get_chart(CHART_OUTPUT_DIR, key, path) for key, path in zip(keys, run_paths)]
+
+
+def chart_rendering_node(state: GraphState) -> GraphState:
+    """
+    Renders the charts suggested by visualization_node.
+    """
+    return run_node(_chart_rendering_steps(state))
+
+
+async def achart_rendering_node(state: GraphState) -> GraphState:
+    """Async variant of chart_rendering_node; rendering runs off the event loop."""
+    return await arun_node(_chart_rendering_steps(state))
+
+
+def _chart_rendering_steps(state: GraphState) -> NodeSteps:
+    request_id = state['request_id']
+    suggested_visuals = state.get('suggested_visuals')
+
+    if suggested_visuals is None:
+        logger.error(f"Missing suggested visuals for request {request_id}.")
+        state['status'] = "error"
+        state['error_message'] = "Cannot generate visuals: No charts were suggested."
+        return state
 
+    # Load data
+    try:
+        df = yield Blocking(get_run_context(state).dataframe)
+        if df.empty:
+            raise ValueError("Uploaded CSV is empty.")
+    except Exception as e:
+        logger.error(f"Error loading data for visualization for request {request_id}: {e}", exc_info=True)
+        state['status'] = "error"
+        state['error_message'] = f"Failed to load or process CSV for visualization: {e}"
+        return state
+
+    generated_visuals_list: List[GeneratedVisual] = []
+    logger.info(f"DEBUG: Starting chart generation loop. Found {len(suggested_visuals)} suggestions.")
+    planned = planned_visuals(state)
+    # Charts drawn before from the same column data and instruction are reused as they are
+    keys, cached = yield Blocking(_cached_charts, (df, suggested_visuals, [visual.file_path for visual in planned]))
+    jobs, job_indices = [], []
+    for i, (instruction, visual) in enumerate(zip(suggested_visuals, planned)):
+        if cached[i] is not None:
+            logger.info(f"Chart {i + 1} reused from the chart cache: {cached[i].file_path}")
+            continue
         logger.info(
             f"DEBUG: Attempting to generate chart {i + 1}: Type={instruction.type}, Columns={instruction.columns}, Description='{instruction.description}'")
-
-        chart_code = generate_chart(df, instruction, output_file_path)
-
-        if chart_code:
-            generated_visuals_list.append(GeneratedVisual(
-                visual_id=visual_id,
-                type=instruction.type,
-                description=instruction.description,
-                file_path=output_file_path,
-                suggested_section=instruction.suggested_section if instruction.suggested_section else "Analysis",
-                chart_code=chart_code
-            ))
-            logger.info(f"DEBUG: Chart {i + 1} generated successfully: {output_file_path}")
+        jobs.append((instruction, visual.file_path))
+        job_indices.append(i)
+
+    if jobs:
+        # Rendered in parallel worker processes; results come back in suggestion order
+        run_context = get_run_context(state)
+        rendered = yield Blocking(render_charts, (run_context, jobs))
+        if not run_context.registered:
+            run_context.release()
+        for i, (chart_code, sampling) in zip(job_indices, rendered):
+            if chart_code:
+                file_path = planned[i].file_path
+                try:
+                    yield Blocking(put_chart, (CHART_OUTPUT_DIR, keys[i], file_path, chart_code, sampling))
+                except OSError as e:
+                    logger.warning(f"Could not add chart {i + 1} to the chart cache: {e}")
+                cached[i] = CachedChart(file_path, chart_code, sampling)
+        yield Blocking(evict_charts, (CHART_OUTPUT_DIR,))
+
+    for i, (visual, chart) in enumerate(zip(planned, cached)):
+        if chart is not None:
+            generated_visuals_list.append(visual.model_copy(update={"file_path": chart.file_path,
+                                                                    "chart_code": chart.chart_code,
+                                                                    "sampling": chart.sampling or None}))
+            logger.info(f"DEBUG: Chart {i + 1} generated successfully: {chart.file_path}")
         else:
             logger.warning(f"DEBUG: Chart {i + 1} failed to generate. Skipping.")
 
     state['generated_visuals'] = generated_visuals_list
     state['status'] = "visuals_generated"
     logger.info(
-        f"VisualizationNode completed for request: {request_id}. Generated {len(generated_visuals_list)} visuals.")
+        f"ChartRenderingNode completed for request: {request_id}. Generated {len(generated_visuals_list)} visuals.")
     return state
 
     # except Exception as e:
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import pandas as pd
+
+from charts.images import CHART_DPI
+from charts.sampling import CHART_MAX_POINTS
+
+logger = logging.getLogger(__name__)
+
+# Size budget of the cached charts; least recently used ones are evicted beyond it (0 disables reuse)
+CHART_CACHE_MAX_MB = float(os.getenv("CHART_CACHE_MAX_MB", "256"))
+# Cache entries used more recently than this are not evicted, so a run that just looked one up can link it
+CHART_CACHE_MIN_AGE_S = 600
+
+# Bump when a change to chart rendering should invalidate existing entries
+_CACHE_VERSION = 1
+
+_evict_lock = threading.Lock()
+
+# Cache entries only: reports reference their own chart_<request_id>_<n>.png files, which are never evicted
+_CACHE_ENTRY = re.compile(r"^chart_[0-9a-f]{64}\.png$")
+
+
+class CachedChart(NamedTuple):
+    file_path: str
+    chart_code: str
+    sampling: Dict[str, Any]
+
+
+def chart_key(df: pd.DataFrame, instruction) -> str:
+    """
+    Content address of a chart: a hash of the data in the columns it plots (names, dtypes and values in
+    row order), the instruction, and the settings that change how it is drawn.
+    """
+    columns = [col for col in dict.fromkeys(instruction.columns or []) if col in df.columns]
+    digest = hashlib.sha256()
+    digest.update(json.dumps([_CACHE_VERSION, CHART_DPI, CHART_MAX_POINTS, instruction.model_dump(),
+                              [(col, str(df[col].dtype)) for col in columns], len(df)],
+                             sort_keys=True, default=str).encode("utf-8"))
+    if columns:
+        digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _paths(directory: str, key: str):
+    return os.path.join(directory, f"chart_{key}.png"), os.path.join(directory, f"chart_{key}.json")
+
+
+def _link(source: str, destination: str):
+    """Makes `destination` a hard link to `source` (a copy where links are not supported), replacing it atomically."""
+    partial_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, partial_path)
+    except OSError as e:
+        if isinstance(e, FileNotFoundError):  # e.g. the cache entry was evicted meanwhile
+            raise
+        # A filesystem without hard links
+        shutil.copyfile(source, partial_path)
+    os.replace(partial_path, destination)
+
+
+def get_chart(directory: str, key: str, run_path: str) -> Optional[CachedChart]:
+    """
+    The chart cached under `key`, linked to the run's own `run_path` (so evicting the cache entry later
+    does not take the run's image with it) and marked as recently used. None on a miss or when reuse is off.
+    """
+    if CHART_CACHE_MAX_MB <= 0:
+        return None
+    image_path, meta_path = _paths(directory, key)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        now = time.time()
+        os.utime(image_path, (now, now))
+        os.utime(meta_path, (now, now))
+        _link(image_path, run_path)
+    except (OSError, ValueError):
+        return None
+    return CachedChart(run_path, meta["chart_code"], meta.get("sampling") or {})
+
+
+def put_chart(directory: str, key: str, rendered_path: str, chart_code: str, sampling: Dict[str, Any]):
+    """Adds a freshly rendered chart to the cache under its content address; the run keeps `rendered_path`."""
+    if CHART_CACHE_MAX_MB <= 0:
+        return
+    image_path, meta_path = _paths(directory, key)
+    _link(rendered_path, image_path)
+    partial_meta_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(partial_meta_path, "w", encoding="utf-8") as f:
+        json.dump({"chart_code": chart_code, "sampling": sampling or {}}, f)
+    os.replace(partial_meta_path, meta_path)
+
+
+def evict_charts(directory: str, max_bytes: Optional[int] = None):
+    """
+    Deletes the least recently used cache entries (image and record) until the cache fits its budget.
+    Entries used in the last CHART_CACHE_MIN_AGE_S seconds are kept regardless. The charts runs link
+    from the cache are separate files and are left alone.
+    """
+    if max_bytes is None:
+        if CHART_CACHE_MAX_MB <= 0:
+            return
+        max_bytes = int(CHART_CACHE_MAX_MB * 1024 * 1024)
+    with _evict_lock:
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and _CACHE_ENTRY.match(entry.name):
+                stat = entry.stat()
+                meta_path = os.path.splitext(entry.path)[0] + ".json"
+                size = stat.st_size + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0)
+                entries.append((stat.st_mtime, size, entry.path, meta_path))
+        total = sum(size for _, size, _, _ in entries)
+        if total <= max_bytes:
+            return
+        cutoff = time.time() - CHART_CACHE_MIN_AGE_S
+        evicted = 0
+        for mtime, size, image_path, meta_path in sorted(entries):
+            if total <= max_bytes * 0.9 or mtime > cutoff:
+                break
+            for path in (meta_path, image_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} cached charts from {directory}")
@@ -0,0 +1,35 @@
+import io
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Resolution charts are saved at: 10x6in figures at 100 DPI fill the report's text width on an A4 page
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+
+
+def save_chart(fig, output_path: str, dpi: int = CHART_DPI):
+    """
+    Saves a chart as a compact PNG. Charts use few colours, so the image is reduced to an adaptive
+    256-colour palette and written with PNG optimization; this typically makes it several times smaller
+    with no visible difference, which keeps reports and their PDFs small and quick to render.
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    raw = buffer.getvalue()
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            palette = image.convert("RGB").quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+            optimized = io.BytesIO()
+            palette.save(optimized, format="PNG", optimize=True)
+        data = optimized.getvalue() if optimized.tell() < len(raw) else raw
+    except Exception as e:
+        logger.warning(f"Could not optimize chart image {output_path}, saving it as rendered: {e}")
+        data = raw
+    # Written to a new file and moved into place: the old file may be a hard link shared with the chart cache
+    partial_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(partial_path, "wb") as f:
+        f.write(data)
+    os.replace(partial_path, output_path)
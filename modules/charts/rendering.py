@@ -0,0 +1,101 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+
+# Processes that render charts for the visualization node; with 1 (or a single chart) they render in-process
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_RENDER_TIMEOUT_S = float(os.getenv("CHART_RENDER_TIMEOUT_S", "120"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_inline_render_lock = threading.Lock()
+
+
+def _init_worker():
+    # Before pyplot is imported: workers have no display and must not pick an interactive backend
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: workers are forked from a clean process, not from the threaded Streamlit server
+            _pool = ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_from_columnar(columnar_path: str, instruction, output_path: str) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Worker side: memory-maps only the chart's columns from the run's Arrow file and renders it."""
+    from agents.visualization_node import generate_chart
+
+    available = set(feather.read_table(columnar_path, columns=[], memory_map=True).schema.names)
+    columns = [col for col in dict.fromkeys(instruction.columns or []) if col in available]
+    df = feather.read_table(columnar_path, columns=columns, memory_map=True).to_pandas()
+    sampling: Dict[str, Any] = {}
+    return generate_chart(df, instruction, output_path, sampling), sampling
+
+
+def render_charts(context, jobs: List[Tuple[object, str]]) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+    """
+    Renders (instruction, output_path) jobs and returns each chart's code (None when it failed) and the
+    data reduction it was drawn with (empty when none), in job order. Jobs run in the process pool
+    against the run's Arrow file; if the frame cannot be written as Arrow or the pool breaks, the
+    remaining charts are rendered in this process.
+    """
+    results: List[Tuple[Optional[str], Dict[str, Any]]] = [(None, {})] * len(jobs)
+    pending = list(range(len(jobs)))
+
+    if CHART_RENDER_WORKERS > 1 and len(jobs) > 1:
+        try:
+            columnar_path = context.columnar_path()
+        except Exception as e:
+            logger.warning(f"Rendering charts in-process; the data could not be shared as Arrow: {e}")
+        else:
+            pool = _get_pool()
+            futures = [pool.submit(_render_from_columnar, columnar_path, instruction, output_path)
+                       for instruction, output_path in jobs]
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result(timeout=CHART_RENDER_TIMEOUT_S)
+                    pending.remove(i)
+                except FutureTimeoutError:
+                    logger.error(f"Chart {i + 1} did not render within {CHART_RENDER_TIMEOUT_S:g} seconds")
+                    pending.remove(i)
+                except BrokenProcessPool as e:
+                    logger.error(f"Chart render pool failed, rendering the remaining charts in-process: {e}")
+                    _discard_pool(pool)
+                    break
+                except Exception as e:
+                    logger.error(f"Error rendering chart {i + 1} in the render pool: {e}", exc_info=True)
+                    pending.remove(i)
+
+    if pending:
+        from agents.visualization_node import generate_chart
+
+        df = context.dataframe()
+        # pyplot's figure state is global; concurrent runs on worker threads take turns
+        with _inline_render_lock:
+            for i in pending:
+                instruction, output_path = jobs[i]
+                sampling: Dict[str, Any] = {}
+                results[i] = generate_chart(df, instruction, output_path, sampling), sampling
+    return results
@@ -0,0 +1,178 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from matplotlib import cbook
+
+# Charts over more rows than this are drawn from a reduced copy of the data
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "5000"))
+# Cells per axis of the grid that scatter samples are stratified over
+SCATTER_GRID = 32
+
+
+def needs_reduction(df: pd.DataFrame, max_points: int = CHART_MAX_POINTS) -> bool:
+    return len(df) > max_points
+
+
+def sampling_info(method: str, rows: int, plotted: int) -> Dict[str, Any]:
+    """What a figure was drawn from; stored on the GeneratedVisual and printed under the chart."""
+    return {"method": method, "rows": int(rows), "plotted": int(plotted)}
+
+
+def sampling_caption(info: Dict[str, Any]) -> str:
+    return f"{info['method']}: {info['plotted']:,} plotted values from {info['rows']:,} rows"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks `n_out` points of a series sorted by x that keep its visual
+    shape. The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def reduce_line(df: pd.DataFrame, x_col: str, y_col: str,
+                max_points: int = CHART_MAX_POINTS) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Mean of y per x value (what lineplot draws), then LTTB down to `max_points`. `df` must already be
+    sorted by x and free of missing values.
+    """
+    means = df.groupby(x_col, sort=True)[y_col].mean().reset_index()
+    method = "mean per x value"
+    if len(means) > max_points:
+        x = means[x_col].to_numpy()
+        x = x.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+        keep = lttb_indices(x.astype(np.float64), means[y_col].to_numpy(dtype=np.float64), max_points)
+        means = means.iloc[keep]
+        method = "mean per x value, LTTB downsampled"
+    return means, sampling_info(method, len(df), len(means))
+
+
+def stratified_sample(df: pd.DataFrame, x_col: str, y_col: str, max_points: int = CHART_MAX_POINTS,
+                      seed: int = 0) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Scatter sample stratified over a SCATTER_GRID x SCATTER_GRID grid: every non-empty cell keeps at
+    least one point, so outliers and sparse regions survive, and dense cells are sampled in proportion.
+    """
+    data = df[[x_col, y_col]].dropna()
+    n = len(data)
+    if n <= max_points:
+        return data, sampling_info("all points", len(df), n)
+    x = data[x_col].to_numpy(dtype=np.float64)
+    y = data[y_col].to_numpy(dtype=np.float64)
+
+    def cell_of(values: np.ndarray) -> np.ndarray:
+        low, high = values.min(), values.max()
+        scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+        return np.minimum((scaled * SCATTER_GRID).astype(np.int64), SCATTER_GRID - 1)
+
+    cells = cell_of(x) * SCATTER_GRID + cell_of(y)
+    counts = np.bincount(cells, minlength=SCATTER_GRID * SCATTER_GRID)
+    quota = np.where(counts > 0, np.maximum(1, np.floor(counts * max_points / n)), 0).astype(np.int64)
+
+    # Random order, then grouped by cell: a row's rank within its cell decides whether it is kept
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n)
+    order = order[np.argsort(cells[order], kind="stable")]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ranks = np.arange(n) - starts[cells[order]]
+    keep = np.sort(order[ranks < quota[cells[order]]])
+    sample = data.iloc[keep]
+    return sample, sampling_info("stratified sample", len(df), len(sample))
+
+
+def _category_order(values: pd.Series) -> List:
+    # Same as seaborn: numbers sorted, anything else in order of appearance
+    unique = pd.Series(values.dropna().unique())
+    return sorted(unique) if pd.api.types.is_numeric_dtype(unique) else list(unique)
+
+
+def aggregate_bar(df: pd.DataFrame, x_col: str, y_col: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Mean of y per category with a normal-approximation 95% interval, in place of barplot's bootstrap."""
+    grouped = df.groupby(x_col, sort=False)[y_col].agg(["mean", "std", "count"])
+    grouped = grouped.reindex(_category_order(df[x_col]))
+    result = pd.DataFrame({
+        x_col: grouped.index,
+        y_col: grouped["mean"].to_numpy(),
+        "ci": (1.96 * grouped["std"] / np.sqrt(grouped["count"])).fillna(0).to_numpy(),
+    })
+    return result, sampling_info("pre-aggregated mean per category", len(df), len(result))
+
+
+def aggregate_counts(df: pd.DataFrame, x_col: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    counts = df[x_col].value_counts(sort=False).reindex(_category_order(df[x_col]))
+    result = pd.DataFrame({x_col: counts.index, "count": counts.to_numpy()})
+    return result, sampling_info("pre-aggregated counts", len(df), len(result))
+
+
+def box_stats(df: pd.DataFrame, y_col: str, x_col: str = None,
+              max_points: int = CHART_MAX_POINTS, seed: int = 0) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Quartiles, 1.5 IQR whiskers and fliers per group, computed over all rows, for Axes.bxp. Fliers
+    are subsampled when there are more than `max_points` of them in total.
+    """
+    if x_col is None:
+        groups = [(y_col, df[y_col].dropna().to_numpy())]
+    else:
+        grouped = df.dropna(subset=[x_col, y_col]).groupby(x_col, sort=False)[y_col]
+        arrays = {key: values.to_numpy() for key, values in grouped}
+        groups = [(key, arrays[key]) for key in _category_order(df[x_col]) if key in arrays]
+    stats = []
+    for label, values in groups:
+        if len(values) == 0:
+            continue
+        group_stats = cbook.boxplot_stats(values, whis=1.5)[0]
+        group_stats["label"] = label
+        stats.append(group_stats)
+
+    total_fliers = sum(len(s["fliers"]) for s in stats)
+    if total_fliers > max_points:
+        rng = np.random.default_rng(seed)
+        for s in stats:
+            keep = int(round(len(s["fliers"]) * max_points / total_fliers))
+            s["fliers"] = rng.choice(s["fliers"], size=keep, replace=False) if keep else s["fliers"][:0]
+    plotted = sum(len(s["fliers"]) for s in stats) + 5 * len(stats)
+    return stats, sampling_info("pre-computed box statistics", len(df), plotted)
+
+
+def histogram(values: pd.Series) -> Tuple[pd.DataFrame, np.ndarray, Dict[str, Any]]:
+    """
+    NumPy binning with the same automatic bin edges histplot picks; returns bin centers with their
+    counts (to plot as weights) and the edges.
+    """
+    data = values.dropna().to_numpy(dtype=np.float64)
+    edges = np.histogram_bin_edges(data, bins="auto")
+    counts, edges = np.histogram(data, bins=edges)
+    binned = pd.DataFrame({values.name: (edges[:-1] + edges[1:]) / 2, "count": counts})
+    return binned, edges, sampling_info("pre-binned histogram", len(values), len(binned))
+
+
+def binned_kde_bw_adjust(counts: np.ndarray) -> float:
+    """
+    bw_adjust that gives a KDE fitted to weighted bin centers the bandwidth of one fitted to the raw
+    values: scipy sizes the bandwidth from the effective sample size of the weights, not the row count.
+    """
+    total = counts.sum()
+    if total == 0:
+        return 1.0
+    effective = total ** 2 / np.square(counts, dtype=np.float64).sum()
+    return float((effective / total) ** 0.2)
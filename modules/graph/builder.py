@@ -1,12 +1,15 @@
 import logging
+import threading
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
+from graph.checkpoints import get_checkpointer
 from graph.state import GraphState
-from agents.data_analysis_node import data_analysis_node
-from agents.visualization_node import visualization_node
-from agents.insight_generation_node import insight_generation_node
-from agents.report_drafting_node import report_drafting_node
-from agents.report_finalization_node import report_finalization_node # Import the new report finalization node
-from agents.safety_node import safety_check_node
+from agents.data_analysis_node import adata_analysis_node, data_analysis_node
+from agents.visualization_node import achart_rendering_node, avisualization_node, chart_rendering_node, visualization_node
+from agents.insight_generation_node import ainsight_generation_node, insight_generation_node
+from agents.report_drafting_node import areport_drafting_node, report_drafting_node
+from agents.report_finalization_node import areport_finalization_node, report_finalization_node, report_preparation_node
+from agents.safety_node import asafety_check_node, safety_check_node
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -40,45 +43,91 @@ def check_analysis_validity(state: GraphState) -> str:
 #     logger.info("Safety check passed. Proceeding to report finalization.")
 #     return "report_finalization"
 
+MAX_SAFETY_RETRIES = 2
+
+
 def check_safety_status(state: GraphState) -> str:
     """
     Decides whether to proceed to report finalization, retry, or stop
     based on the result of the safety check.
     """
-    max_retries = 2
     current_retries = state.get("safety_check_retries", 0)
     current_status = state.get("status")
 
     if current_status == "error":
-        if current_retries < max_retries:
-            logger.warning(f"Safety check failed. Retrying report drafting. Attempt {current_retries + 1}/{max_retries}.")
-            state['safety_check_retries'] = current_retries + 1
-            state['status'] = "retrying"
-            state['error_message'] = "Safety check failed, attempting to redraft the report."
-            return "report_drafting"
+        if current_retries < MAX_SAFETY_RETRIES:
+            logger.warning(f"Safety check failed. Retrying report drafting. Attempt {current_retries + 1}/{MAX_SAFETY_RETRIES}.")
+            return "safety_retry"
         else:
-            logger.error(f"Safety check failed after {max_retries} retries. Halting workflow.")
-            state['status'] = "error"
-            state['error_message'] = f"Report generation failed after {max_retries} attempts due to safety checks."
-            return END
+            logger.error(f"Safety check failed after {MAX_SAFETY_RETRIES} retries. Halting workflow.")
+            return "safety_failed"
 
     logger.info("Safety check passed. Proceeding to report finalization.")
     return "report_finalization"
-    
 
-def create_graph_workflow():
+
+def safety_retry_node(state: GraphState) -> GraphState:
+    """
+    Records a redraft after a failed safety check. Routing functions cannot change the state, so the
+    retry count is kept here.
+    """
+    return {
+        "safety_check_retries": state.get("safety_check_retries", 0) + 1,
+        "status": "retrying",
+        "error_message": "Safety check failed, attempting to redraft the report.",
+    }
+
+
+def safety_failed_node(state: GraphState) -> GraphState:
+    """Ends a run whose drafts kept failing the safety check once the retries are used up."""
+    return {
+        "status": "error",
+        "error_message": f"Report generation failed after {MAX_SAFETY_RETRIES} attempts due to safety checks.",
+    }
+
+
+def _changes(before: GraphState, after: GraphState) -> dict:
+    return {key: value for key, value in after.items() if key not in before or before[key] is not value}
+
+
+def _node(name: str, func, afunc=None) -> RunnableLambda:
     """
-    Creates and compiles the LangGraph workflow for report generation.
+    Wraps a node that updates and returns the whole state so that it returns only the keys it changed,
+    which lets parallel branches update the state side by side. With `afunc`, astream/ainvoke run it in
+    place of `func`.
+    """
+    def run(state: GraphState) -> dict:
+        return _changes(state, func(dict(state)))
+
+    async def arun(state: GraphState) -> dict:
+        return _changes(state, await afunc(dict(state)))
+
+    return RunnableLambda(run, afunc=arun if afunc else None, name=name)
+
+
+def create_graph_workflow(parallel: bool = True, checkpointer=None):
+    """
+    Creates and compiles the LangGraph workflow for report generation. The compiled graph runs
+    synchronously with stream()/invoke() and on an event loop with astream()/ainvoke().
+
+    With `parallel`, stages that do not depend on each other run as parallel branches: charts render
+    while insights are generated from the planned charts, and the draft is assembled for output while
+    it is safety checked. Without it, the stages run one after another (kept for comparison).
+
+    With a `checkpointer`, every step is saved under the run's thread_id (see graph/checkpoints.py).
     """
     workflow = StateGraph(GraphState)
 
     # Define the nodes in the graph
-    workflow.add_node("data_analysis", data_analysis_node)
-    workflow.add_node("visualization", visualization_node)
-    workflow.add_node("insight_generation", insight_generation_node)
-    workflow.add_node("report_drafting", report_drafting_node)
-    workflow.add_node("safety_check", safety_check_node)
-    workflow.add_node("report_finalization", report_finalization_node)
+    workflow.add_node("data_analysis", _node("data_analysis", data_analysis_node, adata_analysis_node))
+    workflow.add_node("visualization", _node("visualization", visualization_node, avisualization_node))
+    workflow.add_node("chart_rendering", _node("chart_rendering", chart_rendering_node, achart_rendering_node))
+    workflow.add_node("insight_generation", _node("insight_generation", insight_generation_node, ainsight_generation_node))
+    workflow.add_node("report_drafting", _node("report_drafting", report_drafting_node, areport_drafting_node))
+    workflow.add_node("safety_check", _node("safety_check", safety_check_node, asafety_check_node))
+    workflow.add_node("safety_retry", safety_retry_node)
+    workflow.add_node("safety_failed", safety_failed_node)
+    workflow.add_node("report_finalization", _node("report_finalization", report_finalization_node, areport_finalization_node))
 
     # Define the entry point
     workflow.set_entry_point("data_analysis")
@@ -88,36 +137,53 @@ def create_graph_workflow():
         "visualization": "visualization",
         END: END
     })
-    workflow.add_edge("visualization", "insight_generation")
-    workflow.add_edge("insight_generation", "report_drafting")
-    # After report drafting, proceed to report finalization
-    # workflow.add_edge("report_drafting", "report_finalization")
-    workflow.add_edge("report_drafting", "safety_check")
+    if parallel:
+        # Fan out after the charts are planned; drafting waits for both branches
+        workflow.add_edge("visualization", "chart_rendering")
+        workflow.add_edge("visualization", "insight_generation")
+        workflow.add_edge(["chart_rendering", "insight_generation"], "report_drafting")
+
+        # The draft is assembled for output alongside its safety check; both finish before routing
+        workflow.add_node("report_preparation", _node("report_preparation", report_preparation_node))
+        workflow.add_edge("report_drafting", "safety_check")
+        workflow.add_edge("report_drafting", "report_preparation")
+        workflow.add_edge("report_preparation", END)
+    else:
+        workflow.add_edge("visualization", "chart_rendering")
+        workflow.add_edge("chart_rendering", "insight_generation")
+        workflow.add_edge("insight_generation", "report_drafting")
+        workflow.add_edge("report_drafting", "safety_check")
 
     workflow.add_conditional_edges(
         "safety_check",
         check_safety_status,
         {
             "report_finalization": "report_finalization",
-            "report_drafting": "report_drafting",  
-            END: END
+            "safety_retry": "safety_retry",
+            "safety_failed": "safety_failed",
         }
     )
-
-    # workflow.add_conditional_edges(
-    #     "safety_check",
-    #     check_safety_status,
-    #     {
-    #         "report_finalization": "report_finalization",
-    #         END: END
-    #     }
-    # )
-    # After report finalization, the graph ends for now.
+    workflow.add_edge("safety_retry", "report_drafting")
+    workflow.add_edge("safety_failed", END)
     workflow.add_edge("report_finalization", END)
 
     # Compile the graph
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
     return app
 
 
+_compiled_graph = None
+_compiled_graph_lock = threading.Lock()
+
 
+def get_graph_workflow():
+    """
+    The compiled report workflow, built once per process. A compiled graph holds no per-run state, so
+    one instance can serve every report and concurrent runs. Runs are checkpointed: pass
+    run_config(request_id) when invoking it.
+    """
+    global _compiled_graph
+    with _compiled_graph_lock:
+        if _compiled_graph is None:
+            _compiled_graph = create_graph_workflow(checkpointer=get_checkpointer())
+        return _compiled_graph
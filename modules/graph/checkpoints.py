@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from graph.state import CLEAR_ERROR_MESSAGE, FAILED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding each report run's checkpoints, keyed by request_id
+REPORT_CHECKPOINT_DB = os.getenv("REPORT_CHECKPOINT_DB", os.path.join("local_app_data", "checkpoints.sqlite"))
+
+_checkpointer: Optional["ReportCheckpointer"] = None
+_checkpointer_lock = threading.Lock()
+
+
+class ReportCheckpointer(SqliteSaver):
+    """
+    SqliteSaver that also serves the async graph: the async methods run the sync ones in a worker
+    thread, where SqliteSaver's own lock serializes access to the connection.
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator:
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def get_checkpointer() -> ReportCheckpointer:
+    """The process-wide checkpointer, opened on first use."""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            os.makedirs(os.path.dirname(REPORT_CHECKPOINT_DB) or ".", exist_ok=True)
+            # One connection shared by all threads; SqliteSaver locks around every use
+            conn = sqlite3.connect(REPORT_CHECKPOINT_DB, check_same_thread=False)
+            _checkpointer = ReportCheckpointer(conn)
+            _checkpointer.setup()
+        return _checkpointer
+
+
+def run_config(request_id: str) -> Dict[str, Any]:
+    """Graph config that checkpoints a run under its request_id."""
+    return {"configurable": {"thread_id": request_id}}
+
+
+def resume_config(app, request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Config for resuming a run that ended in an error or was interrupted by an exception: the latest
+    checkpoint taken before the failure, so invoking the graph from it (with input None) re-runs only
+    the stage that failed and what follows. None when there is nothing to resume.
+
+    A run that ended because its drafts kept failing the safety check resumes at drafting, with the
+    safety retries reset.
+    """
+    history = list(app.get_state_history(run_config(request_id)))
+    if not history or (not history[0].next and history[0].values.get("status") != "error"):
+        return None
+    if len(history) > 1 and "safety_failed" in history[1].next:
+        # The drafts kept failing the safety check, so drafting is the stage that failed: redraft the
+        # failing sections with a fresh retry budget rather than re-reviewing the rejected draft
+        logger.info(f"Resuming request {request_id} at report_drafting after failed safety checks")
+        return app.update_state(history[0].config, {
+            "safety_check_retries": 0,
+            "status": "retrying",
+            "error_message": CLEAR_ERROR_MESSAGE,
+        }, as_node="safety_retry")
+    for snapshot in history:
+        if snapshot.next and snapshot.values.get("status") not in FAILED_STATUSES:
+            logger.info(f"Resuming request {request_id} at {', '.join(snapshot.next)}")
+            return snapshot.config
+    return None
+
+
+def discard_run(request_id: str):
+    """Drops a run's checkpoints once it has finished and will not be resumed."""
+    try:
+        get_checkpointer().delete_thread(request_id)
+    except Exception as e:
+        logger.warning(f"Could not delete checkpoints for request {request_id}: {e}")
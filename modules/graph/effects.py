@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Tuple
+
+from llm.cache import PromptCacheScope, cache_response, cached_response
+from llm.usage import usage_tracker
+
+
+class LLMCall(NamedTuple):
+    """
+    Invoke `llm` with `input`; the node receives the model's message. With a `cache` scope (see
+    llm/cache.py), a response cached for the same node, model, prompt and dataset is returned without
+    calling the model, and new responses are cached once the node finishes without an error.
+    """
+    llm: Any
+    input: Any
+    config: Optional[Dict[str, Any]] = None
+    cache: Optional[PromptCacheScope] = None
+
+
+class Sleep(NamedTuple):
+    seconds: float
+
+
+class Blocking(NamedTuple):
+    """CPU- or disk-bound work (loading data, rendering, PDF output); the node receives func's result."""
+    func: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+
+
+# A node body written once as a generator: it yields the effects above and gets their results back,
+# so the same logic runs under run_node (sync graph) and arun_node (async graph).
+NodeSteps = Generator[Any, Any, Any]
+
+# Responses to cache when the node finishes: (key, llm, message, scope)
+_PendingResponses = List[Tuple[str, Any, Any, PromptCacheScope]]
+
+
+def _commit_responses(pending: _PendingResponses, node_result: Any):
+    if isinstance(node_result, dict) and node_result.get("status") == "error":
+        return
+    for key, llm, message, scope in pending:
+        cache_response(key, llm, message, scope)
+
+
+def run_node(steps: NodeSteps) -> Any:
+    """Drives a node's steps on the calling thread: invoke, time.sleep and direct calls."""
+    result, error = None, None
+    pending: _PendingResponses = []
+    while True:
+        try:
+            effect = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            _commit_responses(pending, stop.value)
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(effect, LLMCall):
+                key = None
+                if effect.cache:
+                    key, result = cached_response(effect.llm, effect.input, effect.cache)
+                if result is not None:
+                    usage_tracker.record_cache_hit()
+                else:
+                    result = effect.llm.invoke(effect.input, config=effect.config)
+                    if key:
+                        pending.append((key, effect.llm, result, effect.cache))
+            elif isinstance(effect, Sleep):
+                time.sleep(effect.seconds)
+            elif isinstance(effect, Blocking):
+                result = effect.func(*effect.args)
+            else:
+                raise TypeError(f"Unknown node effect: {effect!r}")
+        except Exception as e:
+            # Raised inside the node at the yield, so its own retry/error handling applies
+            error = e
+
+
+async def arun_node(steps: NodeSteps) -> Any:
+    """Drives a node's steps on the event loop: ainvoke, asyncio.sleep and blocking work in a thread."""
+    result, error = None, None
+    pending: _PendingResponses = []
+    while True:
+        try:
+            effect = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            if pending:
+                await asyncio.to_thread(_commit_responses, pending, stop.value)
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(effect, LLMCall):
+                key = None
+                if effect.cache:
+                    key, result = await asyncio.to_thread(cached_response, effect.llm, effect.input,
+                                                          effect.cache)
+                if result is not None:
+                    usage_tracker.record_cache_hit()
+                else:
+                    result = await effect.llm.ainvoke(effect.input, config=effect.config)
+                    if key:
+                        pending.append((key, effect.llm, result, effect.cache))
+            elif isinstance(effect, Sleep):
+                await asyncio.sleep(effect.seconds)
+            elif isinstance(effect, Blocking):
+                # to_thread copies the context, so the node's usage scope still applies
+                result = await asyncio.to_thread(effect.func, *effect.args)
+            else:
+                raise TypeError(f"Unknown node effect: {effect!r}")
+        except Exception as e:
+            error = e
@@ -0,0 +1,95 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import pandas as pd
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+
+
+class RunContext:
+    """
+    Per-run resources that must not live in GraphState: the state is what gets serialized into
+    checkpoints and streamed back to the UI, so a DataFrame there would be copied at every step.
+
+    The CSV is parsed on first use and the same DataFrame is handed to every node of the run. Nodes
+    treat it as read-only; anything that needs to change it works on a copy. Work done in other
+    processes reads the frame from an uncompressed Arrow file, memory-mapped instead of pickled.
+    """
+
+    def __init__(self, request_id: str, file_path: str):
+        self.request_id = request_id
+        self.file_path = file_path
+        self.registered = False
+        self._df: Optional[pd.DataFrame] = None
+        self._columnar_dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def dataframe(self) -> pd.DataFrame:
+        with self._lock:
+            if self._df is None:
+                self._df = pd.read_csv(self.file_path)
+                logger.info(f"Loaded {self.file_path} ({len(self._df)} rows) for request {self.request_id}")
+            return self._df
+
+    def columnar_path(self) -> str:
+        """
+        Path of the run's Arrow copy of the DataFrame, written on first use. Raises if the frame cannot
+        be stored as Arrow (e.g. an object column mixing numbers and text).
+        """
+        df = self.dataframe()
+        with self._lock:
+            if self._columnar_dir is None:
+                directory = tempfile.mkdtemp(prefix=f"report_{self.request_id}_")
+                try:
+                    feather.write_feather(df, os.path.join(directory, "frame.arrow"), compression="uncompressed")
+                except Exception:
+                    shutil.rmtree(directory, ignore_errors=True)
+                    raise
+                self._columnar_dir = directory
+            return os.path.join(self._columnar_dir, "frame.arrow")
+
+    def release(self):
+        with self._lock:
+            self._df = None
+            if self._columnar_dir is not None:
+                shutil.rmtree(self._columnar_dir, ignore_errors=True)
+                self._columnar_dir = None
+
+
+_runs: Dict[str, RunContext] = {}
+_runs_lock = threading.Lock()
+
+
+@contextmanager
+def report_run(request_id: str, file_path: str):
+    """Registers the run's context for the duration of a graph execution and frees it afterwards."""
+    context = RunContext(request_id, file_path)
+    context.registered = True
+    with _runs_lock:
+        _runs[request_id] = context
+    try:
+        yield context
+    finally:
+        with _runs_lock:
+            _runs.pop(request_id, None)
+        context.release()
+
+
+def get_run_context(state) -> RunContext:
+    """
+    The context registered for this state's request. A node invoked outside `report_run` (e.g. on its
+    own in a test) gets a private context, so it still works but loads the file itself; the caller
+    releases it when `registered` is False.
+    """
+    request_id = state.get('request_id', 'unknown_request')
+    with _runs_lock:
+        context = _runs.get(request_id)
+    if context is None or context.file_path != state.get('file_path'):
+        context = RunContext(request_id, state.get('file_path'))
+    return context
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Iterable, List, Optional
+
+from graph.builder import get_graph_workflow
+from graph.checkpoints import discard_run, resume_config, run_config
+from graph.run_context import report_run
+from graph.state import GraphState
+
+logger = logging.getLogger(__name__)
+
+# Report runs arun_reports drives at once on one event loop
+REPORT_RUN_CONCURRENCY = int(os.getenv("REPORT_RUN_CONCURRENCY", "32"))
+
+NodeUpdateCallback = Callable[[str, GraphState], None]
+
+
+async def arun_report(initial_state: GraphState, on_update: Optional[NodeUpdateCallback] = None,
+                      resume: bool = False) -> GraphState:
+    """
+    Runs one report through the async graph and returns its final state. LLM calls and retry waits
+    yield to the event loop, so many runs can share one loop; `on_update` is called with each node's
+    name and the state keys it changed as it finishes.
+
+    With `resume`, a run with the same request_id that ended in an error continues from its last
+    checkpoint before the failure instead of starting over.
+
+    The final report's PDF may still be rendering when this returns (pdf_status "pending"); use
+    agents.report_pdf.wait_for_pdf to wait for it.
+    """
+    app = get_graph_workflow()
+    request_id = initial_state["request_id"]
+    graph_input, config = initial_state, run_config(request_id)
+    if resume:
+        checkpoint = await asyncio.to_thread(resume_config, app, request_id)
+        if checkpoint:
+            graph_input, config = None, checkpoint
+
+    final_state = initial_state
+    with report_run(request_id, initial_state["file_path"]):
+        async for mode, chunk in app.astream(graph_input, config=config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_state = chunk
+            elif on_update:
+                for node, changes in chunk.items():
+                    on_update(node, changes or {})
+    if final_state.get("status") != "error":
+        await asyncio.to_thread(discard_run, request_id)
+    return final_state
+
+
+async def arun_reports(initial_states: Iterable[GraphState],
+                       concurrency: int = REPORT_RUN_CONCURRENCY) -> List[GraphState]:
+    """Runs several reports concurrently, at most `concurrency` at a time; final states in input order."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(state: GraphState) -> GraphState:
+        async with semaphore:
+            try:
+                return await arun_report(state)
+            except Exception as e:
+                logger.error(f"Report run {state.get('request_id')} failed: {e}", exc_info=True)
+                state['status'] = "error"
+                state['error_message'] = f"Report run failed: {e}"
+                return state
+
+    return list(await asyncio.gather(*(run(state) for state in initial_states)))
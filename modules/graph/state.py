@@ -1,5 +1,40 @@
-from typing import List, Optional, TypedDict
-from schemas.messages import DataProfile, AnalysisInsight, GeneratedVisual, ReportSectionsDraft, ReportFormat, UserFeedback
+from typing import Annotated, List, Optional, TypedDict
+from schemas.messages import (DataProfile, AnalysisInsight, GeneratedVisual, PreparedReport, ReportSectionsDraft,
+                              ReportFormat, SectionVerdict, UserFeedback, VisualGenerationInstruction)
+
+# Statuses that end a run; later nodes cannot overwrite them, only a retry ("retrying") can
+FAILED_STATUSES = ("error", "invalid_instructions")
+
+
+def merge_status(current: Optional[str], update: str) -> str:
+    """
+    Reducer for `status`. Parallel branches report their own status in the same step, so a failure in
+    one branch must not be hidden by the other branch finishing normally.
+    """
+    if update == "retrying" or current not in FAILED_STATUSES:
+        return update
+    return current
+
+
+# Written to `error_message` to clear it, e.g. once a check that failed before passes
+CLEAR_ERROR_MESSAGE = ""
+
+
+def merge_error_message(current: Optional[str], update: Optional[str]) -> Optional[str]:
+    """
+    Reducer for `error_message`: messages from parallel branches are kept together, and
+    CLEAR_ERROR_MESSAGE clears them.
+    """
+    if update == CLEAR_ERROR_MESSAGE:
+        return None
+    if not current:
+        return update
+    if not update or update in current:
+        return current
+    if update.startswith(current):  # the same message, extended by a later node
+        return update
+    return f"{current}\n{update}"
+
 
 class GraphState(TypedDict):
     """
@@ -9,24 +44,36 @@ class GraphState(TypedDict):
         request_id (str): A unique identifier for the current report generation request.
         file_path (str): The path to the uploaded CSV file.
         instructions (str): User's original instructions for the report.
+        bypass_llm_cache (Optional[bool]): Send every LLM call to the model instead of reusing cached responses.
         dataframe_profile (Optional[DataProfile]): Profile of the uploaded dataframe after initial analysis.
         analysis_insights (Optional[List[AnalysisInsight]]): List of key insights derived from the data.
+        suggested_visuals (Optional[List[VisualGenerationInstruction]]): Charts suggested for the dataset, before rendering.
         generated_visuals (Optional[List[GeneratedVisual]]): List of paths to generated visualization images.
         report_sections_draft (Optional[ReportSectionsDraft]): The drafted sections of the report.
+        section_verdicts (Optional[List[SectionVerdict]]): The safety check's verdict on each section of the draft.
+        prepared_report (Optional[PreparedReport]): The current draft assembled as Markdown/HTML while it is safety checked.
         final_report (Optional[ReportFormat]): The assembled final report.
         feedback_history (Optional[List[UserFeedback]]): History of user feedback for iterative refinement.
         status (str): Current status of the report generation process (e.g., "pending", "data_profiled", "visuals_generated", "insights_generated", "draft_ready", "clarification_needed", "completed", "error").
         error_message (Optional[str]): Any error message if the process fails.
+        safety_check_retries (int): How many times the report has been redrafted after a failed safety check.
+
+    Nodes return only the keys they change; `status` and `error_message` have reducers because
+    parallel branches of the graph can both write them in the same step.
     """
     request_id: str
     file_path: str
     instructions: str
+    bypass_llm_cache: Optional[bool]
     dataframe_profile: Optional[DataProfile]
     analysis_insights: Optional[List[AnalysisInsight]]
+    suggested_visuals: Optional[List[VisualGenerationInstruction]]
     generated_visuals: Optional[List[GeneratedVisual]]
     report_sections_draft: Optional[ReportSectionsDraft]
+    section_verdicts: Optional[List[SectionVerdict]]
+    prepared_report: Optional[PreparedReport]
     final_report: Optional[ReportFormat]
     feedback_history: Optional[List[UserFeedback]]
-    status: str
-    error_message: Optional[str]
+    status: Annotated[str, merge_status]
+    error_message: Annotated[Optional[str], merge_error_message]
     safety_check_retries: int
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from .usage import current_scope
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding cached LLM responses, and its size budget (0 turns the cache off)
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join("local_app_data", "llm_cache.sqlite"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+
+_fingerprints: Dict[Tuple[str, int, int], str] = {}
+_fingerprints_lock = threading.Lock()
+
+
+def dataset_fingerprint(file_path: str) -> str:
+    """SHA-256 of a dataset file's contents, computed once per file version (path, size, mtime)."""
+    stat = os.stat(file_path)
+    version = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _fingerprints_lock:
+        fingerprint = _fingerprints.get(version)
+    if fingerprint is None:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint = digest.hexdigest()
+        with _fingerprints_lock:
+            _fingerprints[version] = fingerprint
+    return fingerprint
+
+
+# Stands in for the run's request_id in cache keys and cached responses
+_RUN_ID_PLACEHOLDER = "\x00request_id\x00"
+
+
+class PromptCacheScope(NamedTuple):
+    """
+    What a cached response depends on besides the prompt: the dataset it was built from, and the run's
+    id, which appears in prompts (e.g. in chart ids) and is swapped for the current run's on a hit.
+    """
+    dataset_path: str
+    run_id: str
+
+
+def prompt_cache_scope(state) -> Optional[PromptCacheScope]:
+    """
+    The scope to cache a node's LLM responses under, for LLMCall's `cache`; None when the run sets
+    `bypass_llm_cache`, so every call goes to the model.
+    """
+    if state.get("bypass_llm_cache") or not state.get("file_path"):
+        return None
+    return PromptCacheScope(state["file_path"], state.get("request_id", ""))
+
+
+def _prompt_text(prompt: Any) -> str:
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return json.dumps([message.model_dump() if isinstance(message, BaseMessage) else message
+                           for message in prompt], sort_keys=True, default=str)
+    return str(prompt)
+
+
+class PromptCache:
+    """
+    LLM responses on disk, keyed by a hash of the calling node, model, temperature, rendered prompt and
+    dataset fingerprint. Entries are dropped least recently used first once the cache outgrows
+    `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        # One connection shared by all threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, node TEXT, model TEXT, content TEXT,"
+                " size INTEGER, last_used REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+
+    @staticmethod
+    def key(llm: Any, prompt: Any, scope: PromptCacheScope) -> str:
+        model = getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+        prompt_text = _prompt_text(prompt)
+        if scope.run_id:
+            prompt_text = prompt_text.replace(scope.run_id, _RUN_ID_PLACEHOLDER)
+        parts = [current_scope(), str(model), getattr(llm, "temperature", None), prompt_text,
+                 dataset_fingerprint(scope.dataset_path)]
+        return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, key: str, llm: Any, content: str):
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        model = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, current_scope(), model, content, size, time.time()))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total)
+
+    def _evict(self, total: int):
+        # Trim to 90% of the budget so that the next few inserts do not evict again
+        target = self.max_bytes * 0.9
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} cached LLM responses")
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+
+_cache: Optional[PromptCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> Optional[PromptCache]:
+    """The process-wide prompt cache, opened on first use; None when LLM_CACHE_MAX_MB is 0."""
+    global _cache
+    if LLM_CACHE_MAX_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PromptCache(LLM_CACHE_DB, int(LLM_CACHE_MAX_MB * 1024 * 1024))
+        return _cache
+
+
+def cached_response(llm: Any, prompt: Any, scope: PromptCacheScope) -> Tuple[Optional[str], Optional[AIMessage]]:
+    """
+    Looks up a call in the prompt cache: its key (None when the cache is off or the dataset cannot be
+    read) and the cached message, if any.
+    """
+    cache = get_prompt_cache()
+    if cache is None:
+        return None, None
+    try:
+        key = cache.key(llm, prompt, scope)
+        content = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Prompt cache lookup failed: {e}")
+        return None, None
+    if content is None:
+        return key, None
+    if scope.run_id:
+        content = content.replace(_RUN_ID_PLACEHOLDER, scope.run_id)
+    return key, AIMessage(content=content)
+
+
+def cache_response(key: str, llm: Any, message: Any, scope: PromptCacheScope):
+    content = getattr(message, "content", None)
+    if not isinstance(content, str):
+        return
+    if scope.run_id:
+        content = content.replace(scope.run_id, _RUN_ID_PLACEHOLDER)
+    try:
+        get_prompt_cache().put(key, llm, content)
+    except Exception as e:
+        logger.warning(f"Could not cache LLM response: {e}")
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from .usage import usage_callback
+
+logger = logging.getLogger(__name__)
+
+ChatModelFactory = Callable[[str, float], BaseChatModel]
+
+# Keyed by model, temperature, API key and the event loop the client is used on (None outside one)
+_clients: Dict[Tuple[str, float, str, Optional[asyncio.AbstractEventLoop]], BaseChatModel] = {}
+_clients_lock = threading.Lock()
+_factory: Optional[ChatModelFactory] = None
+
+
+def _gemini(model: str, temperature: float) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables.")
+    return ChatGoogleGenerativeAI(model=model, google_api_key=gemini_api_key, temperature=temperature,
+                                  callbacks=[usage_callback])
+
+
+def get_chat_model(model: str, temperature: float) -> BaseChatModel:
+    """
+    The process-wide chat model for `model` at `temperature`, created on first use.
+
+    Clients are safe to share between threads and report runs, and reusing one keeps its HTTP/gRPC
+    connections open instead of setting up a new client (and TLS session) in every node call. Usage
+    is still attributed per node, since the usage scope is read when a call is made.
+
+    Called from a coroutine, the client is specific to the running event loop: an async client's gRPC
+    channel is bound to the loop it was first used on and fails once that loop is closed (e.g. by the
+    next asyncio.run). Clients of closed loops are dropped.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = (model, float(temperature), os.getenv("GEMINI_API_KEY", ""), loop)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            for stale in [k for k in _clients if k[3] is not None and k[3].is_closed()]:
+                del _clients[stale]
+            client = (_factory or _gemini)(model, temperature)
+            _clients[key] = client
+            logger.info(f"Created LLM client for {model} (temperature {temperature})")
+        return client
+
+
+def set_chat_model_factory(factory: Optional[ChatModelFactory]):
+    """Replaces how clients are built (e.g. with a local stand-in for benchmarks); None restores Gemini."""
+    global _factory
+    with _clients_lock:
+        _factory = factory
+        _clients.clear()
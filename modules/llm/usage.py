@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (input, output). Unknown models are tracked with a cost of 0.
+MODEL_PRICING: Dict[str, tuple] = {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+DEFAULT_SCOPE = "unscoped"
+_current_scope: ContextVar[str] = ContextVar("llm_usage_scope", default=DEFAULT_SCOPE)
+
+
+@contextmanager
+def usage_scope(name: str):
+    """
+    Attributes every LLM call made inside the block to `name` (an endpoint or graph node).
+    Can also be used as a decorator on node functions.
+    """
+    token = _current_scope.set(name)
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+def current_scope() -> str:
+    return _current_scope.get()
+
+
+def _normalize_model_name(name: Optional[str]) -> str:
+    if not name:
+        return "unknown"
+    # crawl4ai/litellm use "provider/model", Gemini sometimes reports "models/<name>"
+    return name.split("/")[-1]
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICING.get(_normalize_model_name(model), (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageTracker:
+    """
+    Thread-safe aggregate of LLM calls, grouped by scope and by model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scopes: Dict[str, Dict[str, Any]] = {}
+        self._started_at = time.time()
+
+    def _bucket(self, scope: str) -> Dict[str, Any]:
+        bucket = self._scopes.get(scope)
+        if bucket is None:
+            bucket = {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "cache_hits": 0,
+                "profile_tokens_saved": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cost_usd": 0.0,
+                "latency_total_s": 0.0,
+                "latency_max_s": 0.0,
+                "models": {},
+            }
+            self._scopes[scope] = bucket
+        return bucket
+
+    def record(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency_s: float = 0.0, scope: Optional[str] = None, error: bool = False):
+        scope = scope or current_scope()
+        model = _normalize_model_name(model)
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            bucket = self._bucket(scope)
+            bucket["calls"] += 1
+            bucket["errors"] += int(error)
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            bucket["total_tokens"] += prompt_tokens + completion_tokens
+            bucket["cost_usd"] += cost
+            bucket["latency_total_s"] += latency_s
+            bucket["latency_max_s"] = max(bucket["latency_max_s"], latency_s)
+            per_model = bucket["models"].setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            per_model["calls"] += 1
+            per_model["prompt_tokens"] += prompt_tokens
+            per_model["completion_tokens"] += completion_tokens
+
+    def record_retry(self, scope: Optional[str] = None):
+        with self._lock:
+            self._bucket(scope or current_scope())["retries"] += 1
+
+    def record_cache_hit(self, scope: Optional[str] = None):
+        """A call answered from the prompt cache instead of the model."""
+        with self._lock:
+            self._bucket(scope or current_scope())["cache_hits"] += 1
+
+    def record_tokens_saved(self, tokens: int, scope: Optional[str] = None):
+        """Prompt tokens saved by rendering the data profile compactly instead of as JSON."""
+        with self._lock:
+            self._bucket(scope or current_scope())["profile_tokens_saved"] += tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            scopes = {}
+            for name, bucket in self._scopes.items():
+                entry = {k: v for k, v in bucket.items() if k != "models"}
+                entry["models"] = {m: dict(v) for m, v in bucket["models"].items()}
+                entry["cost_usd"] = round(bucket["cost_usd"], 6)
+                entry["latency_avg_s"] = round(bucket["latency_total_s"] / bucket["calls"], 3) if bucket["calls"] else 0.0
+                scopes[name] = entry
+        totals = {
+            key: sum(s[key] for s in scopes.values())
+            for key in ("calls", "errors", "retries", "cache_hits", "profile_tokens_saved", "prompt_tokens", "completion_tokens", "total_tokens")
+        }
+        totals["cost_usd"] = round(sum(s["cost_usd"] for s in scopes.values()), 6)
+        return {"since": self._started_at, "totals": totals, "scopes": scopes}
+
+    def reset(self):
+        with self._lock:
+            self._scopes.clear()
+            self._started_at = time.time()
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        if not snapshot["scopes"]:
+            return
+        totals = snapshot["totals"]
+        logger.info(
+            f"LLM usage: {totals['calls']} calls, {totals['total_tokens']} tokens, "
+            f"${totals['cost_usd']:.4f}, {totals['retries']} retries, {totals['errors']} errors, "
+            f"{totals['cache_hits']} cache hits, {totals['profile_tokens_saved']} profile tokens saved")
+        ranked = sorted(snapshot["scopes"].items(), key=lambda item: item[1]["total_tokens"], reverse=True)
+        for name, entry in ranked:
+            logger.info(
+                f"  {name}: {entry['calls']} calls, {entry['prompt_tokens']} prompt / "
+                f"{entry['completion_tokens']} completion tokens, ${entry['cost_usd']:.4f}, "
+                f"avg {entry['latency_avg_s']}s, {entry['retries']} retries, {entry['cache_hits']} cache hits, "
+                f"{entry['profile_tokens_saved']} profile tokens saved")
+
+
+class LLMUsageCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that feeds token counts, model names, latency and retries into a UsageTracker.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracker: UsageTracker):
+        self.tracker = tracker
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]],
+               kwargs: Dict[str, Any]):
+        params = kwargs.get("invocation_params") or {}
+        model = (
+            params.get("model") or params.get("model_name")
+            or (metadata or {}).get("ls_model_name")
+            or ((serialized or {}).get("kwargs") or {}).get("model")
+        )
+        with self._lock:
+            self._runs[run_id] = {"model": model, "scope": current_scope(), "start": time.perf_counter()}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self._start(run_id, serialized, metadata, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self._start(run_id, serialized, metadata, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        prompt_tokens, completion_tokens = _extract_token_usage(response)
+        model = run["model"] or (response.llm_output or {}).get("model_name")
+        self.tracker.record(model, prompt_tokens, completion_tokens,
+                            latency_s=time.perf_counter() - run["start"], scope=run["scope"])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        self.tracker.record(run["model"], latency_s=time.perf_counter() - run["start"], scope=run["scope"], error=True)
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            run = self._runs.get(run_id)
+        self.tracker.record_retry(run["scope"] if run else None)
+
+
+def _extract_token_usage(response: LLMResult) -> tuple:
+    prompt_tokens = completion_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                found = True
+    if not found:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+usage_tracker = UsageTracker()
+usage_callback = LLMUsageCallbackHandler(usage_tracker)
+
+_summary_thread: Optional[threading.Thread] = None
+_summary_lock = threading.Lock()
+
+
+def start_periodic_summary(interval_s: Optional[float] = None):
+    """
+    Logs a usage summary every `interval_s` seconds (LLM_USAGE_LOG_INTERVAL, default 300) from a daemon thread.
+    Safe to call more than once; only one logger thread is started per process.
+    """
+    global _summary_thread
+    interval_s = interval_s or float(os.getenv("LLM_USAGE_LOG_INTERVAL", "300"))
+    with _summary_lock:
+        if _summary_thread is not None and _summary_thread.is_alive():
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval_s)
+                try:
+                    usage_tracker.log_summary()
+                except Exception as e:
+                    logger.warning(f"Failed to log LLM usage summary: {e}")
+
+        _summary_thread = threading.Thread(target=_loop, name="llm-usage-summary", daemon=True)
+        _summary_thread.start()
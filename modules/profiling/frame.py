@@ -0,0 +1,200 @@
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas.core import nanops
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def _profile_column(series: pd.Series, num_rows: int) -> Dict[str, Any]:
+    """Per-column profile, one pandas call per statistic. Reference for the vectorized paths below."""
+    col_type = str(series.dtype)
+
+    # Convert to standard Python int
+    unique_values = int(series.nunique())
+    missing_values_count = int(series.isnull().sum())
+
+    detail: Dict[str, Any] = {
+        "type": col_type,
+        "unique_values_count": unique_values,
+        "missing_values_count": missing_values_count,
+        "missing_values_percentage": f"{(missing_values_count / num_rows * 100):.2f}%"
+    }
+
+    if pd.api.types.is_numeric_dtype(series):
+        # Convert to standard Python float/int, handling NaN values
+        mean_val = series.mean()
+        detail["mean"] = float(mean_val) if pd.notna(mean_val) else None
+
+        std_val = series.std()
+        detail["std"] = float(std_val) if pd.notna(std_val) else None
+
+        min_val = series.min()
+        if pd.notna(min_val):
+            detail["min"] = float(min_val) if isinstance(min_val, (np.floating, float)) else int(min_val)
+        else:
+            detail["min"] = None
+
+        max_val = series.max()
+        if pd.notna(max_val):
+            detail["max"] = float(max_val) if isinstance(max_val, (np.floating, float)) else int(max_val)
+        else:
+            detail["max"] = None
+
+        # Convert quantiles to standard Python floats
+        quantiles_dict = series.quantile(QUANTILES).to_dict()
+        detail["quantiles"] = {k: float(v) if pd.notna(v) else None for k, v in quantiles_dict.items()}
+
+    elif pd.api.types.is_string_dtype(series) or pd.api.types.is_object_dtype(series):
+        # Convert values in top_5_values to native int
+        top_5_values_dict = series.value_counts().nlargest(5).to_dict()
+        detail["top_5_values"] = {k: int(v) for k, v in top_5_values_dict.items()}
+
+    return detail
+
+
+def profile_dataframe_per_column(df: pd.DataFrame) -> Dict[str, Any]:
+    profile_data = {
+        "num_rows": len(df),
+        "num_columns": len(df.columns),
+        "column_details": {},
+        "key_observations": ""
+    }
+    for col in df.columns:
+        profile_data["column_details"][col] = _profile_column(df[col], len(df))
+    return profile_data
+
+
+def _as_number(value):
+    return float(value) if isinstance(value, (np.floating, float)) else int(value)
+
+
+def _numeric_block_details(df: pd.DataFrame, columns: List[str], num_rows: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Profiles same-dtype numeric columns (int64 or float64) together. Rows of `values` are columns, each
+    contiguous, and the reductions are pandas' own nanops along axis 1 with one shared NaN mask, so every
+    number matches the per-column Series methods bit for bit.
+    """
+    values = df[columns].to_numpy().T
+    dtype = values.dtype
+    mask = np.isnan(values) if dtype.kind == "f" else None
+    missing = mask.sum(axis=1) if mask is not None else np.zeros(len(columns), dtype=np.int64)
+    valid = num_rows - missing
+
+    means = nanops.nanmean(values, axis=1, skipna=True, mask=mask)
+    stds = nanops.nanstd(values, axis=1, skipna=True, ddof=1, mask=mask)
+    mins = nanops.nanmin(values, axis=1, skipna=True, mask=mask)
+    maxs = nanops.nanmax(values, axis=1, skipna=True, mask=mask)
+
+    # Distinct values from one sort per column (NaN sorts last, 0.0 and -0.0 count as one value)
+    ordered = np.sort(values, axis=1)
+    if num_rows > 1:
+        changes = ordered[:, 1:] != ordered[:, :-1]
+        changes &= np.arange(num_rows - 1) < (valid - 1)[:, None]
+        uniques = np.where(valid > 0, 1 + changes.sum(axis=1), 0)
+    else:
+        uniques = valid.copy()
+
+    # Quantiles are taken from the unsorted values like Series.quantile does, since the selection order
+    # decides whether a tie between 0.0 and -0.0 comes out signed
+    percentiles = np.asarray(QUANTILES) * 100.0
+    quantiles = np.full((len(columns), len(QUANTILES)), np.nan)
+    complete = valid == num_rows
+    if complete.any():
+        quantiles[complete] = np.percentile(values[complete], percentiles, axis=1, method="linear").T
+    for i in np.flatnonzero(~complete & (valid > 0)):
+        quantiles[i] = np.percentile(values[i][~mask[i]], percentiles, method="linear")
+
+    details = {}
+    for i, col in enumerate(columns):
+        missing_values_count = int(missing[i])
+        mean_val, std_val, min_val, max_val = means[i], stds[i], mins[i], maxs[i]
+        details[col] = {
+            "type": str(dtype),
+            "unique_values_count": int(uniques[i]),
+            "missing_values_count": missing_values_count,
+            "missing_values_percentage": f"{(missing_values_count / num_rows * 100):.2f}%",
+            "mean": float(mean_val) if pd.notna(mean_val) else None,
+            "std": float(std_val) if pd.notna(std_val) else None,
+            "min": _as_number(min_val) if pd.notna(min_val) else None,
+            "max": _as_number(max_val) if pd.notna(max_val) else None,
+            "quantiles": {q: float(v) if pd.notna(v) else None for q, v in zip(QUANTILES, quantiles[i])},
+        }
+    return details
+
+
+def _object_block_details(df: pd.DataFrame, columns: List[str], num_rows: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Profiles object columns with one factorization of all their cells. Each column's value counts come
+    out in first-appearance order, as from Series.value_counts before sorting, so sorting and nlargest
+    break ties exactly the same way.
+    """
+    cells = df[columns].to_numpy(dtype=object).T.ravel()
+    codes, uniques = pd.factorize(cells, use_na_sentinel=True)
+    column_of_cell = np.repeat(np.arange(len(columns), dtype=np.int64), num_rows)
+    present = codes >= 0
+    missing = np.bincount(column_of_cell[~present], minlength=len(columns))
+
+    # (column, value) keys, numbered in order of first appearance; columns come one after another
+    keys = column_of_cell[present] * (len(uniques) + 1) + codes[present]
+    key_codes, unique_keys = pd.factorize(keys)
+    counts = np.bincount(key_codes)
+    first_position = np.full(len(unique_keys), len(keys), dtype=np.int64)
+    np.minimum.at(first_position, key_codes, np.arange(len(keys)))
+    representatives = cells[np.flatnonzero(present)[first_position]] if len(keys) else cells[:0]
+    key_columns = unique_keys // (len(uniques) + 1)
+    bounds = np.searchsorted(key_columns, np.arange(len(columns) + 1))
+
+    details = {}
+    for i, col in enumerate(columns):
+        start, stop = bounds[i], bounds[i + 1]
+        missing_values_count = int(missing[i])
+        # Same index construction as value_counts: Index inference, except object -> bool/string
+        index = pd.Index(representatives[start:stop])
+        if index.dtype in [bool, "string"]:
+            index = index.astype(object)
+        value_counts = pd.Series(counts[start:stop], index=index).sort_values(ascending=False)
+        # nlargest(5) of a series already sorted in descending order is its first five entries
+        details[col] = {
+            "type": str(df[col].dtype),
+            "unique_values_count": int(stop - start),
+            "missing_values_count": missing_values_count,
+            "missing_values_percentage": f"{(missing_values_count / num_rows * 100):.2f}%",
+            "top_5_values": {k: int(v) for k, v in value_counts.head(5).to_dict().items()},
+        }
+    return details
+
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Builds the dataset profile (row/column counts and per-column details) for an in-memory DataFrame.
+
+    int64 and float64 columns are profiled as one block per dtype and object columns with a single
+    grouped pass; other dtypes (bool, datetime, category, ...) use the per-column reference code.
+    The result is identical to profile_dataframe_per_column.
+    """
+    num_rows = len(df)
+    if df.columns.has_duplicates or num_rows == 0:
+        return profile_dataframe_per_column(df)
+
+    by_kind: Dict[str, List[str]] = {"int64": [], "float64": [], "object": [], "other": []}
+    for col, dtype in df.dtypes.items():
+        key = str(dtype) if str(dtype) in by_kind else "other"
+        by_kind[key].append(col)
+
+    details: Dict[str, Dict[str, Any]] = {}
+    for kind in ("int64", "float64"):
+        if by_kind[kind]:
+            details.update(_numeric_block_details(df, by_kind[kind], num_rows))
+    if by_kind["object"]:
+        details.update(_object_block_details(df, by_kind["object"], num_rows))
+    for col in by_kind["other"]:
+        details[col] = _profile_column(df[col], num_rows)
+
+    return {
+        "num_rows": num_rows,
+        "num_columns": len(df.columns),
+        "column_details": {col: details[col] for col in df.columns},
+        "key_observations": ""
+    }
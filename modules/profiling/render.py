@@ -0,0 +1,149 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Union
+
+from schemas.messages import DataProfile
+
+# Tokens a rendered profile may take in a prompt
+PROFILE_TOKEN_BUDGET = int(os.getenv("PROFILE_TOKEN_BUDGET", "1500"))
+
+_TABLE_HEADER = ("| column | type | unique | missing | mean | std | min | max | top values |\n"
+                 "|---|---|---|---|---|---|---|---|---|")
+
+
+class RenderedProfile(NamedTuple):
+    """A profile rendered for a prompt, with its size against the profile as indented JSON."""
+    text: str
+    tokens: int
+    baseline_tokens: int
+    columns_shown: int
+    columns_total: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.baseline_tokens - self.tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), enough for budgeting prompts."""
+    return max(1, len(text) // 4)
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _missing(details: Dict[str, Any]) -> str:
+    percentage = details.get("missing_values_percentage")
+    if isinstance(percentage, str):
+        return percentage.replace(".00%", "%")
+    if isinstance(percentage, (int, float)):
+        return f"{percentage:.2f}%".replace(".00%", "%")
+    return _cell(details.get("missing_values_count"))
+
+
+def _top_values(details: Dict[str, Any], n: int = 3) -> str:
+    top = details.get("top_5_values") or {}
+    return ", ".join(f"{_cell(str(value)[:24])} ({count})" for value, count in list(top.items())[:n])
+
+
+def _row(name: str, details: Dict[str, Any]) -> str:
+    cells = [name, details.get("type"), details.get("unique_values_count"), _missing(details), details.get("mean"),
+             details.get("std"), details.get("min"), details.get("max"), _top_values(details)]
+    return "| " + " | ".join(_cell(cell) if i != 3 else cell for i, cell in enumerate(cells)) + " |"
+
+
+def _missing_fraction(details: Dict[str, Any]) -> float:
+    percentage = details.get("missing_values_percentage")
+    try:
+        return float(str(percentage).rstrip("%")) / 100
+    except ValueError:
+        return 0.0
+
+
+def _relevance(name: str, details: Dict[str, Any], num_rows: int, text: str, terms: set) -> float:
+    """
+    How useful a column is likely to be for the prompt: named in the instructions (or other text the
+    node works from) first, then numeric columns; constant, mostly missing and id-like columns last.
+    """
+    words = {word for word in re.split(r"[\W_]+", name.lower()) if word}
+    score = 0.0
+    if name.lower() in text:
+        score += 4
+    if words:
+        score += 2 * len(words & terms) / len(words)
+    if "mean" in details:
+        score += 0.5
+    unique = details.get("unique_values_count")
+    if isinstance(unique, int):
+        if unique <= 1:
+            score -= 2
+        elif "mean" not in details and num_rows and unique >= 0.9 * num_rows:
+            score -= 1
+    if _missing_fraction(details) >= 0.5:
+        score -= 1
+    return score
+
+
+def render_profile(profile: Union[DataProfile, Dict[str, Any]], relevant_to: str = "",
+                   budget_tokens: int = PROFILE_TOKEN_BUDGET) -> RenderedProfile:
+    """
+    Renders a data profile as a compact table for a prompt, within `budget_tokens`. Columns are ranked
+    by relevance to `relevant_to` (the instructions, plus any text the node works from); those that do
+    not fit are listed by name only, as far as the budget allows. Accepts a DataProfile or the profile
+    dict data_analysis_node builds before key observations are added.
+    """
+    data = profile.model_dump() if isinstance(profile, DataProfile) else profile
+    column_details: Dict[str, Dict[str, Any]] = data.get("column_details") or {}
+    num_rows = data.get("num_rows") or 0
+    baseline_tokens = estimate_tokens(json.dumps(data, indent=2, default=str))
+
+    lines = [f"Rows: {num_rows}", f"Columns: {data.get('num_columns', len(column_details))}"]
+    observations = (data.get("key_observations") or "").strip()
+    if observations:
+        # Observations take at most about a quarter of the budget, so they cannot crowd out the columns
+        limit = max(200, budget_tokens)
+        if len(observations) > limit:
+            observations = observations[:limit].rsplit(" ", 1)[0] + " ..."
+        lines.append(f"Key Observations: {observations}")
+    lines.append(_TABLE_HEADER)
+    used = estimate_tokens("\n".join(lines))
+
+    text = relevant_to.lower()
+    terms = {word for word in re.split(r"[\W_]+", text) if len(word) > 2}
+    ranked = sorted(enumerate(column_details.items()),
+                    key=lambda item: (-_relevance(item[1][0], item[1][1], num_rows, text, terms), item[0]))
+
+    # A tenth of the budget is kept for naming the columns that do not fit
+    rows_budget = budget_tokens * 0.9
+    shown: List[str] = []
+    for _, (name, details) in ranked:
+        row = _row(name, details)
+        cost = estimate_tokens(row) + 1
+        # The first column is always shown, however tight the budget
+        if shown and used + cost > rows_budget:
+            break
+        lines.append(row)
+        shown.append(name)
+        used += cost
+
+    hidden = [name for _, (name, _) in ranked[len(shown):]]
+    if hidden:
+        names = []
+        for name in hidden:
+            if used + estimate_tokens(name) + 1 > budget_tokens:
+                break
+            names.append(name)
+            used += estimate_tokens(name) + 1
+        omitted = f"Not shown ({len(hidden)} less relevant columns): {', '.join(names)}"
+        if len(names) < len(hidden):
+            omitted += f"{', ' if names else ''}and {len(hidden) - len(names)} more"
+        lines.append(omitted)
+
+    rendered = "\n".join(lines)
+    return RenderedProfile(rendered, estimate_tokens(rendered), baseline_tokens, len(shown), len(column_details))
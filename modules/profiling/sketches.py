@@ -0,0 +1,207 @@
+import math
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """64-bit hashes of the non-null values; numbers are hashed as float64 so 5 and 5.0 collide on purpose."""
+    values = values.dropna()
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        values = values.astype("float64")
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch over 64-bit hashes. Keeps the exact set of hashes until it grows past
+    `exact_limit`, then switches to 2**p registers (about 1.04 / sqrt(2**p) relative error).
+    """
+
+    def __init__(self, p: int = 14, exact_limit: int = 100_000):
+        self.p = p
+        self.m = 1 << p
+        self.exact_limit = exact_limit
+        self._exact = np.empty(0, dtype=np.uint64)
+        self._registers = None
+
+    @property
+    def is_exact(self) -> bool:
+        return self._registers is None
+
+    def update(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+        if self._registers is None:
+            self._exact = np.union1d(self._exact, hashes)
+            if len(self._exact) <= self.exact_limit:
+                return
+            self._registers = np.zeros(self.m, dtype=np.uint8)
+            hashes, self._exact = self._exact, np.empty(0, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # remainder < 2**50, so the float64 conversion is exact and frexp's exponent is its bit length
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def count(self) -> int:
+        if self._registers is None:
+            return int(len(self._exact))
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self._registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch with numpy compactors. Exact (pandas-style linear interpolation) until the first
+    compaction; afterwards rank error is roughly 1.7 / k.
+    """
+
+    def __init__(self, k: int = 1000, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        self._compacted = False
+
+    @property
+    def is_exact(self) -> bool:
+        return not self._compacted
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # Odd item out stays behind; every other remaining item moves up with twice the weight
+            usable = len(items) - len(items) % 2
+            promoted = items[self._rng.integers(2):usable:2]
+            self.levels[level] = items[usable:]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self._compacted = True
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        if self.n == 0:
+            return [float("nan")] * len(qs)
+        if not self._compacted:
+            return [float(v) for v in np.quantile(self.levels[0], qs)]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.float64) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(items) - 1)
+        return [float(v) for v in items[positions]]
+
+
+class MisraGries:
+    """
+    Heavy-hitter counts with at most `k` counters, merged per chunk. Counts are exact while fewer than
+    `k` distinct values have been seen; afterwards they are lower bounds off by at most n / (k + 1).
+    """
+
+    def __init__(self, k: int = 1000):
+        self.k = k
+        self.counts = pd.Series(dtype="int64")
+        self._pruned = False
+
+    @property
+    def is_exact(self) -> bool:
+        return not self._pruned
+
+    def update(self, values: pd.Series):
+        chunk_counts = values.value_counts(dropna=True)
+        if chunk_counts.empty:
+            return
+        merged = chunk_counts if self.counts.empty else self.counts.add(chunk_counts, fill_value=0)
+        if len(merged) > self.k:
+            threshold = merged.nlargest(self.k + 1).iloc[-1]
+            merged = merged[merged > threshold] - threshold
+            self._pruned = True
+        self.counts = merged.astype("int64")
+
+    def top(self, n: int, key=None) -> Dict:
+        counts = self.counts
+        if key is not None:
+            counts = counts.groupby(counts.index.map(key), sort=False).sum()
+        return {k: int(v) for k, v in counts.sort_values(ascending=False, kind="stable").head(n).items()}
+
+
+class RunningMoments:
+    """Count, mean, variance (Chan et al. pairwise merge of per-chunk Welford terms), min and max."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        n_b = len(values)
+        mean_b = float(values.mean())
+        m2_b = float(np.square(values - mean_b).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def std(self) -> float:
+        # Sample standard deviation, like pandas (ddof=1)
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float("nan")
+
+
+class RowHashSet:
+    """Counts duplicate rows from 64-bit row hashes; memory is 8 bytes per distinct row."""
+
+    def __init__(self, merge_every: int = 8):
+        self.rows = 0
+        self._unique = np.empty(0, dtype=np.uint64)
+        self._pending: List[np.ndarray] = []
+        self._merge_every = merge_every
+
+    def update(self, chunk: pd.DataFrame):
+        numeric = [c for c in chunk.columns
+                   if pd.api.types.is_numeric_dtype(chunk[c]) and not pd.api.types.is_bool_dtype(chunk[c])]
+        normalized = chunk.astype({c: "float64" for c in numeric}) if numeric else chunk
+        self._pending.append(np.unique(pd.util.hash_pandas_object(normalized, index=False).to_numpy()))
+        self.rows += len(chunk)
+        if len(self._pending) >= self._merge_every:
+            self._merge()
+
+    def _merge(self):
+        if self._pending:
+            self._unique = np.unique(np.concatenate([self._unique] + self._pending))
+            self._pending = []
+
+    @property
+    def duplicates(self) -> int:
+        self._merge()
+        return self.rows - len(self._unique)
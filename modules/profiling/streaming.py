@@ -0,0 +1,157 @@
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .sketches import HyperLogLog, KLLSketch, MisraGries, RowHashSet, RunningMoments, hash_values
+
+logger = logging.getLogger(__name__)
+
+# Files larger than this are profiled in chunks instead of being loaded into one DataFrame
+STREAMING_PROFILE_THRESHOLD_BYTES = int(float(os.getenv("STREAMING_PROFILE_THRESHOLD_MB", "256")) * 1024 * 1024)
+STREAMING_CHUNK_ROWS = 200_000
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def should_stream(file_path: str, threshold_bytes: int = STREAMING_PROFILE_THRESHOLD_BYTES) -> bool:
+    return os.path.getsize(file_path) > threshold_bytes
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if value is None or math.isnan(value) else float(value)
+
+
+class ColumnProfiler:
+    """
+    Accumulates one column's profile across chunks. pandas may infer a different dtype per chunk, so the
+    final type is resolved at the end the way a full read would (any text -> object, any float -> float64).
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.missing = 0
+        self.kinds = set()
+        self.distinct = HyperLogLog()
+        self.moments = RunningMoments()
+        self.quantiles = KLLSketch()
+        self.heavy_hitters = MisraGries()
+        self.is_integer = True
+
+    def update(self, values: pd.Series):
+        self.rows += len(values)
+        self.missing += int(values.isnull().sum())
+        if pd.api.types.is_bool_dtype(values):
+            self.kinds.add("bool")
+        elif pd.api.types.is_numeric_dtype(values):
+            self.kinds.add("int" if pd.api.types.is_integer_dtype(values) else "float")
+        elif values.notna().any():
+            self.kinds.add("object")
+        self.distinct.update(hash_values(values))
+        self.heavy_hitters.update(values)
+        if "object" not in self.kinds and pd.api.types.is_numeric_dtype(values):
+            numeric = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.moments.update(numeric)
+            self.quantiles.update(numeric)
+
+    @property
+    def dtype(self) -> str:
+        if "object" in self.kinds or ("bool" in self.kinds and len(self.kinds) > 1):
+            return "object"
+        if "float" in self.kinds or ("int" in self.kinds and self.missing):
+            return "float64"
+        if "int" in self.kinds:
+            return "int64"
+        if "bool" in self.kinds:
+            return "bool"
+        # Only empty values: pandas reads the column as float64 NaN
+        return "float64"
+
+    @property
+    def is_exact(self) -> bool:
+        return self.distinct.is_exact and self.quantiles.is_exact and self.heavy_hitters.is_exact
+
+    def detail(self, total_rows: int) -> Dict[str, Any]:
+        dtype = self.dtype
+        detail: Dict[str, Any] = {
+            "type": dtype,
+            "unique_values_count": self.distinct.count(),
+            "missing_values_count": self.missing,
+            "missing_values_percentage": f"{(self.missing / total_rows * 100):.2f}%" if total_rows else "0.00%",
+        }
+        if dtype in ("int64", "float64", "bool"):
+            detail["mean"] = _none_if_nan(self.moments.mean) if self.moments.n else None
+            detail["std"] = _none_if_nan(self.moments.std)
+            as_number = int if dtype == "int64" else float
+            detail["min"] = as_number(self.moments.min) if self.moments.n else None
+            detail["max"] = as_number(self.moments.max) if self.moments.n else None
+            values = self.quantiles.quantiles(QUANTILES)
+            detail["quantiles"] = {q: _none_if_nan(v) for q, v in zip(QUANTILES, values)}
+        else:
+            detail["top_5_values"] = self.heavy_hitters.top(5, key=str)
+        return detail
+
+    def describe(self, detail: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Same entries as DataFrame.describe() for a numeric column."""
+        if "quantiles" not in detail:
+            return None
+        quantiles = detail["quantiles"]
+        return {
+            "count": float(self.moments.n),
+            "mean": detail["mean"],
+            "std": detail["std"],
+            "min": None if detail["min"] is None else float(detail["min"]),
+            "25%": quantiles[0.25],
+            "50%": quantiles[0.5],
+            "75%": quantiles[0.75],
+            "max": None if detail["max"] is None else float(detail["max"]),
+        }
+
+
+def profile_csv(file_path: str, chunk_rows: int = STREAMING_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Profiles a CSV in one chunked pass with bounded memory.
+
+    Returns the structure built by the data analysis node (num_rows, num_columns, column_details,
+    key_observations) plus the fields the CSV summary needs: total_missing, duplicate_rows, describe
+    (as DataFrame.describe().to_dict()), sample_rows and `approximate`, which is True when any column
+    outgrew the exact modes of its sketches. Distinct counts use HyperLogLog, quantiles KLL and
+    top values Misra-Gries; duplicates are counted from 64-bit row hashes.
+    """
+    columns: Dict[str, ColumnProfiler] = {}
+    duplicates = RowHashSet()
+    sample_rows: List[Dict[str, Any]] = []
+    total_rows = 0
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_rows, low_memory=False):
+        if not columns:
+            columns = {col: ColumnProfiler() for col in chunk.columns}
+        if len(sample_rows) < 5:
+            sample_rows.extend(chunk.head(5 - len(sample_rows)).to_dict("records"))
+        for col, profiler in columns.items():
+            profiler.update(chunk[col])
+        duplicates.update(chunk)
+        total_rows += len(chunk)
+        logger.debug(f"Profiled {total_rows} rows of {file_path}")
+
+    column_details = {col: profiler.detail(total_rows) for col, profiler in columns.items()}
+    describe = {}
+    for col, profiler in columns.items():
+        col_describe = profiler.describe(column_details[col])
+        if col_describe is not None:
+            describe[col] = col_describe
+
+    return {
+        "num_rows": total_rows,
+        "num_columns": len(columns),
+        "column_details": column_details,
+        "key_observations": "",
+        "total_missing": sum(profiler.missing for profiler in columns.values()),
+        "duplicate_rows": duplicates.duplicates,
+        "describe": describe,
+        "sample_rows": sample_rows,
+        "approximate": not all(profiler.is_exact for profiler in columns.values()),
+    }
@@ -40,6 +40,7 @@ class GeneratedVisual(BaseModel):
     file_path: str = Field(description="Local file path where the generated chart image is saved.")
     suggested_section: str = Field(description="Suggested section in the report where this visual should be placed.")
     chart_code: Optional[str] = Field(default=None, description="The Python code used to generate the chart.")
+    sampling: Optional[Dict[str, Any]] = Field(default=None, description="How the data was reduced before plotting (method, rows, plotted), or None if every row was plotted.")
 
 class ReportSectionsDraft(BaseModel):
     """
@@ -53,6 +54,15 @@ class ReportSectionsDraft(BaseModel):
     figure_id_map: Dict[str, str] = Field(default_factory=dict, description="A mapping from generic figure placeholders (e.g., '[FIGURE 1]') used in narratives to their actual 'visual_id's. The LLM should create this map based on the order it refers to figures.")
     clarification_questions: List[str] = Field(default_factory=list, description="Questions for the user if more information is needed.")
 
+class SectionVerdict(BaseModel):
+    """
+    The safety check's verdict on one section of a report draft.
+    """
+    section: str = Field(description="Section id: 'introduction', 'analysis_1' ... 'analysis_N', 'key_takeaways' or 'conclusion'.")
+    is_safe: bool = Field(description="True if the section is free of harmful, biased, or inappropriate language.")
+    is_accurate: bool = Field(description="True if the section is consistent with the data profile and user instructions.")
+    reasoning: str = Field(default="", description="Why the section fails, if it does.")
+
 class ReportFormat(BaseModel):
     """
     Represents the final generated report content and its format.
@@ -60,6 +70,16 @@ class ReportFormat(BaseModel):
     content: str = Field(description="The final report content, e.g., in Markdown format.")
     format_type: str = Field(description="The format of the report content (e.g., 'markdown', 'html', 'pdf_path').")
     pdf_file_path: Optional[str] = Field(default=None, description="Path to the generated PDF file, if applicable.")
+    pdf_status: Optional[str] = Field(default=None, description="'ready', 'pending' (still being written in the background), 'failed' or 'skipped'.")
+
+
+class PreparedReport(BaseModel):
+    """
+    A report draft assembled for output ahead of its safety verdict; written to disk once the draft passes.
+    """
+    content: str = Field(description="The assembled report in Markdown.")
+    html: str = Field(description="The report as the HTML document the PDF is rendered from.")
+    draft: ReportSectionsDraft = Field(description="The draft the report was assembled from.")
 
 
 class UserFeedback(BaseModel):
@@ -5,8 +5,12 @@ import os
 import uuid
 import logging
 from datetime import datetime
+from agents.report_pdf import wait_for_pdf
 from graph.state import GraphState
-from graph.builder import create_graph_workflow
+from graph.builder import get_graph_workflow
+from graph.checkpoints import discard_run, resume_config, run_config
+from graph.run_context import report_run
+from llm.usage import start_periodic_summary, usage_tracker
 from schemas.messages import GeneratedVisual, AnalysisInsight, ReportSectionsDraft, ReportFormat
 import streamlit.components.v1 as components
 
@@ -25,6 +29,9 @@ os.makedirs(CHART_OUTPUT_DIR, exist_ok=True)
 os.makedirs(REPORT_OUTPUT_DIR, exist_ok=True)
 # load_dotenv()
 
+# Periodically log Gemini token/cost usage per graph node
+start_periodic_summary()
+
 def sanitize_filename(filename: str) -> str:
     """
     Sanitizes a filename to prevent directory traversal and other security issues.
@@ -80,8 +87,18 @@ user_instructions = user_instructions.strip()
 if not user_instructions:
     user_instructions = "data analysis report"
 
-if uploaded_file:
-    if st.button("Generate Report"):
+bypass_llm_cache = st.checkbox(
+    "Regenerate everything", value=False,
+    help="Call the model for every step instead of reusing results cached from earlier runs on the same file.")
+
+# A run that ended in an error can be resumed from its last checkpoint before the failure
+resumable_run = st.session_state.get("resumable_run")
+
+if uploaded_file or resumable_run:
+    generate_clicked = bool(uploaded_file) and st.button("Generate Report")
+    resume_clicked = bool(resumable_run) and not generate_clicked and st.button(
+        "Resume Last Report", help="Continue the last failed run from the step that failed, without redoing the steps before it.")
+    if generate_clicked or resume_clicked:
         # Use a more advanced progress display
         status_message = st.empty()
         progress_bar = st.progress(0)
@@ -91,9 +108,11 @@ if uploaded_file:
         steps = [
             "data_analysis",
             "visualization",
+            "chart_rendering",
             "insight_generation",
             "report_drafting",
             "safety_check",
+            "report_preparation",
             "report_finalization"
         ]
 
@@ -101,45 +120,53 @@ if uploaded_file:
         step_messages = {
             "data_analysis": "🔍 Analyzing data and creating a profile...",
             "visualization": "📊 Generating visualizations...",
+            "chart_rendering": "🖼️ Rendering charts...",
             "insight_generation": "💡 Generating key insights from the data...",
             "report_drafting": "✍️ Drafting the report content...",
             "safety_check": "🛡️ Performing a safety and accuracy check...",
+            "report_preparation": "📝 Assembling the report...",
             "report_finalization": "✅ Finalizing the report and generating output files..."
         }
 
-        request_id = str(uuid.uuid4())
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Sanitize the filename to prevent security vulnerabilities
-        sanitized_filename = sanitize_filename(uploaded_file.name)
-        unique_filename = f"{timestamp}_{sanitized_filename}"
-        file_save_path = os.path.join(UPLOAD_DIR, unique_filename)
+        if resume_clicked:
+            request_id = resumable_run["request_id"]
+            file_save_path = resumable_run["file_path"]
+            initial_state = None
+        else:
+            request_id = str(uuid.uuid4())
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Sanitize the filename to prevent security vulnerabilities
+            sanitized_filename = sanitize_filename(uploaded_file.name)
+            unique_filename = f"{timestamp}_{sanitized_filename}"
+            file_save_path = os.path.join(UPLOAD_DIR, unique_filename)
 
-        try:
-            with open(file_save_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            logger.info(f"File saved to: {file_save_path}")
-        except Exception as e:
-            st.info("You can try running the process again.")
-            st.error(f"Error saving file: {e}")
-            logger.error(f"File saving error: {e}", exc_info=True)
-            st.stop()
+            try:
+                with open(file_save_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+                logger.info(f"File saved to: {file_save_path}")
+            except Exception as e:
+                st.info("You can try running the process again.")
+                st.error(f"Error saving file: {e}")
+                logger.error(f"File saving error: {e}", exc_info=True)
+                st.stop()
 
-        initial_state: GraphState = {
-            "request_id": request_id,
-            "file_path": file_save_path,
-            "instructions": user_instructions,
-            "dataframe_profile": None,
-            "analysis_insights": None,
-            "generated_visuals": None,
-            "report_sections_draft": None,
-            "final_report": None,
-            "status": "initial",
-            "error_message": None,
-            "safety_check_retries": 0,
-        }
+            initial_state: GraphState = {
+                "request_id": request_id,
+                "file_path": file_save_path,
+                "instructions": user_instructions,
+                "bypass_llm_cache": bypass_llm_cache,
+                "dataframe_profile": None,
+                "analysis_insights": None,
+                "generated_visuals": None,
+                "report_sections_draft": None,
+                "final_report": None,
+                "status": "initial",
+                "error_message": None,
+                "safety_check_retries": 0,
+            }
 
         try:
-            workflow_app = create_graph_workflow()
+            workflow_app = get_graph_workflow()
             final_state = None
 
             with st.spinner(
@@ -149,24 +176,43 @@ if uploaded_file:
                 status_message.info("Graph workflow started...")
                 # progress_text.info("Graph workflow started...")
 
-                # Stream the graph execution to show progress
-                for i, state in enumerate(workflow_app.stream(initial_state)):
-                    for node, current_state in state.items():
-                        if node != "__end__":
-                            if current_state.get('status') == 'retrying':
-                                retries = current_state.get('safety_check_retries', 0)
-                                st.warning(f"⚠️ Safety check failed. Retrying report drafting (Attempt {retries} of 2)...")
-                            else:
-                                # Otherwise, show the normal progress messages
-                                progress_value = (steps.index(node) + 1) / len(steps)
-                                progress_bar.progress(progress_value)
-                                status_message.info(step_messages.get(node, f'Processing {node}...'))
+                # Stream the graph execution to show progress; the run context parses the CSV once for all nodes.
+                # "updates" carries what each node changed, "values" the full state after each step.
+                # Every step is checkpointed under the request_id; a resumed run starts from the last good checkpoint
+                graph_input, config = initial_state, run_config(request_id)
+                if resume_clicked:
+                    graph_input, config = None, resume_config(workflow_app, request_id)
+                    if config is None:
+                        st.session_state.pop("resumable_run", None)
+                        st.warning("⚠️ There is nothing left to resume for the last report. Please generate it again.")
+                        st.stop()
+                with report_run(request_id, file_save_path):
+                    for mode, chunk in workflow_app.stream(graph_input, config=config, stream_mode=["updates", "values"]):
+                        if mode == "values":
+                            final_state = chunk
+                            continue
+                        for node, current_state in chunk.items():
+                            current_state = current_state or {}
+                            if node != "__end__":
+                                if current_state.get('status') == 'retrying':
+                                    retries = current_state.get('safety_check_retries', 0)
+                                    st.warning(f"⚠️ Safety check failed. Retrying report drafting (Attempt {retries} of 2)...")
+                                elif node in steps:
+                                    # Otherwise, show the normal progress messages (safety_failed only ends the run)
+                                    progress_value = (steps.index(node) + 1) / len(steps)
+                                    progress_bar.progress(progress_value)
+                                    status_message.info(step_messages.get(node, f'Processing {node}...'))
                             
-                            # Update the progress bar and status message
-                            # progress_value = (i + 1) / len(steps)
-                            # progress_bar.progress(progress_value)
-                            # status_message.info(step_messages.get(node, f'Processing {node}...'))
-                            final_state = current_state
+                                # Update the progress bar and status message
+                                # progress_value = (i + 1) / len(steps)
+                                # progress_bar.progress(progress_value)
+                                # status_message.info(step_messages.get(node, f'Processing {node}...'))
+
+                usage_tracker.log_summary()
+                if final_state.get("status") != "error":
+                    # Finished for good: the checkpoints are no longer needed
+                    st.session_state.pop("resumable_run", None)
+                    discard_run(request_id)
 
                 # After the loop, hide the progress bar
                 progress_bar.empty()
@@ -191,7 +237,8 @@ if uploaded_file:
 
                 # After the loop, check the final state for errors
                 if final_state.get("status") == "error":
-                    st.info("You can try running the process again.")
+                    st.session_state["resumable_run"] = {"request_id": request_id, "file_path": file_save_path}
+                    st.info("You can resume the report from the failed step, or run the process again.")
                     st.error(f"❌ An error occurred: {final_state.get('error_message')}")
                     
                     # Don't proceed to display report content
@@ -205,7 +252,21 @@ if uploaded_file:
 
                     # Report display logic
                     if final_state and final_state['final_report']:
-                        if final_state['final_report'].pdf_file_path and os.path.exists(final_state['final_report'].pdf_file_path):
+                        # The Markdown report is ready as soon as the graph finishes; the PDF may still be rendering
+                        st.download_button(
+                            label="Download Final Report (Markdown)",
+                            data=final_state['final_report'].content,
+                            file_name=f"report_{request_id}.md",
+                            mime="text/markdown",
+                            key="download_md_button"
+                        )
+                        if final_state['final_report'].pdf_status == "pending":
+                            with st.spinner("Rendering the PDF report..."):
+                                wait_for_pdf(final_state['final_report'].pdf_file_path)
+
+                        if final_state['final_report'].pdf_status == "skipped":
+                            st.info("PDF output is turned off (REPORT_PDF_MODE=off).")
+                        elif final_state['final_report'].pdf_file_path and os.path.exists(final_state['final_report'].pdf_file_path):
                             pdf_file_content = None
                             try:
                                 with open(final_state['final_report'].pdf_file_path, "rb") as file:
@@ -261,7 +322,9 @@ if uploaded_file:
                         st.warning("Final report content not available.")
 
         except Exception as e:
-            st.info("You can try running the process again.")
+            # The steps completed before the failure are checkpointed
+            st.session_state["resumable_run"] = {"request_id": request_id, "file_path": file_save_path}
+            st.info("You can resume the report from the failed step, or run the process again.")
             st.error(f"❌ An unexpected critical error occurred during graph execution: {e}")
             logger.error(f"An unexpected critical error occurred during graph execution:: {e}", exc_info=True)
             st.stop()
@@ -0,0 +1,282 @@
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import sanitize_input
+
+logger = logging.getLogger(__name__)
+
+CSV_AGENT_SANDBOX = os.getenv("CSV_AGENT_SANDBOX", "1") != "0"
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+# Limits for one tool call: CPU seconds, wall-clock seconds, and heap size of the worker process
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_TIMEOUT_S = float(os.getenv("SANDBOX_TIMEOUT_S", "30"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+# Wall-clock limit for a worker to load a file, which is not counted against a call's timeout
+SANDBOX_LOAD_TIMEOUT_S = float(os.getenv("SANDBOX_LOAD_TIMEOUT_S", "300"))
+# Workers are replaced after this many calls, so leaks and leftover state do not accumulate
+SANDBOX_MAX_CALLS = int(os.getenv("SANDBOX_MAX_CALLS", "200"))
+# Agent sessions whose REPL variables a worker keeps around
+SANDBOX_SESSIONS_PER_WORKER = 8
+
+OUTPUT_LIMIT_CHARS = 20_000
+WORKER_START_TIMEOUT_S = 60
+
+
+def _worker_main(conn, memory_mb: int, cpu_seconds: int):
+    """
+    Worker loop. Holds each file's DataFrame once (memory-mapped from the columnar copy when there is one)
+    and a REPL namespace per agent session, with copy-on-write so sessions never see each other's edits.
+    """
+    import pandas as pd
+    from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+    from dataframe_store import DataFrameStore
+
+    pd.options.mode.copy_on_write = True
+    # RLIMIT_DATA covers the heap and anonymous mappings, but not the memory-mapped columnar files
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+    store = DataFrameStore()
+    sessions: "OrderedDict[str, Tuple[Any, PythonAstREPLTool]]" = OrderedDict()
+    conn.send(("ready", ""))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        kind, path, session_key, code = message
+        if kind == "drop":
+            sessions.pop(session_key, None)
+            conn.send(("ok", ""))
+            continue
+        if kind == "load":
+            try:
+                store.get(path)
+                conn.send(("ok", ""))
+            except MemoryError:
+                conn.send(("memory", f"MemoryError: loading the file needed more than {memory_mb} MB"))
+            except Exception as e:
+                conn.send(("ok", f"{type(e).__name__}: {e}"))
+            continue
+        try:
+            df = store.get(path)
+            # A re-uploaded file starts the session's namespace over
+            source_key, repl = sessions.get(session_key, (None, None))
+            if repl is None or source_key != store.frame_key(path):
+                # A shallow copy shares the (memory-mapped) data; copy-on-write keeps each session's edits
+                # to itself, so the frame is held once however many sessions use it
+                repl = PythonAstREPLTool(locals={"df": df.copy(deep=False)})
+                sessions[session_key] = (store.frame_key(path), repl)
+            sessions.move_to_end(session_key)
+            while len(sessions) > SANDBOX_SESSIONS_PER_WORKER:
+                sessions.popitem(last=False)
+
+            # The CPU limit is cumulative for the process, so move the soft limit to "now + budget" for
+            # every call; going over raises SIGXCPU, which terminates the worker. The hard limit is left
+            # where it is: the process cannot raise it again once lowered.
+            try:
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+            except (OSError, ValueError) as e:
+                # Code must not run without its limits; the parent replaces this worker
+                conn.send(("error", f"ResourceError: could not set the sandbox CPU limit ({e})"))
+                continue
+            # Loaded and limited: the parent's timeout for the code starts now
+            conn.send(("started", ""))
+
+            output = str(repl.run(code))
+            # The REPL tool turns exceptions into text, so a failed allocation shows up here
+            status = "memory" if output.startswith("MemoryError") else "ok"
+            conn.send((status, output[:OUTPUT_LIMIT_CHARS]))
+        except MemoryError:
+            conn.send(("memory", f"MemoryError: the code needed more than {memory_mb} MB"))
+        except Exception as e:
+            conn.send(("ok", f"{type(e).__name__}: {e}"))
+
+
+class SandboxWorker:
+    def __init__(self, context, memory_mb: int, cpu_seconds: int, timeout_s: float, max_calls: int,
+                 load_timeout_s: float = SANDBOX_LOAD_TIMEOUT_S):
+        self._context = context
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.timeout_s = timeout_s
+        self.load_timeout_s = load_timeout_s
+        self.max_calls = max_calls
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.calls = 0
+
+    def start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.memory_mb, self.cpu_seconds),
+            name="pandas-agent-sandbox", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.calls = 0
+        # Wait for the imports, so they do not count against the first call's timeout
+        if not parent_conn.poll(WORKER_START_TIMEOUT_S) or parent_conn.recv()[0] != "ready":
+            raise RuntimeError("Sandbox worker failed to start")
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = self.conn = None
+
+    def recycle(self, reason: str):
+        logger.warning(f"Recycling sandbox worker {self.process.pid if self.process else '?'}: {reason}")
+        self.stop()
+        self.start()
+
+    def _receive(self, timeout_s: float, timeout_message: str):
+        """The worker's next reply as (status, output); a timeout or crash recycles the worker."""
+        if not self.conn.poll(timeout_s):
+            self.recycle("wall-clock timeout")
+            return "timeout", timeout_message
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.process.join(timeout=5)
+            exitcode = self.process.exitcode
+            self.recycle(f"exited with code {exitcode}")
+            if exitcode == -signal.SIGXCPU:
+                return "crashed", f"ResourceError: the code used more than {self.cpu_seconds} seconds of CPU time and was stopped"
+            return "crashed", f"ResourceError: the code crashed the worker (exit code {exitcode}), possibly by running out of memory"
+
+    def call(self, kind: str, path: str, session_key: str, code: str) -> str:
+        """
+        Runs one message on this worker; the caller must hold `lock`. Loading the file (the first time
+        the worker sees it) has its own, longer timeout, so only the code counts against `timeout_s`.
+        """
+        if self.process is None or not self.process.is_alive():
+            self.start()
+        try:
+            self.conn.send((kind, path, session_key, code))
+        except (BrokenPipeError, OSError):
+            # Died since the last call (e.g. killed externally); start a fresh one and try once more
+            self.recycle("worker went away")
+            self.conn.send((kind, path, session_key, code))
+        status, output = self._receive(
+            self.load_timeout_s, f"TimeoutError: loading the file took more than {self.load_timeout_s:g} seconds")
+        if status == "started":
+            status, output = self._receive(
+                self.timeout_s, f"TimeoutError: the code ran for more than {self.timeout_s:g} seconds and was stopped")
+        if status in ("timeout", "crashed"):
+            return output
+        self.calls += 1
+        if status == "memory":
+            self.recycle("memory limit")
+        elif status == "error":
+            self.recycle(output)
+        elif self.calls >= self.max_calls:
+            self.recycle("call limit")
+        return output
+
+
+class SandboxPool:
+    """
+    Pre-started worker processes that execute pandas-agent code away from the web process.
+
+    Each call is routed to a worker by its session key, so variables an agent defines in one step are
+    still there in the next. Workers are restarted after a timeout, a CPU or memory limit breach, or
+    `max_calls` calls; the agent receives the error as the tool's output and can recover.
+    """
+
+    def __init__(self, size: int = SANDBOX_WORKERS, memory_mb: int = SANDBOX_MEMORY_MB,
+                 cpu_seconds: int = SANDBOX_CPU_SECONDS, timeout_s: float = SANDBOX_TIMEOUT_S,
+                 max_calls: int = SANDBOX_MAX_CALLS, load_timeout_s: float = SANDBOX_LOAD_TIMEOUT_S):
+        # forkserver: workers are forked from a clean single-threaded process, not from the threaded server
+        self._context = multiprocessing.get_context("forkserver")
+        self.workers: List[SandboxWorker] = [
+            SandboxWorker(self._context, memory_mb, cpu_seconds, timeout_s, max_calls, load_timeout_s)
+            for _ in range(size)
+        ]
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for worker in self.workers:
+                worker.start()
+            self._started = True
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self.workers:
+                worker.stop()
+            self._started = False
+
+    def _worker(self, session_key: str) -> SandboxWorker:
+        self.start()
+        return self.workers[zlib.crc32(session_key.encode("utf-8")) % len(self.workers)]
+
+    def execute(self, path: str, session_key: str, code: str) -> str:
+        worker = self._worker(session_key)
+        with worker.lock:
+            return worker.call("exec", os.path.abspath(path), session_key, code)
+
+    def preload(self, path: str):
+        """
+        Loads a file into every worker ahead of the agent's first tool call (e.g. right after upload), as
+        calls for the file's sessions can land on any worker.
+        """
+        path = os.path.abspath(path)
+        self.start()
+        for worker in self.workers:
+            with worker.lock:
+                output = worker.call("load", path, "", "")
+            if output:
+                logger.warning(f"Sandbox worker could not preload {path}: {output}")
+
+    def drop_session(self, session_key: str):
+        """Discards a session's REPL variables, e.g. once a one-off agent run is over."""
+        worker = self._worker(session_key)
+        with worker.lock:
+            worker.call("drop", "", session_key, "")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"pid": w.process.pid if w.process else None, "alive": bool(w.process and w.process.is_alive()),
+             "calls": w.calls}
+            for w in self.workers
+        ]
+
+
+sandbox_pool = SandboxPool()
+
+
+class SandboxedPythonTool(BaseTool):
+    """Drop-in for the pandas agent's python_repl_ast tool that runs the code in the sandbox pool."""
+
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "When using this tool, sometimes output is abbreviated - "
+        "make sure it does not look abbreviated before using it in your answer."
+    )
+    file_path: str
+    session_key: str
+
+    def _run(self, query: str, run_manager: Optional[Any] = None) -> str:
+        return sandbox_pool.execute(self.file_path, self.session_key, sanitize_input(query))
+
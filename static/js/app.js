@@ -168,6 +168,7 @@ function showHistoryLoading() {
 
 // CSV Analysis functionality
 let currentCsvFile = null;
+let currentCsvFilename = null; // name on the server; differs from the local name for duplicate uploads
 let uploadProgressInterval = null;
 
 function initializeCsvAnalysis() {
@@ -239,12 +240,13 @@ async function uploadCsvFile(file) {
     const result = await response.json();
     
     if (response.ok) {
-      showUploadStatus('File uploaded successfully!', 'success');
+      currentCsvFilename = result.filename;
+      showUploadStatus(result.duplicate ? 'File already uploaded, reusing it.' : 'File uploaded successfully!', 'success');
       showCsvAnalysisTabs();
       await loadCsvSummary();
       await loadCsvVariables();
     } else {
-      showUploadStatus(result.error || 'Upload failed', 'error');
+      showUploadStatus(result.detail || result.error || 'Upload failed', 'error');
     }
   } catch (error) {
     console.error('Upload failed:', error);
@@ -269,13 +271,16 @@ async function loadCsvSummary() {
     const response = await fetch('/csv/summarize', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ filename: currentCsvFile.name })
+      body: JSON.stringify({ filename: currentCsvFilename })
     });
 
     if (response.ok) {
       const data = await response.json();
       console.log('Summary data received:', data);
       displayCsvSummary(data);
+      if (data.column_descriptions_status === 'pending') {
+        pollColumnDescriptions(data, currentCsvFilename);
+      }
     } else {
       const errorData = await response.json();
       console.error('Summary API error:', errorData);
@@ -285,6 +290,27 @@ async function loadCsvSummary() {
   }
 }
 
+// The LLM column table is generated in the background; re-render the summary once it is ready
+async function pollColumnDescriptions(summary, filename, intervalMs = 2000, maxAttempts = 90) {
+  for (let attempt = 0; attempt < maxAttempts; attempt++) {
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+    if (filename !== currentCsvFilename) return;
+    try {
+      const response = await fetch(`/csv/column-descriptions/${encodeURIComponent(filename)}`);
+      if (!response.ok) return;
+      const result = await response.json();
+      if (result.status === 'pending') continue;
+      if (result.column_descriptions) {
+        displayCsvSummary({ ...summary, column_descriptions: result.column_descriptions });
+      }
+      return;
+    } catch (error) {
+      console.error('Column descriptions failed:', error);
+      return;
+    }
+  }
+}
+
 function markdownTableToHtml(markdownTable) {
   if (!markdownTable || typeof markdownTable !== 'string') return markdownTable;
 
@@ -344,6 +370,13 @@ function displayCsvSummary(summary) {
         <div class="csv-summary-content">${markdownTableToHtml(summary.column_descriptions)}</div>
       </div>
     `;
+  } else if (summary.column_descriptions_status === 'pending') {
+    html += `
+      <div class="csv-summary-item">
+        <div class="csv-summary-title">📋 Column Descriptions</div>
+        <div class="csv-summary-content">Generating column descriptions...</div>
+      </div>
+    `;
   }
 
   if (summary.sample_rows && summary.sample_rows.length > 0) {
@@ -402,7 +435,7 @@ async function loadCsvVariables() {
     if (response.ok) {
       const files = await response.json();
       // For now, just use the current file name
-      if (currentCsvFile && dom.trendVariable) {
+      if (currentCsvFilename && dom.trendVariable) {
         // This would need to be enhanced to get actual column names from the backend
         dom.trendVariable.innerHTML = `<option value="">Select a variable to analyze</option>`;
       }
@@ -433,7 +466,7 @@ async function analyzeTrend() {
     return;
   }
   
-  if (!currentCsvFile) {
+  if (!currentCsvFilename) {
     alert('Please upload a CSV file first');
     return;
   }
@@ -443,7 +476,7 @@ async function analyzeTrend() {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ 
-        filename: currentCsvFile.name,
+        filename: currentCsvFilename,
         variable: variable 
       })
     });
@@ -468,7 +501,7 @@ async function askQuestion() {
     return;
   }
   
-  if (!currentCsvFile) {
+  if (!currentCsvFilename) {
     alert('Please upload a CSV file first');
     return;
   }
@@ -478,7 +511,7 @@ async function askQuestion() {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ 
-        filename: currentCsvFile.name,
+        filename: currentCsvFilename,
         question: question 
       })
     });
@@ -1257,7 +1290,7 @@ async function handleCsvChatMessage(e) {
   const message = dom.csvChatInput.value.trim();
   if (!message) return;
 
-  if (!currentCsvFile) {
+  if (!currentCsvFilename) {
     alert('Please upload a CSV file first');
     return;
   }
@@ -1271,7 +1304,7 @@ async function handleCsvChatMessage(e) {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
-        filename: currentCsvFile.name,
+        filename: currentCsvFilename,
         message: message
       })
     });
@@ -0,0 +1,37 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "modules"))
+
+
+@pytest.fixture
+def report_csv(tmp_path, monkeypatch):
+    """A sales CSV to run reports on, with the nodes writing to a temporary directory and no PDF output."""
+    import agents.report_finalization_node as report_finalization_node
+    from benchmarks.graph_benchmark import make_sales_frame
+    from llm.clients import set_chat_model_factory
+
+    # The nodes write charts and reports relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    # visualization_node creates the chart directory when imported, i.e. in the first test's directory
+    (tmp_path / "local_app_data" / "charts").mkdir(parents=True)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(report_finalization_node, "REPORT_PDF_MODE", "off")
+    csv_path = str(tmp_path / "sales.csv")
+    make_sales_frame(500).to_csv(csv_path, index=False)
+    yield csv_path
+    set_chat_model_factory(None)
+
+
+def initial_state(csv_path: str) -> dict:
+    return {
+        "request_id": str(uuid.uuid4()), "file_path": csv_path, "instructions": "Summarise sales performance.",
+        "dataframe_profile": None, "analysis_insights": None, "generated_visuals": None,
+        "report_sections_draft": None, "final_report": None, "status": "initial", "error_message": None,
+        "safety_check_retries": 0, "bypass_llm_cache": True,
+    }
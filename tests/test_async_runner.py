@@ -0,0 +1,33 @@
+"""
+arun_report under separate event loops, as when each run is started with its own asyncio.run: the
+shared LLM clients must not carry an async client bound to a loop that has since been closed.
+"""
+import asyncio
+
+from pydantic import PrivateAttr
+
+from benchmarks.graph_benchmark import graph_responder
+from benchmarks.stubs import FakeChatModel
+from conftest import initial_state
+
+
+class LoopBoundChatModel(FakeChatModel):
+    """Fails like ChatGoogleGenerativeAI's gRPC client when used after the loop it started on closed."""
+    _loop: asyncio.AbstractEventLoop = PrivateAttr(default=None)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        elif self._loop.is_closed():
+            raise RuntimeError("Event loop is closed")
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def test_arun_report_in_separate_event_loops(report_csv):
+    from graph.runner import arun_report
+    from llm.clients import set_chat_model_factory
+
+    set_chat_model_factory(lambda model, temperature: LoopBoundChatModel(model=model, responder=graph_responder))
+    for _ in range(2):
+        final_state = asyncio.run(arun_report(initial_state(report_csv)))
+        assert final_state["status"] == "report_finalized", final_state.get("error_message")
@@ -0,0 +1,76 @@
+import os
+import uuid
+
+import pytest
+
+from benchmarks.graph_benchmark import graph_responder
+from benchmarks.stubs import FakeChatModel
+from conftest import initial_state
+
+
+@pytest.fixture
+def chart_cache(report_csv, monkeypatch):
+    import charts.cache as cache
+    from llm.clients import set_chat_model_factory
+
+    set_chat_model_factory(lambda model, temperature: FakeChatModel(model=model, responder=graph_responder))
+    # The charts a test draws are new, so nothing would be old enough to evict
+    monkeypatch.setattr(cache, "CHART_CACHE_MIN_AGE_S", 0)
+    return cache
+
+
+def _render_charts(csv_path):
+    """Runs a report up to its charts; the chart files it refers to."""
+    from agents.data_analysis_node import data_analysis_node
+    from agents.visualization_node import chart_rendering_node, visualization_node
+    from graph.run_context import report_run
+
+    state = initial_state(csv_path)
+    with report_run(state["request_id"], csv_path):
+        state.update(data_analysis_node(dict(state)))
+        state.update(visualization_node(dict(state)))
+        state.update(chart_rendering_node(dict(state)))
+    assert state["status"] == "visuals_generated", state.get("error_message")
+    return [visual.file_path for visual in state["generated_visuals"]]
+
+
+def _cache_entries(cache, directory):
+    return [name for name in os.listdir(directory) if cache._CACHE_ENTRY.match(name)]
+
+
+def test_eviction_keeps_charts_runs_still_reference(report_csv, chart_cache):
+    from agents.visualization_node import CHART_OUTPUT_DIR
+
+    first_run = _render_charts(report_csv)
+    # Drawn from the same data, so served from the cache
+    second_run = _render_charts(report_csv)
+    assert first_run and len(second_run) == len(first_run)
+    assert _cache_entries(chart_cache, CHART_OUTPUT_DIR)
+
+    chart_cache.evict_charts(CHART_OUTPUT_DIR, max_bytes=0)
+
+    assert not _cache_entries(chart_cache, CHART_OUTPUT_DIR)
+    for path in first_run + second_run:
+        assert os.path.getsize(path) > 0, path
+
+
+def test_rerendering_a_run_chart_leaves_the_cache_entry_intact(chart_cache, tmp_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from charts.images import save_chart
+
+    directory, key = str(tmp_path), uuid.uuid4().hex * 2
+    run_path = str(tmp_path / "chart_run_1.png")
+    fig = plt.figure()
+    save_chart(fig, run_path)
+    chart_cache.put_chart(directory, key, run_path, "plot()", {})
+    cached_bytes = open(os.path.join(directory, f"chart_{key}.png"), "rb").read()
+
+    # The run's file is a link to the cache entry; saving over it must not change the entry
+    fig.gca().plot([1, 2, 3])
+    save_chart(fig, run_path)
+    plt.close(fig)
+    assert open(os.path.join(directory, f"chart_{key}.png"), "rb").read() == cached_bytes
+    assert open(run_path, "rb").read() != cached_bytes
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules"))
+
+from agents.safety_prescreen import (PRESCREEN_FAILED, PRESCREEN_INCONCLUSIVE, PRESCREEN_PASSED,
+                                     prescreen_draft)
+from schemas.messages import DataProfile, ReportSectionsDraft
+
+PROFILE = DataProfile(
+    num_rows=1000, num_columns=12, key_observations="",
+    column_details={
+        "price": {"type": "float64", "mean": 102.5, "min": 5.0, "max": 199.9, "missing_values_count": 120},
+        "region": {"type": "object", "unique_values_count": 4},
+    })
+
+
+def _draft(narrative: str) -> ReportSectionsDraft:
+    return ReportSectionsDraft(introduction_text="This report reviews sales.", analysis_narratives=[narrative],
+                               key_takeaways_bullet_points=["Sales are steady."],
+                               conclusion_text="Sales are healthy.", dataset_title="Sales")
+
+
+@pytest.mark.parametrize("narrative", [
+    "The dataset has 1,000 rows and 12 columns.",
+    "The average price is 102.5.",
+])
+def test_matching_claims_pass(narrative):
+    assert prescreen_draft(_draft(narrative), PROFILE).outcome == PRESCREEN_PASSED
+
+
+@pytest.mark.parametrize("narrative", [
+    "The dataset has 1,200 rows.",
+    "There are 1,200 rows in total.",
+    "The data contains 1,000 rows and 16 columns.",
+    "The average price is 150.",
+])
+def test_wrong_dataset_claims_fail(narrative):
+    result = prescreen_draft(_draft(narrative), PROFILE)
+    assert result.outcome == PRESCREEN_FAILED
+    assert [verdict.section for verdict in result.section_verdicts] == ["analysis_1"]
+
+
+@pytest.mark.parametrize("narrative", [
+    "120 rows have a missing price.",
+    "The top 20 rows by price are all from the west.",
+])
+def test_counts_of_a_subset_are_left_to_the_model(narrative):
+    assert prescreen_draft(_draft(narrative), PROFILE).outcome == PRESCREEN_INCONCLUSIVE
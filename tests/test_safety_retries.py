@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from benchmarks.graph_benchmark import graph_responder
+from benchmarks.stubs import FakeChatModel
+from conftest import initial_state
+
+
+@pytest.fixture
+def reviews(report_csv, monkeypatch):
+    """Verdicts the model review returns in turn (True passes the draft); every draft is reviewed."""
+    import agents.safety_node as safety_node
+    from llm.clients import set_chat_model_factory
+
+    verdicts = []
+
+    def responder(prompt):
+        if "expert report reviewer" in prompt:
+            accurate = verdicts.pop(0) if verdicts else False
+            return json.dumps({"is_safe": True, "is_accurate": accurate,
+                               "reasoning": "Consistent." if accurate else "Misquotes the profile."})
+        return graph_responder(prompt)
+
+    monkeypatch.setattr(safety_node, "SAFETY_REVIEW_SAMPLE_RATE", 1.0)
+    set_chat_model_factory(lambda model, temperature: FakeChatModel(model=model, responder=responder))
+    return verdicts
+
+
+def _run(csv_path):
+    from graph.builder import create_graph_workflow
+    from graph.run_context import report_run
+
+    state = initial_state(csv_path)
+    with report_run(state["request_id"], csv_path):
+        return create_graph_workflow().invoke(state)
+
+
+def test_redraft_that_passes_clears_the_error(report_csv, reviews):
+    reviews.extend([False, True])
+    final_state = _run(report_csv)
+    assert final_state["status"] == "report_finalized"
+    assert final_state["safety_check_retries"] == 1
+    assert final_state["error_message"] is None
+
+
+def test_run_out_of_retries_reports_the_failure(report_csv, reviews):
+    from graph.builder import MAX_SAFETY_RETRIES
+
+    final_state = _run(report_csv)
+    assert final_state["status"] == "error"
+    assert final_state["safety_check_retries"] == MAX_SAFETY_RETRIES
+    assert final_state["error_message"].endswith(
+        f"Report generation failed after {MAX_SAFETY_RETRIES} attempts due to safety checks.")
+
+
+def test_resume_after_running_out_of_retries_redrafts(report_csv, reviews):
+    from graph.builder import get_graph_workflow
+    from graph.checkpoints import resume_config, run_config
+    from graph.run_context import report_run
+
+    app = get_graph_workflow()
+    state = initial_state(report_csv)
+    request_id = state["request_id"]
+    with report_run(request_id, report_csv):
+        assert app.invoke(state, config=run_config(request_id))["status"] == "error"
+
+        config = resume_config(app, request_id)
+        snapshot = app.get_state(config)
+        assert snapshot.next == ("report_drafting",)
+        assert snapshot.values["safety_check_retries"] == 0
+
+        reviews.append(True)
+        final_state = app.invoke(None, config=config)
+    assert final_state["status"] == "report_finalized"
+    assert final_state["error_message"] is None